@@ -0,0 +1,138 @@
+"""Partition proxy_earnings by event_timestamp
+
+Revision ID: 193bce581e57
+Revises: 61099835ddc2
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '193bce581e57'
+down_revision: Union[str, None] = '61099835ddc2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Индексы по отдельным колонкам, которые есть в обеих версиях таблицы
+COLUMN_INDEXES = ['proxy_ip', 'proxy_key', 'server_id', 'bot_name']
+
+COLUMNS = (
+    'id, proxy_ip, proxy_port, proxy_key, server_id, bot_id, bot_name, faucet_name, faucet_url, '
+    'reward_amount, reward_currency, unique_key, success, error_message, event_timestamp, created_at, extra_data'
+)
+
+
+def _earning_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('proxy_earnings_id_seq'::regclass)"), nullable=False),
+        sa.Column('proxy_ip', sa.String(length=45), nullable=False),
+        sa.Column('proxy_port', sa.Integer(), nullable=False),
+        sa.Column('proxy_key', sa.String(length=100), nullable=False),
+        sa.Column('server_id', sa.String(length=50), nullable=False),
+        sa.Column('bot_id', sa.String(length=50), nullable=False),
+        sa.Column('bot_name', sa.String(length=100), nullable=False),
+        sa.Column('faucet_name', sa.String(length=100), nullable=False),
+        sa.Column('faucet_url', sa.String(length=255), nullable=True),
+        sa.Column('reward_amount', sa.Numeric(precision=20, scale=8), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('unique_key', sa.String(length=64), nullable=False),
+        sa.Column('success', sa.Boolean(), nullable=False),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('event_timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('extra_data', sa.Text(), nullable=True),
+    ]
+
+
+def _month_start(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(start: datetime) -> datetime:
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def upgrade() -> None:
+    # Старая таблица уступает имя, индексы и ограничения новой секционированной
+    op.rename_table('proxy_earnings', 'proxy_earnings_legacy')
+    op.drop_index('ix_proxy_earnings_id', table_name='proxy_earnings_legacy')
+    op.drop_index('ix_proxy_earnings_unique_key', table_name='proxy_earnings_legacy')
+    for column in COLUMN_INDEXES:
+        op.drop_index(f'ix_proxy_earnings_{column}', table_name='proxy_earnings_legacy')
+    op.execute('ALTER TABLE proxy_earnings_legacy RENAME CONSTRAINT proxy_earnings_pkey TO proxy_earnings_legacy_pkey')
+    op.execute('ALTER SEQUENCE proxy_earnings_id_seq OWNED BY NONE')
+
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования
+    op.create_table('proxy_earnings',
+        *_earning_columns(),
+        sa.PrimaryKeyConstraint('id', 'event_timestamp'),
+        postgresql_partition_by='RANGE (event_timestamp)'
+    )
+    op.execute('ALTER SEQUENCE proxy_earnings_id_seq OWNED BY proxy_earnings.id')
+
+    # Помесячные секции от первого события (не глубже 5 лет) до трех месяцев вперед;
+    # все, что не попало в диапазон, уходит в секцию DEFAULT
+    now = datetime.now(timezone.utc)
+    first = op.get_bind().execute(sa.text('SELECT min(event_timestamp) FROM proxy_earnings_legacy')).scalar()
+    start = _month_start(max(first or now, now - timedelta(days=5 * 365)))
+    end = _month_start(now)
+    for _ in range(4):
+        end = _next_month(end)
+    while start < end:
+        month_end = _next_month(start)
+        op.execute(
+            f"CREATE TABLE proxy_earnings_p{start:%Y_%m} PARTITION OF proxy_earnings "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{month_end.isoformat()}')"
+        )
+        start = month_end
+    op.execute('CREATE TABLE proxy_earnings_default PARTITION OF proxy_earnings DEFAULT')
+
+    op.execute(f'INSERT INTO proxy_earnings ({COLUMNS}) SELECT {COLUMNS} FROM proxy_earnings_legacy')
+
+    # Глобальная уникальность unique_key
+    op.create_table('proxy_earning_keys',
+        sa.Column('unique_key', sa.String(length=64), nullable=False),
+        sa.Column('event_timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('unique_key')
+    )
+    op.execute('INSERT INTO proxy_earning_keys (unique_key, event_timestamp) '
+               'SELECT unique_key, event_timestamp FROM proxy_earnings_legacy')
+    op.create_index(op.f('ix_proxy_earning_keys_event_timestamp'), 'proxy_earning_keys', ['event_timestamp'], unique=False)
+
+    # Индексы создаются на родительской таблице и наследуются всеми секциями
+    op.create_index('ix_proxy_earnings_unique_key', 'proxy_earnings', ['unique_key'], unique=False)
+    for column in COLUMN_INDEXES:
+        op.create_index(f'ix_proxy_earnings_{column}', 'proxy_earnings', [column], unique=False)
+
+    op.drop_table('proxy_earnings_legacy')
+
+
+def downgrade() -> None:
+    op.rename_table('proxy_earnings', 'proxy_earnings_partitioned')
+    op.drop_index('ix_proxy_earnings_unique_key', table_name='proxy_earnings_partitioned')
+    for column in COLUMN_INDEXES:
+        op.drop_index(f'ix_proxy_earnings_{column}', table_name='proxy_earnings_partitioned')
+    op.execute('ALTER TABLE proxy_earnings_partitioned RENAME CONSTRAINT proxy_earnings_pkey TO proxy_earnings_partitioned_pkey')
+    op.execute('ALTER SEQUENCE proxy_earnings_id_seq OWNED BY NONE')
+
+    op.create_table('proxy_earnings',
+        *_earning_columns(),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('ALTER SEQUENCE proxy_earnings_id_seq OWNED BY proxy_earnings.id')
+    op.execute(f'INSERT INTO proxy_earnings ({COLUMNS}) SELECT {COLUMNS} FROM proxy_earnings_partitioned')
+
+    op.create_index('ix_proxy_earnings_id', 'proxy_earnings', ['id'], unique=False)
+    op.create_index('ix_proxy_earnings_unique_key', 'proxy_earnings', ['unique_key'], unique=True)
+    for column in COLUMN_INDEXES:
+        op.create_index(f'ix_proxy_earnings_{column}', 'proxy_earnings', [column], unique=False)
+
+    # Секции удаляются вместе с родительской таблицей
+    op.drop_table('proxy_earnings_partitioned')
+    op.drop_index(op.f('ix_proxy_earning_keys_event_timestamp'), table_name='proxy_earning_keys')
+    op.drop_table('proxy_earning_keys')
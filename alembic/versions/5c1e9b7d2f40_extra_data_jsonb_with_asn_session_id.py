@@ -0,0 +1,79 @@
+"""extra_data as JSONB with asn and session_id columns
+
+Revision ID: 5c1e9b7d2f40
+Revises: f4a8ee535a4a
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e9b7d2f40'
+down_revision: Union[str, None] = 'f4a8ee535a4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Разбор текстового extra_data: JSON-объект как есть, строка
+# "session_id=..., asn=..., asn_org=..." от /bot/submit - в объект (None -> нет ключа),
+# прочий текст - {"raw": текст}. Функция остается для массового импорта
+# (app.services.earnings_import) и совпадает с app.schemas.earnings.parse_extra_data
+PARSE_FUNCTION = """
+    CREATE FUNCTION parse_extra_data(value text) RETURNS jsonb LANGUAGE sql IMMUTABLE AS $$
+        SELECT CASE
+            WHEN value IS NULL OR btrim(value) = '' THEN NULL
+            WHEN value IS JSON OBJECT THEN value::jsonb
+            WHEN value ~ '^session_id=.*, asn=.*, asn_org=.*$' THEN (
+                SELECT nullif(jsonb_strip_nulls(jsonb_build_object(
+                    'session_id', nullif(m[1], 'None'),
+                    'asn', CASE WHEN m[2] ~ '^[0-9]{1,18}$' THEN m[2]::bigint END,
+                    'asn_org', nullif(m[3], 'None')
+                )), '{}'::jsonb)
+                FROM regexp_match(value, '^session_id=(.*), asn=(.*), asn_org=(.*)$') AS m
+            )
+            ELSE jsonb_build_object('raw', value)
+        END
+    $$
+"""
+
+# Должно совпадать с Computed в app.models.earnings
+ASN_EXPRESSION = "CASE WHEN extra_data->>'asn' ~ '^[0-9]{1,18}$' THEN (extra_data->>'asn')::bigint END"
+SESSION_ID_EXPRESSION = "left(extra_data->>'session_id', 100)"
+
+NEWEST_FIRST = [sa.text('event_timestamp DESC'), sa.text('id DESC')]
+
+
+def upgrade() -> None:
+    op.execute(PARSE_FUNCTION)
+    # Смена типа и генерируемые колонки одной командой: таблица переписывается один раз
+    op.execute(f"""
+        ALTER TABLE proxy_earnings
+            ALTER COLUMN extra_data TYPE jsonb USING parse_extra_data(extra_data),
+            ADD COLUMN asn bigint GENERATED ALWAYS AS ({ASN_EXPRESSION}) STORED,
+            ADD COLUMN session_id varchar(100) GENERATED ALWAYS AS ({SESSION_ID_EXPRESSION}) STORED
+    """)
+
+    # Частичные индексы: у большинства старых записей asn и session_id пустые
+    op.create_index('ix_proxy_earnings_asn_event_timestamp', 'proxy_earnings', ['asn', *NEWEST_FIRST],
+                    postgresql_include=['reward_amount', 'reward_currency', 'success'],
+                    postgresql_where=sa.text('asn IS NOT NULL'))
+    op.create_index('ix_proxy_earnings_session_id_event_timestamp', 'proxy_earnings',
+                    ['session_id', *NEWEST_FIRST], postgresql_where=sa.text('session_id IS NOT NULL'))
+    op.create_index('ix_proxy_earnings_extra_data', 'proxy_earnings', [sa.text('extra_data jsonb_path_ops')],
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_proxy_earnings_extra_data', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_session_id_event_timestamp', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_asn_event_timestamp', table_name='proxy_earnings')
+    op.execute("""
+        ALTER TABLE proxy_earnings
+            DROP COLUMN session_id,
+            DROP COLUMN asn,
+            ALTER COLUMN extra_data TYPE text USING extra_data::text
+    """)
+    op.execute('DROP FUNCTION parse_extra_data(text)')
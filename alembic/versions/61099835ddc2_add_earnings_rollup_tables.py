@@ -0,0 +1,75 @@
+"""Add earnings rollup tables
+
+Revision ID: 61099835ddc2
+Revises: 934c7a14d452
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '61099835ddc2'
+down_revision: Union[str, None] = '934c7a14d452'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Почасовые агрегаты: час (UTC) x бот x прокси x валюта
+    op.create_table('earnings_rollup_hourly',
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('bot_name', sa.String(length=100), nullable=False),
+        sa.Column('proxy_key', sa.String(length=100), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('event_count', sa.BigInteger(), nullable=False),
+        sa.Column('success_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=28, scale=8), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('bucket', 'bot_name', 'proxy_key', 'reward_currency')
+    )
+    op.create_index(op.f('ix_earnings_rollup_hourly_updated_at'), 'earnings_rollup_hourly', ['updated_at'], unique=False)
+
+    # Суточные агрегаты: день (UTC) x бот x прокси x валюта
+    op.create_table('earnings_rollup_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('bot_name', sa.String(length=100), nullable=False),
+        sa.Column('proxy_key', sa.String(length=100), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('event_count', sa.BigInteger(), nullable=False),
+        sa.Column('success_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=28, scale=8), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('day', 'bot_name', 'proxy_key', 'reward_currency')
+    )
+    op.create_index(op.f('ix_earnings_rollup_daily_updated_at'), 'earnings_rollup_daily', ['updated_at'], unique=False)
+
+    # Заполняем агрегаты по уже накопленным данным
+    op.execute("""
+        INSERT INTO earnings_rollup_hourly
+            (bucket, bot_name, proxy_key, reward_currency, event_count, success_count, total_amount)
+        SELECT date_trunc('hour', event_timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+               bot_name, proxy_key, reward_currency,
+               count(*), count(*) FILTER (WHERE success), sum(reward_amount)
+        FROM proxy_earnings
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO earnings_rollup_daily
+            (day, bot_name, proxy_key, reward_currency, event_count, success_count, total_amount)
+        SELECT (event_timestamp AT TIME ZONE 'UTC')::date,
+               bot_name, proxy_key, reward_currency,
+               count(*), count(*) FILTER (WHERE success), sum(reward_amount)
+        FROM proxy_earnings
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_earnings_rollup_daily_updated_at'), table_name='earnings_rollup_daily')
+    op.drop_table('earnings_rollup_daily')
+    op.drop_index(op.f('ix_earnings_rollup_hourly_updated_at'), table_name='earnings_rollup_hourly')
+    op.drop_table('earnings_rollup_hourly')
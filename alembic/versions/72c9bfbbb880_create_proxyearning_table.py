@@ -0,0 +1,63 @@
+"""Create ProxyEarning table
+
+Revision ID: 72c9bfbbb880
+Revises: 
+Create Date: 2025-08-12 12:55:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '72c9bfbbb880'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Создание таблицы proxy_earnings
+    op.create_table('proxy_earnings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('proxy_ip', sa.String(length=45), nullable=False),
+        sa.Column('proxy_port', sa.Integer(), nullable=False),
+        sa.Column('proxy_key', sa.String(length=100), nullable=False),
+        sa.Column('server_id', sa.String(length=50), nullable=False),
+        sa.Column('bot_id', sa.String(length=50), nullable=False),
+        sa.Column('bot_name', sa.String(length=100), nullable=False),
+        sa.Column('faucet_name', sa.String(length=100), nullable=False),
+        sa.Column('faucet_url', sa.String(length=255), nullable=True),
+        sa.Column('reward_amount', sa.Numeric(precision=20, scale=8), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('unique_key', sa.String(length=64), nullable=False),
+        sa.Column('success', sa.Boolean(), nullable=False, default=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('event_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('extra_data', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    # Создание индексов
+    op.create_index('ix_proxy_earnings_id', 'proxy_earnings', ['id'], unique=False)
+    op.create_index('ix_proxy_earnings_proxy_ip', 'proxy_earnings', ['proxy_ip'], unique=False)
+    op.create_index('ix_proxy_earnings_proxy_key', 'proxy_earnings', ['proxy_key'], unique=False)
+    op.create_index('ix_proxy_earnings_server_id', 'proxy_earnings', ['server_id'], unique=False)
+    op.create_index('ix_proxy_earnings_bot_name', 'proxy_earnings', ['bot_name'], unique=False)
+    op.create_index('ix_proxy_earnings_unique_key', 'proxy_earnings', ['unique_key'], unique=True)
+
+
+def downgrade() -> None:
+    # Удаление индексов
+    op.drop_index('ix_proxy_earnings_unique_key', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_bot_name', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_server_id', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_proxy_key', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_proxy_ip', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_id', table_name='proxy_earnings')
+    
+    # Удаление таблицы
+    op.drop_table('proxy_earnings')
@@ -0,0 +1,52 @@
+"""Composite indexes for earnings queries
+
+Revision ID: 8a6b798d91d3
+Revises: 193bce581e57
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a6b798d91d3'
+down_revision: Union[str, None] = '193bce581e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Одиночные индексы, которые становятся префиксами составных
+REPLACED_INDEXES = ['bot_name', 'proxy_key', 'server_id']
+
+# Колонки для подсчета сумм только по индексу
+COVERING = ['reward_amount', 'reward_currency', 'success']
+
+
+def upgrade() -> None:
+    # Индексы на родительской таблице создаются на всех секциях, включая будущие
+    newest_first = [sa.text('event_timestamp DESC'), sa.text('id DESC')]
+    op.create_index('ix_proxy_earnings_bot_name_event_timestamp', 'proxy_earnings',
+                    ['bot_name', *newest_first], postgresql_include=COVERING)
+    op.create_index('ix_proxy_earnings_proxy_key_event_timestamp', 'proxy_earnings',
+                    ['proxy_key', *newest_first], postgresql_include=COVERING)
+    op.create_index('ix_proxy_earnings_server_id_event_timestamp', 'proxy_earnings',
+                    ['server_id', *newest_first])
+    op.create_index('ix_proxy_earnings_event_timestamp_id', 'proxy_earnings', newest_first)
+    op.create_index('ix_proxy_earnings_event_timestamp_brin', 'proxy_earnings', ['event_timestamp'],
+                    postgresql_using='brin')
+
+    for column in REPLACED_INDEXES:
+        op.drop_index(f'ix_proxy_earnings_{column}', table_name='proxy_earnings')
+
+
+def downgrade() -> None:
+    for column in REPLACED_INDEXES:
+        op.create_index(f'ix_proxy_earnings_{column}', 'proxy_earnings', [column], unique=False)
+
+    op.drop_index('ix_proxy_earnings_event_timestamp_brin', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_event_timestamp_id', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_server_id_event_timestamp', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_proxy_key_event_timestamp', table_name='proxy_earnings')
+    op.drop_index('ix_proxy_earnings_bot_name_event_timestamp', table_name='proxy_earnings')
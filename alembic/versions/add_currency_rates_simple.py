@@ -0,0 +1,41 @@
+"""Add currency_rates table
+
+Revision ID: add_currency_rates_simple
+Revises: 0eb8a28fe552
+Create Date: 2025-08-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_currency_rates_simple'
+down_revision = '0eb8a28fe552'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Создаем таблицу currency_rates
+    op.create_table('currency_rates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('symbol', sa.String(length=10), nullable=False),
+        sa.Column('price', sa.Numeric(precision=20, scale=8), nullable=False),
+        sa.Column('last_updated', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    
+    # Создаем индексы
+    op.create_index(op.f('ix_currency_rates_id'), 'currency_rates', ['id'], unique=False)
+    op.create_index(op.f('ix_currency_rates_symbol'), 'currency_rates', ['symbol'], unique=False)
+    
+    # Создаем уникальное ограничение на symbol
+    op.create_unique_constraint('currency_rates_symbol_key', 'currency_rates', ['symbol'])
+
+
+def downgrade() -> None:
+    # Удаляем таблицу currency_rates
+    op.drop_index(op.f('ix_currency_rates_symbol'), table_name='currency_rates')
+    op.drop_index(op.f('ix_currency_rates_id'), table_name='currency_rates')
+    op.drop_table('currency_rates')
@@ -0,0 +1,75 @@
+"""Add ASN rollup tables
+
+Revision ID: b7d3f1a9c2e5
+Revises: 5c1e9b7d2f40
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3f1a9c2e5'
+down_revision: Union[str, None] = '5c1e9b7d2f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Почасовые агрегаты по ASN прокси: час (UTC) x ASN x валюта
+    op.create_table('earnings_rollup_asn_hourly',
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('asn', sa.BigInteger(), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('event_count', sa.BigInteger(), nullable=False),
+        sa.Column('success_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=28, scale=8), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('bucket', 'asn', 'reward_currency')
+    )
+    op.create_index(op.f('ix_earnings_rollup_asn_hourly_updated_at'), 'earnings_rollup_asn_hourly', ['updated_at'], unique=False)
+
+    # Суточные агрегаты по ASN прокси: день (UTC) x ASN x валюта
+    op.create_table('earnings_rollup_asn_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('asn', sa.BigInteger(), nullable=False),
+        sa.Column('reward_currency', sa.String(length=10), nullable=False),
+        sa.Column('event_count', sa.BigInteger(), nullable=False),
+        sa.Column('success_count', sa.BigInteger(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=28, scale=8), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('day', 'asn', 'reward_currency')
+    )
+    op.create_index(op.f('ix_earnings_rollup_asn_daily_updated_at'), 'earnings_rollup_asn_daily', ['updated_at'], unique=False)
+
+    # Заполняем агрегаты по уже накопленным данным (частичный индекс по asn)
+    op.execute("""
+        INSERT INTO earnings_rollup_asn_hourly
+            (bucket, asn, reward_currency, event_count, success_count, total_amount)
+        SELECT date_trunc('hour', event_timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+               asn, reward_currency,
+               count(*), count(*) FILTER (WHERE success), sum(reward_amount)
+        FROM proxy_earnings
+        WHERE asn IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO earnings_rollup_asn_daily
+            (day, asn, reward_currency, event_count, success_count, total_amount)
+        SELECT (event_timestamp AT TIME ZONE 'UTC')::date,
+               asn, reward_currency,
+               count(*), count(*) FILTER (WHERE success), sum(reward_amount)
+        FROM proxy_earnings
+        WHERE asn IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_earnings_rollup_asn_daily_updated_at'), table_name='earnings_rollup_asn_daily')
+    op.drop_table('earnings_rollup_asn_daily')
+    op.drop_index(op.f('ix_earnings_rollup_asn_hourly_updated_at'), table_name='earnings_rollup_asn_hourly')
+    op.drop_table('earnings_rollup_asn_hourly')
@@ -0,0 +1,34 @@
+"""Add rollup_version counter
+
+Revision ID: c4e81f2a9d37
+Revises: b7d3f1a9c2e5
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e81f2a9d37'
+down_revision: Union[str, None] = 'b7d3f1a9c2e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия агрегатов для ETag и кэша статистики: растет с каждой транзакцией,
+    # которая меняет агрегаты, в порядке коммитов
+    op.create_table('rollup_version',
+        sa.Column('id', sa.SmallInteger(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO rollup_version (id, version, updated_at) VALUES (1, 1, clock_timestamp())")
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_version')
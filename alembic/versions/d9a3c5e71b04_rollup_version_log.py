@@ -0,0 +1,44 @@
+"""Rollup version as an append-only log
+
+Revision ID: d9a3c5e71b04
+Revises: c4e81f2a9d37
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a3c5e71b04'
+down_revision: Union[str, None] = 'c4e81f2a9d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия агрегатов - журнал: строка на каждое изменение, номер из последовательности.
+    # Единственная строка-счетчик блокировалась всеми транзакциями записи.
+    # Нумерация продолжается с текущей версии, чтобы старые ETag не совпали с новыми
+    op.execute("CREATE SEQUENCE rollup_version_version_seq OWNED BY rollup_version.version")
+    op.execute(
+        "SELECT setval('rollup_version_version_seq', "
+        "coalesce((SELECT max(version) FROM rollup_version), 1))"
+    )
+    op.execute("ALTER TABLE rollup_version ALTER COLUMN version SET DEFAULT nextval('rollup_version_version_seq')")
+    op.drop_constraint('rollup_version_pkey', 'rollup_version', type_='primary')
+    op.drop_column('rollup_version', 'id')
+    op.create_primary_key('rollup_version_pkey', 'rollup_version', ['version'])
+
+
+def downgrade() -> None:
+    # Обратно к одной строке с id = 1: остается последняя версия
+    op.execute("DELETE FROM rollup_version WHERE version < (SELECT max(version) FROM rollup_version)")
+    op.drop_constraint('rollup_version_pkey', 'rollup_version', type_='primary')
+    op.add_column('rollup_version', sa.Column('id', sa.SmallInteger(), nullable=False, server_default='1'))
+    op.alter_column('rollup_version', 'id', server_default=None)
+    op.create_primary_key('rollup_version_pkey', 'rollup_version', ['id'])
+    op.execute("ALTER TABLE rollup_version ALTER COLUMN version DROP DEFAULT")
+    op.execute("DROP SEQUENCE rollup_version_version_seq")
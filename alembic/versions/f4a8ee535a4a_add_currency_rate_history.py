@@ -0,0 +1,64 @@
+"""Add currency_rate_history
+
+Revision ID: f4a8ee535a4a
+Revises: 8a6b798d91d3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a8ee535a4a'
+down_revision: Union[str, None] = '8a6b798d91d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month_start(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(start: datetime) -> datetime:
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def upgrade() -> None:
+    op.create_table('currency_rate_history',
+        sa.Column('symbol', sa.String(length=10), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('price', sa.Numeric(precision=20, scale=8), nullable=False),
+        sa.PrimaryKeyConstraint('symbol', 'fetched_at'),
+        postgresql_partition_by='RANGE (fetched_at)'
+    )
+
+    # Помесячные секции от самого старого текущего курса до трех месяцев вперед
+    now = datetime.now(timezone.utc)
+    first = op.get_bind().execute(sa.text('SELECT min(last_updated) FROM currency_rates')).scalar()
+    if first is not None and first.tzinfo is None:
+        first = first.replace(tzinfo=timezone.utc)
+    start = _month_start(max(first or now, now - timedelta(days=5 * 365)))
+    end = _month_start(now)
+    for _ in range(4):
+        end = _next_month(end)
+    while start < end:
+        month_end = _next_month(start)
+        op.execute(
+            f"CREATE TABLE currency_rate_history_p{start:%Y_%m} PARTITION OF currency_rate_history "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{month_end.isoformat()}')"
+        )
+        start = month_end
+    op.execute('CREATE TABLE currency_rate_history_default PARTITION OF currency_rate_history DEFAULT')
+
+    # Текущие курсы - первая точка истории
+    op.execute('INSERT INTO currency_rate_history (symbol, fetched_at, price) '
+               'SELECT symbol, last_updated, price FROM currency_rates')
+
+
+def downgrade() -> None:
+    # Секции удаляются вместе с родительской таблицей
+    op.drop_table('currency_rate_history')
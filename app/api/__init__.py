@@ -1,4 +1,5 @@
 from .earnings import router as earnings_router
 from .currency import router as currency_router
+from .stats import router as stats_router
 
-__all__ = ["earnings_router", "currency_router"]
+__all__ = ["earnings_router", "currency_router", "stats_router"]
@@ -1,12 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from sqlalchemy import select, func, Select
+from typing import List, Optional, Literal
+from datetime import datetime
+from decimal import Decimal
+import json
 import logging
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_read_db
 from app.models.earnings import ProxyEarning
-from app.schemas.earnings import EarningCreate, EarningResponse
+from app.schemas.earnings import (
+    EarningCreate, EarningResponse, EarningAck, EarningBatchItem, EarningBatchResponse, EarningImportResponse
+)
+from app.services.ingest import insert_earnings, get_earning_record
+from app.services.ingest_buffer import IngestQueueFull
+from app.services.idempotency import submit_earning, recent_keys
+from app.services.pagination import encode_cursor, newest_first
+from app.services.rollups import commit_rollups
+from app.services.export import stream_earnings, copy_earnings, stream_parquet, pyarrow, MEDIA_TYPES
+from app.services.earnings_import import import_earnings, EarningsImportError
+from app.services.serialization import dumps_rows
 
 # --- СОЗДАЕМ ЛОГГЕР ---
 logger = logging.getLogger(__name__)
@@ -18,16 +35,18 @@ router = APIRouter(prefix="/earnings", tags=["earnings"])
 @router.post("/", response_model=EarningResponse)
 async def create_earning(
     earning: EarningCreate,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
-    """Создание новой записи заработка"""
+    """
+    Создание новой записи заработка.
+
+    Идемпотентно по unique_key: повтор уже записанного события возвращает
+    исходную запись с заголовком Idempotent-Replayed: true. Ответ всегда
+    строится из записанной строки, а не из тела запроса: повтор с другими
+    суммой или временем получает то, что хранится в базе.
+    """
     try:
-        # ✅ Отладка - посмотрим что получаем от Pydantic
-        print("=== DEBUG: Received earning object ===")
-        print(f"proxy_key: {earning.proxy_key}")
-        print(f"unique_key: {earning.unique_key}")
-        print(f"All fields: {earning.model_dump()}")
-        
         # ✅ Используем model_dump() вместо dict()
         earning_dict = earning.model_dump()
         
@@ -37,36 +56,350 @@ async def create_earning(
         if not earning_dict.get('unique_key'):
             raise HTTPException(status_code=400, detail="unique_key is required")
         
-        db_earning = ProxyEarning(**earning_dict)
-        db.add(db_earning)
-        await db.commit()
-        await db.refresh(db_earning)
-        
-        return db_earning
+        stored, status = await submit_earning(db, earning_dict)
+        if status == "queued":
+            return JSONResponse(status_code=202, content={"status": "queued", "unique_key": earning.unique_key})
+        if status == "replayed":
+            response.headers["Idempotent-Replayed"] = "true"
+        record = await get_earning_record(db, earning.unique_key)
+        if record is None:
+            raise LookupError(f"unique_key {earning.unique_key} was stored but the record was not found")
+        return EarningResponse.model_validate(record)
+    except IngestQueueFull:
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Error creating earning: {str(e)}")
 
 
+@router.post(
+    "/ingest",
+    response_model=EarningAck,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": "#/components/schemas/EarningCreate"}}},
+        }
+    },
+)
+async def ingest_earning(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Быстрый прием одного события: те же проверки и идемпотентность, что у POST /earnings/,
+    но без эхо всей записи в ответе.
+
+    Тело разбирается и проверяется pydantic-core напрямую из байтов (без
+    промежуточного dict), ответ - EarningAck, сериализуемый одним вызовом без
+    повторной валидации response_model.
+    """
+    try:
+        earning = EarningCreate.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Формат ошибок как у обычных эндпоинтов FastAPI (loc начинается с body)
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False, include_context=False)
+        ])
+    if not earning.proxy_key or not earning.unique_key:
+        raise HTTPException(status_code=400, detail="proxy_key and unique_key are required")
+
+    try:
+        stored, status = await submit_earning(db, earning.model_dump())
+    except IngestQueueFull:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating earning: {str(e)}")
+
+    if status == "queued":
+        ack = EarningAck(status=status, unique_key=earning.unique_key)
+    else:
+        ack = EarningAck(status=status, unique_key=earning.unique_key, id=stored.id, created_at=stored.created_at)
+    headers = {"Idempotent-Replayed": "true"} if status == "replayed" else None
+    return Response(ack.model_dump_json(exclude_none=True), status_code=202 if status == "queued" else 200,
+                    media_type="application/json", headers=headers)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Краткое описание ошибок валидации одной записи пакета"""
+    return "; ".join(
+        f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+        for err in error.errors()
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=EarningBatchResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/EarningCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_earnings_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Пакетное создание записей заработка (JSON-массив или NDJSON).
+
+    Все валидные записи пишутся одной транзакцией; для каждой записи
+    возвращается статус accepted / duplicate / invalid.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    # Разбираем тело в список (позиция, запись | ошибка)
+    items = []
+    if "ndjson" in content_type:
+        lines = [line for line in body.splitlines() if line.strip()]
+        if len(lines) > settings.EARNINGS_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch is limited to {settings.EARNINGS_BATCH_MAX_ITEMS} records")
+        for index, line in enumerate(lines):
+            try:
+                items.append((index, EarningCreate.model_validate_json(line)))
+            except ValidationError as e:
+                items.append((index, e))
+    else:
+        try:
+            # parse_float=Decimal сохраняет точность reward_amount
+            payload = json.loads(body, parse_float=Decimal)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of earnings")
+        if len(payload) > settings.EARNINGS_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch is limited to {settings.EARNINGS_BATCH_MAX_ITEMS} records")
+        for index, raw in enumerate(payload):
+            try:
+                items.append((index, EarningCreate.model_validate(raw)))
+            except ValidationError as e:
+                items.append((index, e))
+
+    results = []
+    rows = []
+    seen_keys = set()
+    for index, item in items:
+        if isinstance(item, ValidationError):
+            results.append(EarningBatchItem(index=index, status="invalid", error=_format_validation_error(item)))
+            continue
+        if not item.proxy_key or not item.unique_key:
+            results.append(EarningBatchItem(index=index, status="invalid", unique_key=item.unique_key or None,
+                                            error="proxy_key and unique_key are required"))
+            continue
+        # Повтор ключа внутри одного пакета сразу считаем дубликатом
+        if item.unique_key in seen_keys:
+            results.append(EarningBatchItem(index=index, status="duplicate", unique_key=item.unique_key))
+            continue
+        seen_keys.add(item.unique_key)
+        # Недавно записанные ключи отвечаем из кэша, не отправляя их в БД
+        stored = recent_keys.get(item.unique_key)
+        if stored is not None:
+            results.append(EarningBatchItem(index=index, status="duplicate", id=stored.id, unique_key=item.unique_key))
+            continue
+        rows.append(item.model_dump())
+        results.append(EarningBatchItem(index=index, status="accepted", unique_key=item.unique_key))
+
+    inserted = {}
+    if rows:
+        try:
+            inserted = await insert_earnings(db, rows)
+            await commit_rollups(db)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Ошибка пакетной вставки {len(rows)} записей: {e}")
+            raise HTTPException(status_code=500, detail=f"Error creating earnings batch: {str(e)}")
+
+    # Записи, которых нет в RETURNING, уже существовали в БД
+    for result in results:
+        if result.status == "accepted":
+            row = inserted.get(result.unique_key)
+            if row is None:
+                result.status = "duplicate"
+            else:
+                result.id = row.id
+                recent_keys.put(result.unique_key, row)
+
+    return EarningBatchResponse(
+        accepted=sum(1 for r in results if r.status == "accepted"),
+        duplicates=sum(1 for r in results if r.status == "duplicate"),
+        invalid=sum(1 for r in results if r.status == "invalid"),
+        results=results,
+    )
+
+
+def time_filters(since: Optional[datetime], until: Optional[datetime]) -> list:
+    """Фильтр по event_timestamp: Postgres читает только секции из диапазона"""
+    filters = []
+    if since is not None:
+        filters.append(ProxyEarning.event_timestamp >= since)
+    if until is not None:
+        filters.append(ProxyEarning.event_timestamp < until)
+    return filters
+
+
+def attribute_filters(asn: Optional[int], session_id: Optional[str], asn_org: Optional[str]) -> list:
+    """Фильтры по полям extra_data: asn и session_id - по колонкам с индексами, asn_org - через GIN"""
+    filters = []
+    if asn is not None:
+        filters.append(ProxyEarning.asn == asn)
+    if session_id is not None:
+        filters.append(ProxyEarning.session_id == session_id)
+    if asn_org is not None:
+        filters.append(ProxyEarning.extra_data.contains({"asn_org": asn_org}))
+    return filters
+
+
+def earnings_query(filters: list, cursor: Optional[str] = None, columns: bool = False) -> Select:
+    """
+    Запрос списка записей (от новых к старым) для эндпоинтов и проверки планов.
+
+    columns=True выбирает колонки вместо ORM-объектов (для потоковой выгрузки).
+    ValueError для поврежденного курсора.
+    """
+    stmt = select(*ProxyEarning.__table__.columns) if columns else select(ProxyEarning)
+    return newest_first(stmt.where(*filters), cursor)
+
+
+async def _list_earnings(
+    request: Request,
+    db: AsyncSession,
+    filters: list,
+    limit: int,
+    cursor: Optional[str],
+    fmt: str,
+    skip: int = 0,
+):
+    """
+    Общая выдача списков записей: страница JSON с курсором или потоковая выгрузка.
+
+    Записи идут от новых к старым по (event_timestamp, id). Если есть следующая
+    страница, ее курсор возвращается в заголовках X-Next-Cursor и Link.
+
+    Страница JSON собирается из строк запроса сразу в байты (dumps_rows): без
+    ORM-объектов и EarningResponse, но в том же формате - колонки таблицы
+    совпадают с полями EarningResponse.
+    """
+    try:
+        if fmt != "json":
+            # Выгрузка без ограничения по limit, начиная с курсора (если он есть)
+            stmt = earnings_query(filters, cursor, columns=True)
+            return StreamingResponse(
+                stream_earnings(stmt, fmt),
+                media_type=MEDIA_TYPES[fmt],
+                headers={"Content-Disposition": f'attachment; filename="earnings.{fmt}"'},
+            )
+        stmt = earnings_query(filters, cursor, columns=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if skip:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt.limit(limit + 1))
+    keys = list(result.keys())
+    earnings = result.all()
+
+    headers = {}
+    if len(earnings) > limit:
+        earnings = earnings[:limit]
+        last = earnings[-1]
+        next_cursor = encode_cursor(last.event_timestamp, last.id)
+        next_url = request.url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url}>; rel="next"'
+    return Response(dumps_rows(keys, earnings), media_type="application/json", headers=headers)
+
 
 @router.get("/", response_model=List[EarningResponse])
 async def get_earnings(
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    skip: int = Query(0, ge=0, deprecated=True, description="Смещение (используйте cursor)"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из X-Next-Cursor"),
+    since: Optional[datetime] = Query(None, description="События начиная с этого времени"),
+    until: Optional[datetime] = Query(None, description="События до этого времени (не включая)"),
+    asn: Optional[int] = Query(None, description="Только записи с этим ASN прокси"),
+    session_id: Optional[str] = Query(None, description="Только записи сессии бота"),
+    asn_org: Optional[str] = Query(None, description="Только записи организации ASN (extra_data.asn_org)"),
+    fmt: Literal["json", "ndjson", "csv"] = Query("json", alias="format", description="ndjson/csv - потоковая выгрузка всех записей"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение списка записей заработка"""
-    result = await db.execute(
-        select(ProxyEarning).offset(skip).limit(limit)
+    """Получение списка записей заработка (от новых к старым)"""
+    filters = [*time_filters(since, until), *attribute_filters(asn, session_id, asn_org)]
+    return await _list_earnings(request, db, filters, limit, cursor, fmt, skip)
+
+
+@router.get("/export")
+async def export_earnings(
+    fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format", description="Формат выгрузки"),
+    bot_name: Optional[str] = Query(None, description="Только записи бота"),
+    proxy_key: Optional[str] = Query(None, description="Только записи прокси"),
+    server_id: Optional[str] = Query(None, description="Только записи сервера"),
+    since: Optional[datetime] = Query(None, description="События начиная с этого времени"),
+    until: Optional[datetime] = Query(None, description="События до этого времени (не включая)"),
+    asn: Optional[int] = Query(None, description="Только записи с этим ASN прокси"),
+    session_id: Optional[str] = Query(None, description="Только записи сессии бота"),
+    asn_org: Optional[str] = Query(None, description="Только записи организации ASN (extra_data.asn_org)"),
+):
+    """
+    Массовая выгрузка записей заработка (без сортировки).
+
+    CSV и NDJSON формирует Postgres через COPY TO STDOUT; Parquet (нужен pyarrow)
+    собирается группами строк из серверного курсора. Память не зависит от объема.
+    """
+    filters = [*time_filters(since, until), *attribute_filters(asn, session_id, asn_org)]
+    for column, value in ((ProxyEarning.bot_name, bot_name), (ProxyEarning.proxy_key, proxy_key),
+                          (ProxyEarning.server_id, server_id)):
+        if value is not None:
+            filters.append(column == value)
+
+    if fmt == "parquet":
+        if pyarrow is None:
+            raise HTTPException(status_code=400, detail="Parquet export requires pyarrow")
+        stream = stream_parquet(filters)
+    else:
+        stream = copy_earnings(filters, fmt)
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="earnings.{fmt}"'},
     )
-    earnings = result.scalars().all()
-    return earnings
+
+
+@router.post("/import", response_model=EarningImportResponse)
+async def import_earnings_file(
+    request: Request,
+    fmt: Literal["csv", "ndjson", "parquet"] = Query("csv", alias="format", description="Формат тела запроса"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Массовый импорт записей из файла в теле запроса (CSV с заголовком, NDJSON, Parquet).
+
+    Тело потоком идет в COPY FROM STDIN; записи с уже известным unique_key
+    пропускаются. Импорт атомарный: ошибка в любой строке отменяет весь файл.
+    """
+    try:
+        result = await import_earnings(db, request.stream(), fmt)
+        await commit_rollups(db)
+    except EarningsImportError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return result
 
 
 @router.get("/{earning_id}", response_model=EarningResponse)
 async def get_earning(
     earning_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получение записи заработка по ID"""
     result = await db.execute(
@@ -83,24 +416,38 @@ async def get_earning(
 @router.get("/proxy/{proxy_key}", response_model=List[EarningResponse])
 async def get_earnings_by_proxy(
     proxy_key: str,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из X-Next-Cursor"),
+    since: Optional[datetime] = Query(None, description="События начиная с этого времени"),
+    until: Optional[datetime] = Query(None, description="События до этого времени (не включая)"),
+    asn: Optional[int] = Query(None, description="Только записи с этим ASN прокси"),
+    session_id: Optional[str] = Query(None, description="Только записи сессии бота"),
+    asn_org: Optional[str] = Query(None, description="Только записи организации ASN (extra_data.asn_org)"),
+    fmt: Literal["json", "ndjson", "csv"] = Query("json", alias="format", description="ndjson/csv - потоковая выгрузка всех записей"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение записей заработка по ключу прокси"""
-    result = await db.execute(
-        select(ProxyEarning).where(ProxyEarning.proxy_key == proxy_key)
-    )
-    earnings = result.scalars().all()
-    return earnings
+    """Получение записей заработка по ключу прокси (от новых к старым)"""
+    filters = [ProxyEarning.proxy_key == proxy_key, *time_filters(since, until),
+               *attribute_filters(asn, session_id, asn_org)]
+    return await _list_earnings(request, db, filters, limit, cursor, fmt)
 
 
 @router.get("/bot/{bot_name}", response_model=List[EarningResponse])
 async def get_earnings_by_bot(
     bot_name: str,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из X-Next-Cursor"),
+    since: Optional[datetime] = Query(None, description="События начиная с этого времени"),
+    until: Optional[datetime] = Query(None, description="События до этого времени (не включая)"),
+    asn: Optional[int] = Query(None, description="Только записи с этим ASN прокси"),
+    session_id: Optional[str] = Query(None, description="Только записи сессии бота"),
+    asn_org: Optional[str] = Query(None, description="Только записи организации ASN (extra_data.asn_org)"),
+    fmt: Literal["json", "ndjson", "csv"] = Query("json", alias="format", description="ndjson/csv - потоковая выгрузка всех записей"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение записей заработка по имени бота"""
-    result = await db.execute(
-        select(ProxyEarning).where(ProxyEarning.bot_name == bot_name)
-    )
-    earnings = result.scalars().all()
-    return earnings
+    """Получение записей заработка по имени бота (от новых к старым)"""
+    filters = [ProxyEarning.bot_name == bot_name, *time_filters(since, until),
+               *attribute_filters(asn, session_id, asn_org)]
+    return await _list_earnings(request, db, filters, limit, cursor, fmt)
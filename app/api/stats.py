@@ -0,0 +1,122 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from datetime import timedelta
+from typing import Literal, Optional
+import logging
+
+from app.database import read_sessionmaker
+from app.services.analytics import Window, performance_query, WINDOWS, SORT_FIELDS
+from app.services.http_cache import rollup_version, revalidate_stats
+from app.services.stats_cache import stats_cache
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+WindowName = Literal[tuple(WINDOWS)]
+SortField = Literal[SORT_FIELDS]
+
+
+async def _load_performance(dimension: str, key_name: str, bounds: Window, sort: str, order: str, limit: int,
+                            offset: int, min_events: int, reward_currency: Optional[str]) -> dict:
+    stmt = performance_query(dimension, bounds, sort, order == "desc", limit, offset, min_events, reward_currency)
+    try:
+        async with read_sessionmaker()() as db:
+            rows = (await db.execute(stmt)).all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения статистики: {str(e)}")
+
+    return {
+        "window": bounds.name,
+        "window_hours": bounds.hours,
+        "start": bounds.start.isoformat(),
+        "end": bounds.end.isoformat(),
+        "sort": sort,
+        "order": order,
+        "reward_currency": reward_currency,
+        "total": rows[0].total if rows else 0,
+        "limit": limit,
+        "offset": offset,
+        "items": [
+            {
+                "rank": row.rank,
+                key_name: row.key,
+                "events": row.events,
+                "successes": row.successes,
+                "failures": row.failures,
+                "success_rate": float(row.success_rate),
+                "total_amount": float(row.total_amount),
+                "earnings_per_hour": float(row.earnings_per_hour),
+            }
+            for row in rows
+        ],
+    }
+
+
+async def _performance(request: Request, response: Response, dimension: str, key_name: str,
+                       window: str, sort: str, order: str, limit: int, offset: int, min_events: int,
+                       reward_currency: Optional[str]):
+    """
+    Рейтинг за окно; результат кэшируется по версии агрегатов, одновременные
+    одинаковые запросы ждут один запрос к БД.
+
+    ETag/Last-Modified - по версии агрегатов и началу текущего часа (окно
+    сдвигается раз в час): на If-None-Match с тем же ETag отдается 304 без
+    расчета рейтинга.
+    """
+    reward_currency = reward_currency.upper() if reward_currency else None
+    bounds = Window.ending_at(window)
+    try:
+        # Соединение возвращается в пул до ожидания загрузки (см. _stats_versions в main)
+        async with read_sessionmaker()() as db:
+            version = await rollup_version(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения статистики: {str(e)}")
+    # Окно сдвигается раз в час: в ключе его конец, а не текущее время
+    variant = (dimension, bounds.end, window, sort, order, limit, offset, min_events, reward_currency)
+    not_modified = revalidate_stats(request, response, version, bounds.end - timedelta(hours=1), variant=variant)
+    if not_modified:
+        return not_modified
+    return await stats_cache.get_or_load(
+        (version, *variant),
+        lambda: _load_performance(dimension, key_name, bounds, sort, order, limit, offset, min_events, reward_currency),
+    )
+
+
+@router.get("/proxies")
+async def get_proxy_stats(
+    request: Request,
+    response: Response,
+    window: WindowName = Query("24h", description="Скользящее окно, включая текущий час"),
+    sort: SortField = Query("earnings", description="Показатель рейтинга"),
+    order: Literal["desc", "asc"] = Query("desc", description="desc - лучшие, asc - худшие"),
+    limit: int = Query(50, ge=1, le=1000, description="Размер страницы (top-N)"),
+    offset: int = Query(0, ge=0, le=100_000),
+    min_events: int = Query(1, ge=1, description="Не учитывать прокси с меньшим числом событий за окно"),
+    reward_currency: Optional[str] = Query(None, description="Только события в этой валюте")
+):
+    """
+    Рейтинг прокси за окно: события, успешные/неуспешные, доля успешных,
+    сумма и заработок в час (из агрегатов статистики).
+    """
+    return await _performance(request, response, "proxy", "proxy_key", window, sort, order, limit, offset,
+                              min_events, reward_currency)
+
+
+@router.get("/asn")
+async def get_asn_stats(
+    request: Request,
+    response: Response,
+    window: WindowName = Query("24h", description="Скользящее окно, включая текущий час"),
+    sort: SortField = Query("earnings", description="Показатель рейтинга"),
+    order: Literal["desc", "asc"] = Query("desc", description="desc - лучшие, asc - худшие"),
+    limit: int = Query(50, ge=1, le=1000, description="Размер страницы (top-N)"),
+    offset: int = Query(0, ge=0, le=100_000),
+    min_events: int = Query(1, ge=1, description="Не учитывать ASN с меньшим числом событий за окно"),
+    reward_currency: Optional[str] = Query(None, description="Только события в этой валюте")
+):
+    """
+    Рейтинг ASN прокси за окно (записи с extra_data.asn): те же показатели,
+    что у /stats/proxies.
+    """
+    return await _performance(request, response, "asn", "asn", window, sort, order, limit, offset, min_events,
+                              reward_currency)
@@ -1,13 +1,82 @@
+import time
+import uuid
+from sqlalchemy import exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Dict, Optional
 from app.config import settings
+from app.services.metrics import registry
+from app.services.profiling import instrument_engine
+
+
+class PoolWaitStats:
+    """Сколько запросы ждали свободное соединение пула"""
+
+    def __init__(self):
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, seconds: float, timed_out: bool = False):
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.acquired += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+# Статистика ожидания по имени пула (pool_logging_name движка)
+pool_wait_stats: Dict[str, PoolWaitStats] = {}
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """QueuePool, который измеряет время получения соединения (ожидание + открытие нового)"""
+
+    def _do_get(self):
+        stats = pool_wait_stats.setdefault(self._orig_logging_name or "default", PoolWaitStats())
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        stats.record(time.perf_counter() - start)
+        return entry
+
+
+def engine_options(name: str) -> dict:
+    """Параметры пула и драйвера asyncpg из Settings"""
+    if settings.DB_PGBOUNCER:
+        # PgBouncer в режиме transaction отдает каждую транзакцию случайному серверному
+        # соединению: именованные prepared statements там не живут, кэши выключаем,
+        # а имена делаем уникальными, чтобы не столкнуться с чужими
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        connect_args = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return dict(
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
 
 # Создаем асинхронный движок БД
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True
-)
+engine = create_async_engine(settings.database_url, **engine_options("primary"))
+
+instrument_engine(engine, "primary")
 
 # Создаем фабрику сессий
 AsyncSessionLocal = async_sessionmaker(
@@ -16,10 +85,90 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Сессии только для чтения: соединения того же пула в режиме autocommit,
+# без лишних BEGIN/ROLLBACK на каждый запрос
+ReadSessionLocal = async_sessionmaker(
+    engine.execution_options(isolation_level="AUTOCOMMIT"),
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+class ReplicaHealth:
+    """
+    Последний результат проверки реплики (обновляет app.services.replica).
+
+    Реплика используется, только если проверка прошла недавно, а отставание
+    не больше REPLICA_MAX_LAG_SECONDS; иначе чтение уходит на основную БД.
+    """
+
+    def __init__(self):
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    @property
+    def usable(self) -> bool:
+        if self.checked_at is None or self.error is not None or self.lag is None:
+            return False
+        # Проверка давно не проходила (фоновая задача остановлена) - не доверяем
+        if time.monotonic() - self.checked_at > 3 * settings.REPLICA_LAG_CHECK_SECONDS:
+            return False
+        return self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+replica_health = ReplicaHealth()
+
+replica_engine = (
+    create_async_engine(settings.replica_database_url, **engine_options("replica"))
+    if settings.replica_database_url else None
+)
+
+if replica_engine is not None:
+    ReplicaSessionLocal = async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    ReplicaReadSessionLocal = async_sessionmaker(
+        replica_engine.execution_options(isolation_level="AUTOCOMMIT"),
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+    instrument_engine(replica_engine, "replica")
+else:
+    ReplicaSessionLocal = ReplicaReadSessionLocal = None
+
+
+def read_sessionmaker(autocommit: bool = True) -> async_sessionmaker:
+    """
+    Фабрика сессий для чтения: реплика, если она настроена и не отстает, иначе основная БД.
+
+    autocommit=False нужен для серверных курсоров (потоковые выгрузки).
+    """
+    if replica_engine is not None and replica_health.usable:
+        return ReplicaReadSessionLocal if autocommit else ReplicaSessionLocal
+    return ReadSessionLocal if autocommit else AsyncSessionLocal
+
+
 # Базовый класс для моделей
 Base = declarative_base()
 
 
+def pool_status(db_engine=engine) -> dict:
+    """Состояние пула: занятые соединения, overflow и время ожидания"""
+    pool = db_engine.pool
+    stats = pool_wait_stats.get(pool._orig_logging_name or "default", PoolWaitStats())
+    attempts = stats.acquired + stats.timeouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "acquired": stats.acquired,
+        "timeouts": stats.timeouts,
+        "wait_avg_ms": round(stats.wait_total / attempts * 1000, 3) if attempts else 0.0,
+        "wait_max_ms": round(stats.wait_max * 1000, 3),
+    }
+
+
 # Dependency для получения сессии БД
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -27,3 +176,27 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+# Dependency для эндпоинтов, которые только читают (с реплики, если она доступна)
+async def get_read_db():
+    async with read_sessionmaker()() as session:
+        yield session
+
+
+def _pool_samples(field: str):
+    engines = [("primary", engine)] + ([("replica", replica_engine)] if replica_engine is not None else [])
+    return [((name, ), pool_status(db_engine)[field]) for name, db_engine in engines]
+
+
+registry.callback("db_pool_size", "Connections kept in the pool", ("pool",), lambda: _pool_samples("size"))
+registry.callback("db_pool_checked_out", "Connections in use", ("pool",), lambda: _pool_samples("checked_out"))
+registry.callback("db_pool_overflow", "Overflow connections open", ("pool",), lambda: _pool_samples("overflow"))
+registry.callback("db_pool_acquired_total", "Connections handed out", ("pool",),
+                  lambda: _pool_samples("acquired"), kind="counter")
+registry.callback("db_pool_timeouts_total", "Checkouts that timed out", ("pool",),
+                  lambda: _pool_samples("timeouts"), kind="counter")
+registry.callback(
+    "db_pool_wait_seconds_total", "Total time spent acquiring connections", ("pool",),
+    lambda: [((name,), stats.wait_total) for name, stats in pool_wait_stats.items()], kind="counter",
+)
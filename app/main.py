@@ -2,24 +2,70 @@
 #er4345345643
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.api import earnings_router, currency_router
-from fastapi import FastAPI, Query, HTTPException, Depends
+from app.api import earnings_router, currency_router, stats_router
+from fastapi import FastAPI, Query, Header, HTTPException, Depends, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, Select
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict
 from decimal import Decimal
+import uuid
+
+from app.database import get_db, get_read_db, read_sessionmaker, pool_status, replica_engine, replica_health
+from app.models.rollups import EarningsRollupDaily
+from app.services.ingest_buffer import ingest_buffer, IngestQueueFull
+from app.services.idempotency import make_unique_key, submit_earning
+from app.services.partitions import partition_maintainer
+from app.services.coordination import invalidation_listener
+from app.services.replica import replica_monitor
+from app.services.metrics import registry, MetricsMiddleware
+from app.services.profiling import ProfilingMiddleware
+from app.services.rate_cache import rate_cache, rate_cache_refresher, revalidate
+from app.services.rate_fetcher import rate_fetcher, rate_provider, FROM_SYMBOL
+from app.services.conversion import converted_daily_query, converted_total_query
+from app.services.serialization import FastJSONResponse
+from app.services.compression import CompressionMiddleware
+from app.services.http_cache import rollup_version, revalidate_stats
+from app.services.stats_cache import stats_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и корректная остановка фоновых задач приложения"""
+    if settings.INGEST_BUFFER_ENABLED:
+        await ingest_buffer.start()
+    if settings.CACHE_INVALIDATION_ENABLED:
+        invalidation_listener.start()
+    partition_maintainer.start()
+    if replica_engine is not None:
+        replica_monitor.start()
+    rate_cache_refresher.start()
+    if settings.CURRENCY_FETCH_ENABLED:
+        rate_fetcher.start()
+    try:
+        yield
+    finally:
+        await rate_fetcher.stop()
+        await rate_provider.aclose()
+        await rate_cache_refresher.stop()
+        await replica_monitor.stop()
+        await partition_maintainer.stop()
+        await invalidation_listener.stop()
+        # Дописываем в БД все, что осталось в очереди
+        await ingest_buffer.stop()
 
-from app.database import get_db
-from app.models.earnings import ProxyEarning
-from app.models.currency import CurrencyRate
 
 # Создаем FastAPI приложение
 app = FastAPI(
     title=settings.app_name,
     version=settings.version,
     description="API для отслеживания статистики заработка ботов через прокси",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan,
+    # orjson вместо json.dumps для всех ответов без явного класса
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware
@@ -31,9 +77,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+# Латентность запросов по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
+# Server-Timing, медленные запросы и выборочный EXPLAIN ANALYZE
+app.add_middleware(ProfilingMiddleware)
+
 # Подключаем роуты
 app.include_router(earnings_router)
 app.include_router(currency_router)
+app.include_router(stats_router)
+
+
+@app.exception_handler(IngestQueueFull)
+async def ingest_queue_full_handler(request: Request, exc: IngestQueueFull):
+    """Backpressure: очередь записи переполнена, клиент повторит запрос позже"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Сервис перегружен, повторите запрос позже: {exc}"},
+        headers={"Retry-After": "1"},
+    )
 
 
 @app.get("/")
@@ -52,42 +122,58 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Метрики процесса в формате Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/pool")
+async def pool_health():
+    """Состояние пулов соединений с БД и отставание реплики"""
+    status = {"primary": pool_status()}
+    if replica_engine is not None:
+        status["replica"] = {
+            **pool_status(replica_engine),
+            "lag_seconds": replica_health.lag,
+            "error": replica_health.error,
+            "in_use": replica_health.usable,
+        }
+    return status
+
+
 @app.get("/currencies", response_model=Dict[str, float])
-async def get_currency_rates(
-    db: AsyncSession = Depends(get_db)
-):
+async def get_currency_rates(request: Request, response: Response):
     """Получение курсов валют (упрощенный endpoint для совместимости)"""
     try:
-        # Получаем курсы из БД через SQLAlchemy
-        result = await db.execute(select(CurrencyRate))
-        rates_records = result.scalars().all()
-        
-        if not rates_records:
-            return {}
-        
-        # Формируем словарь курсов
-        rates = {}
-        for record in rates_records:
-            rates[record.symbol] = float(record.price)
-        
-        return rates
-        
+        snapshot = await rate_cache.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения курсов: {str(e)}")
 
+    not_modified = revalidate(request, response, snapshot)
+    if not_modified:
+        return not_modified
+    return snapshot.prices
+
 
 @app.get("/bot/submit")
 async def submit_bot_data(
+    response: Response,
     proxy_address: str = Query(..., description="Прокси адрес с портом (IP:PORT)"),
     bot_name: str = Query(..., description="Имя бота"),
-    earnings: float = Query(..., description="Заработанная сумма"),
+    earnings: Decimal = Query(..., description="Заработанная сумма (десятичная строка, без округления через float)"),
     session_id: Optional[str] = Query(None, description="ID сессии бота"),
     asn: Optional[int] = Query(None, description="ASN прокси"),
     asn_org: Optional[str] = Query(None, description="Организация ASN"),
+    event_id: Optional[str] = Query(None, description="ID события на стороне бота (для безопасных повторов)"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Бот подает данные о заработке через конкретный прокси
+    Бот подает данные о заработке через конкретный прокси.
+
+    Если передан Idempotency-Key или event_id, повтор запроса не создает
+    дубликат, а возвращает уже сохраненную запись (duplicate=true).
     """
     try:
         # Парсим IP и порт из proxy_address
@@ -102,11 +188,15 @@ async def submit_bot_data(
         except ValueError:
             raise HTTPException(status_code=400, detail="Неверный порт прокси")
         
-        # Создаем уникальный ключ для записи
-        unique_key = f"{bot_name}_{proxy_address}_{session_id or 'no_session'}_{datetime.now().isoformat()}"
+        # Уникальный ключ фиксированной длины (sha256): детерминированный при наличии
+        # ключа идемпотентности, иначе случайный - такие запросы повторять небезопасно
+        client_key = idempotency_key or event_id
+        if client_key:
+            unique_key = make_unique_key(bot_name, client_key)
+        else:
+            unique_key = make_unique_key(bot_name, proxy_address, session_id or 'no_session', uuid.uuid4().hex)
         
-        # Создаем запись о заработке через SQLAlchemy
-        earning_record = ProxyEarning(
+        earning_row = dict(
             proxy_ip=proxy_ip,
             proxy_port=proxy_port,
             proxy_key=proxy_address,  # Используем полный адрес как ключ
@@ -115,110 +205,198 @@ async def submit_bot_data(
             bot_name=bot_name,
             faucet_name="manual_submit",  # Можно сделать настраиваемым
             faucet_url=None,
-            reward_amount=Decimal(str(earnings)),
+            reward_amount=earnings,
             reward_currency="BTC",  # Можно сделать настраиваемым
             unique_key=unique_key,
             success=True,
             error_message=None,
             event_timestamp=datetime.now(timezone.utc),
-            extra_data=f"session_id={session_id}, asn={asn}, asn_org={asn_org}" if any([session_id, asn, asn_org]) else None
+            extra_data={
+                key: value for key, value in (("session_id", session_id), ("asn", asn), ("asn_org", asn_org))
+                if value is not None
+            } or None
         )
-        
-        db.add(earning_record)
-        await db.commit()
-        await db.refresh(earning_record)
+
+        stored, status = await submit_earning(db, earning_row)
+        if status == "queued":
+            response.status_code = 202
+            return {
+                "message": "Данные о заработке приняты в очередь записи",
+                "earning_id": None,
+                "proxy_address": proxy_address,
+                "bot_name": bot_name,
+                "amount": float(earnings),
+                "duplicate": False
+            }
         
         return {
             "message": "Данные о заработке успешно сохранены",
-            "earning_id": earning_record.id,
+            "earning_id": stored.id,
             "proxy_address": proxy_address,
             "bot_name": bot_name,
-            "amount": earnings
+            "amount": float(earnings),
+            "duplicate": status == "replayed"
         }
         
-    except HTTPException:
+    except (HTTPException, IngestQueueFull):
         raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Ошибка сохранения данных: {str(e)}")
 
 
-@app.get("/stats/summary")
-async def get_stats_summary(
-    db: AsyncSession = Depends(get_db)
-):
-    """Получение сводной статистики"""
-    try:
-        # Общее количество записей
-        total_result = await db.execute(select(func.count(ProxyEarning.id)))
-        total_earnings = total_result.scalar()
-        
-        # Общая сумма заработка
-        total_amount_result = await db.execute(
-            select(func.sum(ProxyEarning.reward_amount))
-        )
-        total_amount = total_amount_result.scalar() or Decimal('0')
-        
-        # Количество уникальных ботов
-        unique_bots_result = await db.execute(
-            select(func.count(func.distinct(ProxyEarning.bot_name)))
-        )
-        unique_bots = unique_bots_result.scalar()
-        
-        # Количество уникальных прокси
-        unique_proxies_result = await db.execute(
-            select(func.count(func.distinct(ProxyEarning.proxy_key)))
+def stats_summary_query() -> Select:
+    """Один проход по суточным агрегатам вместо четырех агрегатов по proxy_earnings"""
+    return select(
+        func.coalesce(func.sum(EarningsRollupDaily.event_count), 0).label('total_earnings'),
+        func.coalesce(func.sum(EarningsRollupDaily.total_amount), 0).label('total_amount'),
+        func.count(func.distinct(EarningsRollupDaily.bot_name)).label('unique_bots'),
+        func.count(func.distinct(EarningsRollupDaily.proxy_key)).label('unique_proxies'),
+    )
+
+
+def stats_daily_query(start_date: datetime, end_date: datetime) -> Select:
+    """Суточные агрегаты, сгруппированные по дням UTC с start_date по end_date включительно"""
+    return (
+        select(
+            EarningsRollupDaily.day.label('date'),
+            func.sum(EarningsRollupDaily.event_count).label('count'),
+            func.sum(EarningsRollupDaily.total_amount).label('total_amount')
         )
-        unique_proxies = unique_proxies_result.scalar()
-        
-        return {
-            "total_earnings": total_earnings,
-            "total_amount": float(total_amount),
-            "unique_bots": unique_bots,
-            "unique_proxies": unique_proxies,
-            "last_updated": datetime.now(timezone.utc)
-        }
-        
+        .where(EarningsRollupDaily.day >= start_date.date(), EarningsRollupDaily.day <= end_date.date())
+        .group_by(EarningsRollupDaily.day)
+        .order_by(EarningsRollupDaily.day)
+    )
+
+
+async def _target_currency(currency: Optional[str]) -> Optional[str]:
+    """Проверка валюты пересчета по снимку курсов (без обращения к БД)"""
+    if currency is None:
+        return None
+    currency = currency.upper()
+    if currency != FROM_SYMBOL and currency not in (await rate_cache.get()).rates:
+        raise HTTPException(status_code=400, detail=f"Неизвестная валюта: {currency}")
+    return currency
+
+
+async def _stats_versions(currency: Optional[str]) -> tuple:
+    """
+    Версия суточных агрегатов (и курсов при пересчете в валюту): для ETag и ключа кэша.
+
+    Своя короткая сессия: соединение возвращается в пул до ожидания загрузки
+    из кэша, иначе сотни одинаковых запросов держали бы весь пул.
+    """
+    try:
+        async with read_sessionmaker()() as db:
+            version = await rollup_version(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения статистики: {str(e)}")
+    if currency and rate_cache.snapshot is not None:
+        return version, rate_cache.snapshot.last_modified
+    return (version,)
 
 
-@app.get("/stats/daily")
-async def get_daily_stats(
-    days: int = Query(7, ge=1, le=30, description="Количество дней"),
-    db: AsyncSession = Depends(get_db)
+async def _load_summary(currency: Optional[str]) -> dict:
+    try:
+        async with read_sessionmaker()() as db:
+            result = await db.execute(stats_summary_query())
+            summary = result.one()
+
+            stats = {
+                "total_earnings": summary.total_earnings,
+                "total_amount": float(summary.total_amount),
+                "unique_bots": summary.unique_bots,
+                "unique_proxies": summary.unique_proxies,
+                "last_updated": datetime.now(timezone.utc)
+            }
+            if currency:
+                converted = (await db.execute(converted_total_query(currency))).scalar()
+                stats["currency"] = currency
+                stats["total_amount_converted"] = float(converted)
+            return stats
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения статистики: {str(e)}")
+
+
+@app.get("/stats/summary")
+async def get_stats_summary(
+    request: Request,
+    response: Response,
+    currency: Optional[str] = Query(None, description="Пересчитать сумму в эту валюту по курсу на момент событий")
 ):
-    """Получение ежедневной статистики"""
+    """
+    Получение сводной статистики (из суточных агрегатов).
+
+    ETag и Last-Modified меняются вместе с агрегатами: If-None-Match с прежним
+    ETag получает 304 без пересчета. Результат кэшируется по версии агрегатов,
+    одновременные одинаковые запросы ждут один запрос к БД.
+    """
+    currency = await _target_currency(currency)
+    versions = await _stats_versions(currency)
+    not_modified = revalidate_stats(request, response, *versions, variant=(currency,))
+    if not_modified:
+        return not_modified
+    return await stats_cache.get_or_load(("summary", versions, currency), lambda: _load_summary(currency))
+
+
+async def _load_daily(days: int, currency: Optional[str], start_date: datetime, end_date: datetime) -> dict:
     try:
-        end_date = datetime.now(timezone.utc)
-        start_date = end_date - timedelta(days=days)
-        
-        # Группируем по дням
-        daily_stats_result = await db.execute(
-            select(
-                func.date(ProxyEarning.event_timestamp).label('date'),
-                func.count(ProxyEarning.id).label('count'),
-                func.sum(ProxyEarning.reward_amount).label('total_amount')
-            )
-            .where(ProxyEarning.event_timestamp >= start_date)
-            .group_by(func.date(ProxyEarning.event_timestamp))
-            .order_by(func.date(ProxyEarning.event_timestamp))
-        )
-        
+        async with read_sessionmaker()() as db:
+            daily_rows = (await db.execute(stats_daily_query(start_date, end_date))).all()
+            converted = {}
+            if currency:
+                converted_result = await db.execute(converted_daily_query(currency, start_date.date()))
+                converted = {row.date: row.converted_amount for row in converted_result}
+
         daily_stats = []
-        for row in daily_stats_result:
-            daily_stats.append({
+        for row in daily_rows:
+            day_stats = {
                 "date": row.date.isoformat(),
                 "count": row.count,
                 "total_amount": float(row.total_amount) if row.total_amount else 0.0
-            })
-        
-        return {
+            }
+            if currency:
+                day_stats["total_amount_converted"] = float(converted.get(row.date) or 0)
+            daily_stats.append(day_stats)
+
+        stats = {
             "period_days": days,
             "start_date": start_date.isoformat(),
             "end_date": end_date.isoformat(),
             "daily_stats": daily_stats
         }
-        
+        if currency:
+            stats["currency"] = currency
+        return stats
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения ежедневной статистики: {str(e)}")
+
+
+@app.get("/stats/daily")
+async def get_daily_stats(
+    request: Request,
+    response: Response,
+    days: int = Query(7, ge=1, le=30, description="Количество дней"),
+    currency: Optional[str] = Query(None, description="Пересчитать суммы в эту валюту по курсу на момент событий")
+):
+    """
+    Получение ежедневной статистики (из суточных агрегатов, дни в UTC).
+
+    Период - ровно days целых суток UTC: сегодняшние и days - 1 предыдущих
+    (start_date - полночь первого дня), по одной строке на день с записями.
+    Условные запросы и кэш - как у /stats/summary; с началом новых суток
+    период сдвигается, и ответ считается измененным.
+    """
+    currency = await _target_currency(currency)
+    end_date = datetime.now(timezone.utc)
+    today = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = today - timedelta(days=days - 1)
+    versions = await _stats_versions(currency)
+    not_modified = revalidate_stats(request, response, *versions, today, variant=(currency, days))
+    if not_modified:
+        return not_modified
+    return await stats_cache.get_or_load(
+        ("daily", versions, today, days, currency), lambda: _load_daily(days, currency, start_date, end_date)
+    )
@@ -1,4 +1,6 @@
-from .earnings import ProxyEarning
-from .currency import CurrencyRate
+from .earnings import ProxyEarning, ProxyEarningKey
+from .currency import CurrencyRate, CurrencyRateHistory
+from .rollups import EarningsRollupHourly, EarningsRollupDaily, EarningsRollupAsnHourly, EarningsRollupAsnDaily, RollupVersion
 
-__all__ = ["ProxyEarning", "CurrencyRate"]
+__all__ = ["ProxyEarning", "ProxyEarningKey", "CurrencyRate", "CurrencyRateHistory", "EarningsRollupHourly", "EarningsRollupDaily",
+           "EarningsRollupAsnHourly", "EarningsRollupAsnDaily", "RollupVersion"]
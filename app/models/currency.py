@@ -13,3 +13,22 @@ class CurrencyRate(Base):
     
     def __repr__(self):
         return f"<CurrencyRate(symbol={self.symbol}, price={self.price}, updated={self.last_updated})>"
+
+
+class CurrencyRateHistory(Base):
+    """
+    История курсов валют (только добавление).
+
+    Каждая загрузка курсов дописывает точку на каждый символ; по ней суммы
+    пересчитываются по курсу на момент события. Таблица секционирована по fetched_at.
+    """
+    __tablename__ = "currency_rate_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (fetched_at)"}
+
+    # PK (symbol, fetched_at) обслуживает поиск последнего курса не позже момента
+    symbol = Column(String(10), primary_key=True)
+    fetched_at = Column(DateTime(timezone=True), primary_key=True)
+    price = Column(Numeric(20, 8), nullable=False)
+
+    def __repr__(self):
+        return f"<CurrencyRateHistory(symbol={self.symbol}, price={self.price}, fetched_at={self.fetched_at})>"
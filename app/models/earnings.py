@@ -1,22 +1,25 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, DateTime, Text, Boolean, Index, Computed
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.database import Base
 
 class ProxyEarning(Base):
     """Модель для записи заработка через прокси"""
     __tablename__ = "proxy_earnings"
+    # Таблица секционирована по event_timestamp; секции создает app.services.partitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (event_timestamp)"}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     
     # Информация о прокси
     proxy_ip = Column(String(45), nullable=False, index=True)
     proxy_port = Column(Integer, nullable=False)
-    proxy_key = Column(String(100), nullable=False, index=True)
+    proxy_key = Column(String(100), nullable=False)
     
     # Информация о сервере и боте
-    server_id = Column(String(50), nullable=False, index=True)
+    server_id = Column(String(50), nullable=False)
     bot_id = Column(String(50), nullable=False)
-    bot_name = Column(String(100), nullable=False, index=True)
+    bot_name = Column(String(100), nullable=False)
     
     # Информация о заработке
     faucet_name = Column(String(100), nullable=False)
@@ -26,17 +29,77 @@ class ProxyEarning(Base):
     reward_amount = Column(Numeric(20, 8), nullable=False)
     reward_currency = Column(String(10), nullable=False)
     
-    # Метаданные
-    unique_key = Column(String(64), nullable=False, unique=True, index=True)
+    # Метаданные (уникальность unique_key обеспечивает таблица proxy_earning_keys)
+    unique_key = Column(String(64), nullable=False, index=True)
     success = Column(Boolean, default=True, nullable=False)
     error_message = Column(Text, nullable=True)
     
     # Временные метки
-    event_timestamp = Column(DateTime(timezone=True), nullable=False)
+    event_timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     created_at = Column(DateTime(timezone=True), default=func.now(), nullable=False)
     
-    # Дополнительные данные (ИСПРАВЛЕНО)
-    extra_data = Column(Text, nullable=True)
+    # Дополнительные данные (JSON-объект)
+    extra_data = Column(JSONB, nullable=True)
+    # Частые ключи extra_data вынесены в колонки, которые Postgres вычисляет сам
+    asn = Column(BigInteger, Computed(
+        "CASE WHEN extra_data->>'asn' ~ '^[0-9]{1,18}$' THEN (extra_data->>'asn')::bigint END", persisted=True
+    ))
+    session_id = Column(String(100), Computed("left(extra_data->>'session_id', 100)", persisted=True))
     
     def __repr__(self):
         return f"<ProxyEarning(bot={self.bot_name}, proxy={self.proxy_key}, amount={self.reward_amount} {self.reward_currency})>"
+
+
+# Выборки идут по боту/прокси/серверу и диапазону времени, новые первыми: составные
+# индексы отдают строки сразу в порядке пагинации (event_timestamp, id) без сортировки.
+# INCLUDE позволяет считать суммы по боту/прокси за период только по индексу.
+Index(
+    "ix_proxy_earnings_bot_name_event_timestamp",
+    ProxyEarning.bot_name, ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc(),
+    postgresql_include=["reward_amount", "reward_currency", "success"],
+)
+Index(
+    "ix_proxy_earnings_proxy_key_event_timestamp",
+    ProxyEarning.proxy_key, ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc(),
+    postgresql_include=["reward_amount", "reward_currency", "success"],
+)
+Index(
+    "ix_proxy_earnings_server_id_event_timestamp",
+    ProxyEarning.server_id, ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc(),
+)
+# Выборки и суммы по ASN и сессии; у записей без этих ключей колонки пустые
+Index(
+    "ix_proxy_earnings_asn_event_timestamp",
+    ProxyEarning.asn, ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc(),
+    postgresql_include=["reward_amount", "reward_currency", "success"],
+    postgresql_where=ProxyEarning.asn.isnot(None),
+)
+Index(
+    "ix_proxy_earnings_session_id_event_timestamp",
+    ProxyEarning.session_id, ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc(),
+    postgresql_where=ProxyEarning.session_id.isnot(None),
+)
+# Поиск по остальным ключам extra_data (extra_data @> '{"asn_org": ...}')
+Index("ix_proxy_earnings_extra_data", ProxyEarning.extra_data, postgresql_using="gin",
+      postgresql_ops={"extra_data": "jsonb_path_ops"})
+# Общая лента без фильтров
+Index("ix_proxy_earnings_event_timestamp_id", ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc())
+# Записи добавляются почти по порядку времени: BRIN за доли процента от размера btree
+# покрывает широкие диапазоны (пересчет агрегатов, выгрузки за период)
+Index("ix_proxy_earnings_event_timestamp_brin", ProxyEarning.event_timestamp, postgresql_using="brin")
+
+
+class ProxyEarningKey(Base):
+    """
+    Реестр unique_key записей заработка.
+
+    Уникальный индекс секционированной таблицы обязан включать ключ секционирования,
+    поэтому глобальная уникальность unique_key поддерживается этой узкой таблицей.
+    """
+    __tablename__ = "proxy_earning_keys"
+
+    unique_key = Column(String(64), primary_key=True)
+    event_timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ProxyEarningKey(unique_key={self.unique_key}, event_timestamp={self.event_timestamp})>"
@@ -0,0 +1,90 @@
+from sqlalchemy import Column, String, Numeric, DateTime, Date, BigInteger
+from sqlalchemy.sql import func
+from app.database import Base
+
+class EarningsRollupHourly(Base):
+    """Почасовые агрегаты заработка: час (UTC) x бот x прокси x валюта"""
+    __tablename__ = "earnings_rollup_hourly"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    bot_name = Column(String(100), primary_key=True)
+    proxy_key = Column(String(100), primary_key=True)
+    reward_currency = Column(String(10), primary_key=True)
+
+    event_count = Column(BigInteger, nullable=False, default=0)
+    success_count = Column(BigInteger, nullable=False, default=0)
+    total_amount = Column(Numeric(28, 8), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EarningsRollupHourly(bucket={self.bucket}, bot={self.bot_name}, proxy={self.proxy_key}, count={self.event_count})>"
+
+
+class EarningsRollupDaily(Base):
+    """Суточные агрегаты заработка: день (UTC) x бот x прокси x валюта"""
+    __tablename__ = "earnings_rollup_daily"
+
+    day = Column(Date, primary_key=True)
+    bot_name = Column(String(100), primary_key=True)
+    proxy_key = Column(String(100), primary_key=True)
+    reward_currency = Column(String(10), primary_key=True)
+
+    event_count = Column(BigInteger, nullable=False, default=0)
+    success_count = Column(BigInteger, nullable=False, default=0)
+    total_amount = Column(Numeric(28, 8), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EarningsRollupDaily(day={self.day}, bot={self.bot_name}, proxy={self.proxy_key}, count={self.event_count})>"
+
+
+class EarningsRollupAsnHourly(Base):
+    """Почасовые агрегаты заработка по ASN прокси: час (UTC) x ASN x валюта (записи без asn не входят)"""
+    __tablename__ = "earnings_rollup_asn_hourly"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    asn = Column(BigInteger, primary_key=True)
+    reward_currency = Column(String(10), primary_key=True)
+
+    event_count = Column(BigInteger, nullable=False, default=0)
+    success_count = Column(BigInteger, nullable=False, default=0)
+    total_amount = Column(Numeric(28, 8), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EarningsRollupAsnHourly(bucket={self.bucket}, asn={self.asn}, count={self.event_count})>"
+
+
+class EarningsRollupAsnDaily(Base):
+    """Суточные агрегаты заработка по ASN прокси: день (UTC) x ASN x валюта (записи без asn не входят)"""
+    __tablename__ = "earnings_rollup_asn_daily"
+
+    day = Column(Date, primary_key=True)
+    asn = Column(BigInteger, primary_key=True)
+    reward_currency = Column(String(10), primary_key=True)
+
+    event_count = Column(BigInteger, nullable=False, default=0)
+    success_count = Column(BigInteger, nullable=False, default=0)
+    total_amount = Column(Numeric(28, 8), nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EarningsRollupAsnDaily(day={self.day}, asn={self.asn}, count={self.event_count})>"
+
+
+class RollupVersion(Base):
+    """
+    Журнал версий агрегатов: строка с новым номером после коммита каждой
+    транзакции, которая меняет агрегаты (app.services.rollups.commit_rollups).
+    Текущая версия - строка с наибольшим номером; старые строки удаляются.
+
+    updated_at агрегатов для этого не годится: now() - время начала транзакции,
+    и долгая транзакция, закоммиченная позже короткой, записывает более раннее время.
+    """
+    __tablename__ = "rollup_version"
+
+    version = Column(BigInteger, primary_key=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<RollupVersion(version={self.version}, updated_at={self.updated_at})>"
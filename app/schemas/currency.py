@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict
@@ -10,13 +10,12 @@ class CurrencyRateCreate(BaseModel):
 
 class CurrencyRateResponse(BaseModel):
     """Схема ответа с курсом валюты"""
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     symbol: str
     price: Decimal
     last_updated: datetime
-    
-    class Config:
-        from_attributes = True
 
 class CurrencyRatesResponse(BaseModel):
     """Схема ответа с курсами валют"""
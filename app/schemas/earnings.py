@@ -1,7 +1,43 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Dict, Optional, List, Literal
+import json
+import re
+
+# Старый формат extra_data от /bot/submit
+_LEGACY_EXTRA_DATA = re.compile(r"^session_id=(.*), asn=(.*), asn_org=(.*)$")
+
+
+def parse_extra_data(value: Any) -> Optional[Dict[str, Any]]:
+    """
+    extra_data как объект: принимает объект, JSON-строку или старую строку
+    "session_id=..., asn=..., asn_org=..."; прочий текст сохраняется как {"raw": текст}.
+    То же делает SQL-функция parse_extra_data (миграция 5c1e9b7d2f40).
+    """
+    if value is None or isinstance(value, dict):
+        return value or None
+    if not isinstance(value, str):
+        raise ValueError('extra_data должен быть JSON-объектом')
+    if not value.strip():
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        return parsed
+    match = _LEGACY_EXTRA_DATA.match(value)
+    if match:
+        data = {key: item for key, item in zip(("session_id", "asn", "asn_org"), match.groups()) if item != "None"}
+        if "asn" in data:
+            if data["asn"].isdigit():
+                data["asn"] = int(data["asn"])
+            else:
+                del data["asn"]
+        return data or None
+    return {"raw": value}
+
 
 class EarningCreate(BaseModel):
     """Схема для создания записи о заработке"""
@@ -19,16 +55,26 @@ class EarningCreate(BaseModel):
     success: bool = Field(True, description="Успешность операции")
     error_message: Optional[str] = Field(None, description="Сообщение об ошибке")
     event_timestamp: datetime = Field(..., description="Время события")  # ✅ Обязательное поле
-    extra_data: Optional[str] = Field(None, description="Дополнительные данные (JSON)")
+    extra_data: Optional[Dict[str, Any]] = Field(
+        None, description="Дополнительные данные: JSON-объект (или строка с JSON); ключи asn и session_id индексируются"
+    )
 
-    @validator('bot_name')  # ✅ Исправлено: обычный underscore
-    def validate_bot_name(cls, v):
+    @field_validator('bot_name')
+    @classmethod
+    def validate_bot_name(cls, v: str) -> str:
         if not v.strip():
             raise ValueError('Название бота не может быть пустым')
         return v.strip()
 
+    @field_validator('extra_data', mode='before')
+    @classmethod
+    def validate_extra_data(cls, v: Any) -> Optional[Dict[str, Any]]:
+        return parse_extra_data(v)
+
 class EarningResponse(BaseModel):
     """Схема ответа с информацией о записи"""
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     proxy_ip: str
     proxy_port: int
@@ -45,7 +91,36 @@ class EarningResponse(BaseModel):
     error_message: Optional[str]
     event_timestamp: datetime
     created_at: datetime
-    extra_data: Optional[str]
-    
-    class Config:
-        from_attributes = True  # ✅ Исправлено: обычный underscore
+    extra_data: Optional[Dict[str, Any]]
+    asn: Optional[int] = None
+    session_id: Optional[str] = None
+
+
+class EarningAck(BaseModel):
+    """Краткий ответ быстрого приема события (POST /earnings/ingest)"""
+    status: Literal["created", "replayed", "queued"]
+    unique_key: str
+    id: Optional[int] = Field(None, description="ID записи (нет для queued)")
+    created_at: Optional[datetime] = None
+
+
+class EarningBatchItem(BaseModel):
+    """Результат обработки одной записи пакета"""
+    index: int = Field(..., description="Позиция записи в пакете")
+    status: Literal["accepted", "duplicate", "invalid"]
+    id: Optional[int] = Field(None, description="ID созданной записи")
+    unique_key: Optional[str] = None
+    error: Optional[str] = Field(None, description="Причина отклонения записи")
+
+class EarningBatchResponse(BaseModel):
+    """Схема ответа пакетной загрузки"""
+    accepted: int
+    duplicates: int
+    invalid: int
+    results: List[EarningBatchItem]
+
+class EarningImportResponse(BaseModel):
+    """Схема ответа массового импорта"""
+    received: int = Field(..., description="Строк в файле")
+    inserted: int = Field(..., description="Записано новых записей")
+    duplicates: int = Field(..., description="Пропущено: unique_key уже есть или повторяется в файле")
@@ -0,0 +1,118 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Select, select, func, union_all, cast, Numeric
+from typing import Dict, Optional
+
+from app.models.rollups import (
+    EarningsRollupHourly, EarningsRollupDaily, EarningsRollupAsnHourly, EarningsRollupAsnDaily
+)
+
+# Скользящие окна: длина в часах. Окно включает текущий (неполный) час
+WINDOWS: Dict[str, int] = {"1h": 1, "6h": 6, "24h": 24, "7d": 7 * 24, "30d": 30 * 24}
+
+# Группировка: (почасовые агрегаты, суточные агрегаты, колонка группировки)
+DIMENSIONS = {
+    "proxy": (EarningsRollupHourly, EarningsRollupDaily, "proxy_key"),
+    "asn": (EarningsRollupAsnHourly, EarningsRollupAsnDaily, "asn"),
+}
+
+SORT_FIELDS = ("earnings", "events", "success_rate", "failures")
+
+RATE_SCALE = 4
+AMOUNT_SCALE = 8
+
+
+@dataclass(frozen=True)
+class Window:
+    """Окно [start, end) по границам часов UTC и граница перехода на суточные агрегаты"""
+    name: str
+    hours: int
+    start: datetime
+    end: datetime
+    # Часы [start, boundary) берутся из почасовых агрегатов, сутки от boundary - из суточных
+    boundary: datetime
+
+    @classmethod
+    def ending_at(cls, name: str, now: Optional[datetime] = None) -> "Window":
+        hours = WINDOWS[name]
+        now = now or datetime.now(timezone.utc)
+        end = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        start = end - timedelta(hours=hours)
+        midnight = start.replace(hour=0)
+        boundary = start if start == midnight else midnight + timedelta(days=1)
+        return cls(name=name, hours=hours, start=start, end=end, boundary=min(boundary, end))
+
+
+def _window_rows(dimension: str, window: Window, reward_currency: Optional[str]):
+    """
+    Строки агрегатов, покрывающие окно: неполные первые сутки по часам, остальное по суткам.
+
+    Суточные агрегаты текущего дня включают события до текущего момента - как
+    и последний час окна, поэтому окно заканчивается на end без пересечений.
+    """
+    hourly, daily, key = DIMENSIONS[dimension]
+    parts = []
+    for model, condition in (
+        (hourly, (hourly.bucket >= window.start) & (hourly.bucket < window.boundary)),
+        (daily, daily.day >= window.boundary.date()),
+    ):
+        stmt = select(
+            getattr(model, key).label("key"), model.event_count, model.success_count, model.total_amount
+        ).where(condition)
+        if reward_currency is not None:
+            stmt = stmt.where(model.reward_currency == reward_currency)
+        parts.append(stmt)
+    if window.boundary >= window.end:
+        parts.pop()
+    return union_all(*parts).subquery()
+
+
+def performance_query(dimension: str, window: Window, sort: str = "earnings", descending: bool = True,
+                      limit: int = 50, offset: int = 0, min_events: int = 1,
+                      reward_currency: Optional[str] = None) -> Select:
+    """
+    Показатели за окно по прокси или ASN с рейтингом: события, успешные, доля
+    успешных, сумма и заработок в час.
+
+    Все считается в Postgres по агрегатам (не по proxy_earnings): rank() дает место
+    в рейтинге, count(*) OVER () - число групп для пагинации. Суммы в разных
+    валютах складываются, как в /stats/summary, если не задан reward_currency.
+    """
+    rows = _window_rows(dimension, window, reward_currency)
+    totals = (
+        select(
+            rows.c.key,
+            func.sum(rows.c.event_count).label("events"),
+            func.sum(rows.c.success_count).label("successes"),
+            func.sum(rows.c.total_amount).label("total_amount"),
+        )
+        .group_by(rows.c.key)
+        .having(func.sum(rows.c.event_count) >= min_events)
+        .subquery()
+    )
+    failures = totals.c.events - totals.c.successes
+    success_rate = cast(totals.c.successes, Numeric) / totals.c.events
+    order = {
+        "earnings": totals.c.total_amount,
+        "events": totals.c.events,
+        "success_rate": success_rate,
+        "failures": failures,
+    }[sort]
+    order = order.desc() if descending else order.asc()
+    return (
+        select(
+            func.rank().over(order_by=order).label("rank"),
+            totals.c.key,
+            totals.c.events,
+            totals.c.successes,
+            failures.label("failures"),
+            func.round(success_rate, RATE_SCALE).label("success_rate"),
+            totals.c.total_amount,
+            func.round(totals.c.total_amount / window.hours, AMOUNT_SCALE).label("earnings_per_hour"),
+            func.count().over().label("total"),
+        )
+        # Ключ - для стабильного порядка страниц при равных значениях
+        .order_by(order, totals.c.key)
+        .limit(limit)
+        .offset(offset)
+    )
@@ -0,0 +1,70 @@
+from datetime import date
+from sqlalchemy import Select, select, func, case, cast, literal, DateTime, Numeric
+from sqlalchemy.sql.elements import ColumnElement
+from typing import Optional
+
+from app.models.currency import CurrencyRateHistory
+from app.models.rollups import EarningsRollupDaily
+from app.services.rate_fetcher import FROM_SYMBOL
+
+# Точность пересчитанных сумм, как у reward_amount
+AMOUNT_SCALE = 8
+
+
+def rate_as_of(symbol, at) -> ColumnElement:
+    """
+    Курс symbol (единиц за 1 FROM_SYMBOL) на момент at.
+
+    Берется последняя точка истории не позже at (обратный проход по PK
+    (symbol, fetched_at), одна строка), а для событий раньше первой загрузки -
+    самая ранняя известная точка. Для базовой валюты курс равен 1.
+    """
+    history = CurrencyRateHistory
+    before = (
+        select(history.price)
+        .where(history.symbol == symbol, history.fetched_at <= at)
+        .order_by(history.fetched_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    earliest = (
+        select(history.price)
+        .where(history.symbol == symbol)
+        .order_by(history.fetched_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return case((symbol == FROM_SYMBOL, literal(1, Numeric)), else_=func.coalesce(before, earliest))
+
+
+def converted_daily_query(target: str, start_day: Optional[date] = None) -> Select:
+    """
+    Суммы заработка по дням UTC, пересчитанные в target по курсам на конец дня.
+
+    Суточные агрегаты сначала сводятся до (день, валюта), поэтому поиск курса
+    выполняется один раз на пару, а не на каждое событие. Суммы в валютах без
+    истории курсов в пересчет не попадают.
+    """
+    rollup = EarningsRollupDaily
+    totals = (
+        select(rollup.day, rollup.reward_currency, func.sum(rollup.total_amount).label('amount'))
+        .group_by(rollup.day, rollup.reward_currency)
+    )
+    if start_day is not None:
+        totals = totals.where(rollup.day >= start_day)
+    totals = totals.subquery()
+
+    # Конец суток UTC как timestamptz
+    day_end = func.timezone('UTC', cast(totals.c.day + 1, DateTime))
+    converted = totals.c.amount * rate_as_of(literal(target), day_end) / rate_as_of(totals.c.reward_currency, day_end)
+    return (
+        select(totals.c.day.label('date'), func.round(func.sum(converted), AMOUNT_SCALE).label('converted_amount'))
+        .group_by(totals.c.day)
+        .order_by(totals.c.day)
+    )
+
+
+def converted_total_query(target: str) -> Select:
+    """Общая сумма заработка в target по курсам на момент событий (с точностью до дня)"""
+    daily = converted_daily_query(target).subquery()
+    return select(func.coalesce(func.sum(daily.c.converted_amount), 0).label('converted_amount'))
@@ -0,0 +1,148 @@
+"""
+Согласование процессов-воркеров (gunicorn -w N) через Postgres, без Redis.
+
+Кэши в памяти у каждого процесса свои. Код, который меняет данные под кэшем,
+вызывает notify(db, topic) в своей транзакции: pg_notify доставляется слушателям
+только после коммита, а откат ничего не рассылает. CacheInvalidationListener в
+каждом процессе (и в отправителе тоже) держит отдельное соединение с LISTEN и
+вызывает обработчики, подписанные на topic. Пока соединения нет, кэши живут по
+своим TTL, после переподключения сбрасываются все: уведомления за время
+разрыва потеряны.
+
+Плановые задачи, которые достаточно выполнить одним процессом, берут
+try_advisory_xact_lock: остальные воркеры в этот момент пропускают запуск.
+"""
+import asyncio
+import inspect
+import logging
+from collections import defaultdict
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncpg
+
+from app.config import settings
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+
+# Проверка соединения LISTEN: обрыв без закрытия TCP иначе не заметить
+PING_SECONDS = 30
+RECONNECT_MAX_SECONDS = 30
+
+notifications_received = registry.counter(
+    "cache_invalidations_received_total", "Cache invalidation notifications received", ("topic",)
+)
+
+async def notify(db: AsyncSession, topic: str):
+    """Уведомить остальные процессы о смене данных topic (после коммита db)"""
+    if settings.CACHE_INVALIDATION_ENABLED:
+        await db.execute(text("SELECT pg_notify(:channel, :topic)"), {"channel": CHANNEL, "topic": topic})
+
+
+async def try_advisory_xact_lock(db: AsyncSession, name: str) -> bool:
+    """
+    Пытается взять advisory-блокировку name до конца транзакции db.
+
+    False - блокировку держит другой процесс. Транзакционный вариант работает
+    и через PgBouncer в режиме transaction.
+    """
+    result = await db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": name})
+    return bool(result.scalar())
+
+
+def _listen_dsn() -> str:
+    url = make_url(settings.listen_database_url or settings.database_url)
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class CacheInvalidationListener:
+    """Соединение с LISTEN на CHANNEL и обработчики по topic"""
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self.connected = False
+        self._handlers: Dict[str, List[Callable[[], Optional[Awaitable[None]]]]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def subscribe(self, topic: str, handler: Callable[[], Optional[Awaitable[None]]]):
+        """handler - функция без аргументов, обычная или async"""
+        self._handlers[topic].append(handler)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="cache-invalidation-listener")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def _dispatch(self, topic: str):
+        for handler in self._handlers.get(topic, ()):
+            task = asyncio.create_task(self._call(topic, handler))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _call(self, topic: str, handler: Callable[[], Optional[Awaitable[None]]]):
+        try:
+            result = handler()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Ошибка сброса кэша {topic}: {e}")
+
+    def _on_notification(self, connection, pid: int, channel: str, topic: str):
+        notifications_received.inc(topic)
+        self._dispatch(topic)
+
+    async def _run(self):
+        delay = 1.0
+        # После разрыва (или неудачного первого подключения) кэши сбрасываются целиком
+        resync = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(_listen_dsn())
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                self.connected = True
+                if resync:
+                    logger.info("Подписка на сброс кэшей восстановлена, кэши сброшены")
+                    for topic in self._handlers:
+                        self._dispatch(topic)
+                delay = 1.0
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), PING_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Нет подписки на сброс кэшей ({e}), повтор через {delay:.0f} с")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            resync = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+
+invalidation_listener = CacheInvalidationListener()
+
+registry.callback(
+    "cache_invalidation_listener_connected", "Whether the LISTEN connection for cache invalidation is up", (),
+    lambda: [((), 1 if invalidation_listener.connected else 0)],
+)
@@ -0,0 +1,226 @@
+"""
+Массовый импорт записей заработка через COPY FROM STDIN.
+
+Файл (CSV, NDJSON или Parquet) потоком копируется во временную таблицу, затем
+одним INSERT ... SELECT переносится в proxy_earnings: ключи регистрируются в
+proxy_earning_keys, уже известные unique_key пропускаются, агрегаты обновляются
+из вставленных строк. Все в одной транзакции: ошибка в любой строке отменяет
+весь импорт. Отдельно, короткой транзакцией перед переносом, создаются только
+секции под периоды файла.
+"""
+import csv
+import logging
+import tempfile
+from datetime import timezone
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Dict, List
+
+from app.config import settings
+from app.models.earnings import ProxyEarning
+from app.services.export import EARNING_COLUMNS, JSON_LINES_COPY_OPTIONS, pyarrow
+from app.services.coordination import notify
+from app.services.metrics import earnings_ingested, earnings_duplicates
+from app.services.partitions import ensure_period_partitions
+from app.services.rollups import merge_into_rollups
+
+logger = logging.getLogger(__name__)
+
+IMPORT_TABLE = "earnings_import"
+IMPORT_JSON_TABLE = "earnings_import_json"
+INSERTED_TABLE = "earnings_import_inserted"
+
+# Колонки, без которых запись не вставить (id назначает база, остальные необязательны)
+REQUIRED_COLUMNS = {
+    column.name for column in ProxyEarning.__table__.columns
+    if not column.nullable and column.name not in ("id", "success", "created_at")
+}
+
+# Больше периодов - секции не создаются, строки попадут в DEFAULT
+MAX_NEW_PARTITIONS = 120
+
+PARQUET_BATCH_ROWS = 50_000
+
+
+class EarningsImportError(ValueError):
+    """Файл импорта не соответствует формату или данные не проходят ограничения таблицы"""
+
+
+def _import_table_sql() -> str:
+    # Колонки и типы как у proxy_earnings, но без ограничений: проверки - при переносе.
+    # extra_data - текст: старые сборщики пишут строку "session_id=..., asn=...",
+    # ее разбирает parse_extra_data при переносе
+    dialect = postgresql.dialect()
+    columns = ", ".join(
+        f"{column.name} {'text' if column.name == 'extra_data' else column.type.compile(dialect=dialect)}"
+        for column in ProxyEarning.__table__.columns
+    )
+    return f"CREATE TEMP TABLE {IMPORT_TABLE} ({columns}) ON COMMIT DROP"
+
+
+def _check_columns(columns: List[str]) -> List[str]:
+    unknown = [name for name in columns if name not in EARNING_COLUMNS]
+    if unknown:
+        raise EarningsImportError(f"Unknown columns: {', '.join(unknown)}")
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise EarningsImportError(f"Missing required columns: {', '.join(sorted(missing))}")
+    return columns
+
+
+async def _split_header(chunks: AsyncIterator[bytes]):
+    """Первая строка CSV и поток, который начинается с нее же"""
+    buffered = b""
+    async for chunk in chunks:
+        buffered += chunk
+        if b"\n" in buffered:
+            break
+    header = buffered.split(b"\n", 1)[0].decode("utf-8-sig").strip()
+
+    async def replay():
+        yield buffered
+        async for chunk in chunks:
+            yield chunk
+
+    return next(csv.reader([header]), []), replay()
+
+
+async def _copy_csv(raw, chunks: AsyncIterator[bytes]):
+    columns, source = await _split_header(chunks)
+    columns = _check_columns([name.strip() for name in columns])
+    await raw.copy_to_table(IMPORT_TABLE, source=source, columns=columns, format="csv", header=True)
+
+
+async def _copy_ndjson(db: AsyncSession, raw, chunks: AsyncIterator[bytes]):
+    # Строки JSON копируются как есть в колонку jsonb и разбираются Postgres;
+    # отсутствующие поля становятся NULL
+    await db.execute(text(f"CREATE TEMP TABLE {IMPORT_JSON_TABLE} (doc jsonb) ON COMMIT DROP"))
+    await raw.copy_to_table(IMPORT_JSON_TABLE, source=chunks, **JSON_LINES_COPY_OPTIONS)
+    await db.execute(text(
+        f"INSERT INTO {IMPORT_TABLE} "
+        f"SELECT (jsonb_populate_record(NULL::{IMPORT_TABLE}, doc)).* FROM {IMPORT_JSON_TABLE} WHERE doc IS NOT NULL"
+    ))
+
+
+async def _copy_parquet(raw, chunks: AsyncIterator[bytes]):
+    if pyarrow is None:
+        raise EarningsImportError("Parquet support requires pyarrow")
+    # Метаданные Parquet в конце файла: тело сначала пишется во временный файл
+    # (в памяти до 64 МБ), затем читается группами
+    with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024) as spool:
+        async for chunk in chunks:
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            parquet = pyarrow.parquet.ParquetFile(spool)
+        except pyarrow.ArrowInvalid as e:
+            raise EarningsImportError(f"Invalid Parquet file: {e}")
+        columns = _check_columns(parquet.schema_arrow.names)
+        for batch in parquet.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+            values = [batch.column(name).to_pylist() for name in columns]
+            await raw.copy_records_to_table(IMPORT_TABLE, columns=columns, records=zip(*values))
+
+
+async def _ensure_import_partitions(db: AsyncSession):
+    """
+    Секции под периоды, в которые попадают импортируемые события (история).
+
+    Периоды берутся из временной таблицы, секции создаются в своей короткой
+    транзакции (ensure_period_partitions): транзакция импорта к этому моменту
+    не трогала proxy_earnings и не держит на ней блокировок.
+    """
+    periods = (await db.execute(
+        text(f"SELECT DISTINCT date_trunc(:unit, event_timestamp AT TIME ZONE 'UTC') FROM {IMPORT_TABLE}"),
+        {"unit": settings.EARNINGS_PARTITION_INTERVAL},
+    )).scalars().all()
+    if len(periods) > MAX_NEW_PARTITIONS:
+        logger.warning(f"Импорт охватывает {len(periods)} периодов, секции не создаются")
+        return
+    created = await ensure_period_partitions(
+        [period.replace(tzinfo=timezone.utc) for period in periods if period is not None]
+    )
+    if created:
+        logger.info(f"Для импорта созданы секции: {', '.join(created)}")
+
+
+# id назначает база, генерируемые колонки (asn, session_id) вычисляет Postgres
+_TRANSFER_COLUMNS = [column.name for column in ProxyEarning.__table__.columns
+                     if column.name != "id" and column.computed is None]
+_TRANSFER_VALUES = [
+    "coalesce(i.success, true)" if name == "success"
+    else "coalesce(i.created_at, now())" if name == "created_at"
+    else "parse_extra_data(i.extra_data)" if name == "extra_data"
+    else f"i.{name}"
+    for name in _TRANSFER_COLUMNS
+]
+
+_TRANSFER_SQL = f"""
+    WITH new_keys AS (
+        INSERT INTO proxy_earning_keys (unique_key, event_timestamp)
+        SELECT unique_key, event_timestamp FROM {IMPORT_TABLE}
+        ON CONFLICT (unique_key) DO NOTHING
+        RETURNING unique_key
+    ), inserted AS (
+        INSERT INTO proxy_earnings ({", ".join(_TRANSFER_COLUMNS)})
+        SELECT {", ".join(_TRANSFER_VALUES)}
+        FROM {IMPORT_TABLE} i JOIN new_keys k ON k.unique_key = i.unique_key
+        -- По порядку времени: строки одной секции идут подряд, вставки в индексы локальны
+        ORDER BY i.event_timestamp
+        RETURNING *
+    )
+    INSERT INTO {INSERTED_TABLE} SELECT * FROM inserted
+"""
+
+
+async def import_earnings(db: AsyncSession, chunks: AsyncIterator[bytes], fmt: str) -> Dict[str, int]:
+    """
+    Импортирует поток байтов файла (csv / ndjson / parquet) в proxy_earnings.
+
+    Колонки id, asn и session_id файла игнорируются (asn и session_id вычисляются
+    из extra_data); success и created_at по умолчанию true и now().
+    Повтор unique_key внутри файла или уже записанный ключ считается дубликатом.
+    Возвращает {"received", "inserted", "duplicates"}. Коммит остается за
+    вызывающим кодом; EarningsImportError - для ошибок в данных.
+    """
+    conn = await db.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    try:
+        # Первый запрос через сессию открывает транзакцию, COPY идет уже в ней.
+        # До создания секций транзакция не обращается к proxy_earnings
+        await db.execute(text(_import_table_sql()))
+        if fmt == "csv":
+            await _copy_csv(raw, chunks)
+        elif fmt == "ndjson":
+            await _copy_ndjson(db, raw, chunks)
+        else:
+            await _copy_parquet(raw, chunks)
+
+        received = (await db.execute(text(f"SELECT count(*) FROM {IMPORT_TABLE}"))).scalar()
+        # Повтор ключа внутри файла: остается первая строка
+        await db.execute(text(
+            f"DELETE FROM {IMPORT_TABLE} a USING {IMPORT_TABLE} b "
+            f"WHERE a.unique_key = b.unique_key AND a.ctid > b.ctid"
+        ))
+        # Временные таблицы не анализирует autovacuum, без статистики план переноса случаен
+        await db.execute(text(f"ANALYZE {IMPORT_TABLE}"))
+        await _ensure_import_partitions(db)
+        await db.execute(text(f"CREATE TEMP TABLE {INSERTED_TABLE} (LIKE proxy_earnings) ON COMMIT DROP"))
+        inserted = (await db.execute(text(_TRANSFER_SQL))).rowcount
+        await merge_into_rollups(db, INSERTED_TABLE)
+        # Массовая загрузка заметно меняет статистику - сбрасываем кэши после коммита
+        await notify(db, "stats")
+    except EarningsImportError:
+        raise
+    except DBAPIError as e:
+        raise EarningsImportError(str(e.orig))
+    except Exception as e:
+        # Ошибки COPY приходят от драйвера напрямую, без обертки SQLAlchemy
+        if type(e).__module__.startswith("asyncpg"):
+            raise EarningsImportError(str(e))
+        raise
+
+    earnings_ingested.inc(value=inserted)
+    earnings_duplicates.inc(value=received - inserted)
+    return {"received": received, "inserted": inserted, "duplicates": received - inserted}
@@ -0,0 +1,249 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import Select, select, cast, Text
+from typing import AsyncIterator, List
+
+from app.database import read_sessionmaker
+from app.models.earnings import ProxyEarning
+
+logger = logging.getLogger(__name__)
+
+# Parquet - опциональная зависимость
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Сколько строк забирать с серверного курсора за раз
+STREAM_CHUNK_ROWS = 2000
+# Строк в одной группе Parquet (группа собирается в памяти целиком)
+PARQUET_ROW_GROUP_ROWS = 50_000
+# Сколько блоков COPY держать в очереди, пока клиент не прочитал предыдущие
+COPY_QUEUE_CHUNKS = 64
+# Сколько ждать остановки COPY после отключения клиента
+COPY_CANCEL_TIMEOUT_SECONDS = 5
+
+EARNING_COLUMNS = [column.name for column in ProxyEarning.__table__.columns]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# CSV с разделителем и кавычкой из управляющих символов: строка JSON их не содержит
+# (JSON экранирует управляющие символы), поэтому COPY передает ее как есть -
+# одна строка JSON на строку вывода, без экранирования формата text
+JSON_LINES_COPY_OPTIONS = {"format": "csv", "delimiter": "\x02", "quote": "\x01"}
+
+
+def _json_default(value):
+    # Decimal отдаем строкой, как EarningResponse: без потери точности
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _ndjson_lines(rows) -> str:
+    return "".join(json.dumps(dict(row), default=_json_default, ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        # extra_data - как JSON, а не repr словаря
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv_lines(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EARNING_COLUMNS)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return buffer.getvalue()
+
+
+async def stream_earnings(stmt: Select, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка результата запроса в NDJSON или CSV.
+
+    Строки читаются серверным курсором (AsyncSession.stream) порциями по
+    STREAM_CHUNK_ROWS, поэтому память процесса не зависит от объема выгрузки.
+    Сессия (на реплике, если она доступна) открывается здесь же и живет, пока
+    клиент читает ответ.
+    """
+    async with read_sessionmaker(autocommit=False)() as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK_ROWS))
+        if fmt == "csv":
+            yield _csv_lines([], header=True).encode()
+            async for rows in result.partitions():
+                yield _csv_lines(rows).encode()
+        else:
+            async for rows in result.mappings().partitions():
+                yield _ndjson_lines(rows).encode()
+
+
+def _compile(stmt: Select, dialect) -> tuple:
+    """
+    SQL с параметрами $1..$n и значения параметров для asyncpg.
+
+    Значения проходят bind processors типов, как при обычном execute: например,
+    словарь для JSONB (фильтр asn_org) превращается в строку JSON, которую ждет
+    кодек asyncpg.
+    """
+    compiled = stmt.compile(dialect=dialect)
+    params = compiled.construct_params()
+    values = []
+    for name in compiled.positiontup:
+        value = params[name]
+        processor = compiled.binds[name].type.dialect_impl(dialect).bind_processor(dialect)
+        values.append(processor(value) if processor is not None else value)
+    return str(compiled), values
+
+
+def copy_query(filters: list, fmt: str) -> Select:
+    """Запрос выгрузки для COPY: в порядке хранения, без сортировки по времени"""
+    columns = ProxyEarning.__table__.columns
+    if fmt == "ndjson":
+        # reward_amount строкой, как в EarningResponse: JSON-число теряет точность у клиентов
+        columns = [cast(column, Text).label(column.name) if column.name == "reward_amount" else column
+                   for column in columns]
+    return select(*columns).where(*filters)
+
+
+async def copy_earnings(filters: list, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка через COPY ... TO STDOUT (CSV с заголовком или NDJSON).
+
+    Postgres сам форматирует строки, процесс только пересылает блоки. Очередь
+    между COPY и клиентом ограничена COPY_QUEUE_CHUNKS: медленный клиент
+    притормаживает чтение из базы, а не копит выгрузку в памяти.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=COPY_QUEUE_CHUNKS)
+    async with read_sessionmaker()() as session:
+        conn = await session.connection()
+        raw = (await conn.get_raw_connection()).driver_connection
+        sql, params = _compile(copy_query(filters, fmt), conn.dialect)
+        if fmt == "csv":
+            options = {"format": "csv", "header": True}
+        else:
+            # Строка JSON собирается в Postgres
+            sql = f"SELECT row_to_json(e)::text FROM ({sql}) AS e"
+            options = JSON_LINES_COPY_OPTIONS
+
+        async def output(data):
+            # asyncpg отдает блоки как изменяемый буфер
+            await queue.put(bytes(data))
+
+        async def run():
+            try:
+                await raw.copy_from_query(sql, *params, output=output, **options)
+            except asyncio.CancelledError:
+                # Клиент отключился: конец потока читать некому, а очередь может
+                # быть полна - put() ждал бы вечно и держал сессию с соединением
+                raise
+            except Exception:
+                await queue.put(None)
+                raise
+            await queue.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            # Ошибка COPY всплывает здесь
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await asyncio.wait_for(task, COPY_CANCEL_TIMEOUT_SECONDS)
+                except asyncio.CancelledError:
+                    pass
+                except asyncio.TimeoutError:
+                    logger.warning(f"COPY не остановился за {COPY_CANCEL_TIMEOUT_SECONDS} с после отключения клиента")
+
+
+class _ChunkSink:
+    """Файл для pyarrow: накапливает записанные байты, чтобы отдавать их по частям"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_schema():
+    """Схема Parquet по колонкам ProxyEarning"""
+    types = {
+        "id": pyarrow.int64(),
+        "proxy_port": pyarrow.int32(),
+        "asn": pyarrow.int64(),
+        "reward_amount": pyarrow.decimal128(20, 8),
+        "success": pyarrow.bool_(),
+        "event_timestamp": pyarrow.timestamp("us", tz="UTC"),
+        "created_at": pyarrow.timestamp("us", tz="UTC"),
+    }
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in EARNING_COLUMNS])
+
+
+async def stream_parquet(filters: list) -> AsyncIterator[bytes]:
+    """
+    Потоковая выгрузка в Parquet (нужен pyarrow).
+
+    Строки читаются серверным курсором и пишутся группами по PARQUET_ROW_GROUP_ROWS;
+    после каждой группы готовые байты сразу уходят клиенту.
+    """
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), schema, compression="zstd")
+    stmt = select(*ProxyEarning.__table__.columns).where(*filters)
+    async with read_sessionmaker(autocommit=False)() as session:
+        result = await session.stream(stmt.execution_options(yield_per=PARQUET_ROW_GROUP_ROWS))
+        async for rows in result.mappings().partitions():
+            records = [dict(row) for row in rows]
+            for record in records:
+                # extra_data (JSONB) в Parquet - строка JSON
+                if record["extra_data"] is not None:
+                    record["extra_data"] = json.dumps(record["extra_data"], ensure_ascii=False)
+            writer.write_table(pyarrow.Table.from_pylist(records, schema=schema))
+            yield sink.take()
+    writer.close()
+    yield sink.take()
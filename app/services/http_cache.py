@@ -0,0 +1,84 @@
+"""
+Условные запросы (ETag / Last-Modified) для ответов, которые меняются только
+вместе с данными под ними.
+
+Версия статистики - последняя строка журнала rollup_version, куда после коммита
+каждого изменения агрегатов пишется строка с новым номером (чтение - одна
+строка по первичному ключу). Ответ 304 отдается до запроса самих агрегатов.
+ETag слабый: он описывает данные, а не байты, и не меняется от сжатия ответа.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple, Optional
+
+from app.config import settings
+from app.models.rollups import RollupVersion
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Актуальна ли у клиента версия etag / last_modified (If-None-Match, If-Modified-Since)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Слабое сравнение: W/"x" и "x" - одна версия
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    # If-Modified-Since учитывается, только если клиент не прислал ETag
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+class StatsVersion(NamedTuple):
+    """Версия агрегатов: number растет в порядке коммитов, updated_at - для Last-Modified"""
+    number: int
+    updated_at: datetime
+
+
+async def rollup_version(db: AsyncSession) -> Optional[StatsVersion]:
+    """Текущая версия агрегатов (None - агрегаты еще не менялись)"""
+    row = (await db.execute(
+        select(RollupVersion.version, RollupVersion.updated_at).order_by(RollupVersion.version.desc()).limit(1)
+    )).first()
+    return StatsVersion(*row) if row else None
+
+
+def revalidate_stats(request: Request, response: Response, version: Optional[StatsVersion],
+                     *times: Optional[datetime], variant: tuple = ()) -> Optional[Response]:
+    """
+    Проставляет ETag/Last-Modified/Cache-Control ответа статистики и проверяет
+    условный запрос; возвращает ответ 304 или None.
+
+    version - версия агрегатов; times - прочее, от чего зависит ответ: начало
+    текущего часа/суток для скользящих окон, время курсов для пересчета в валюту.
+    variant - параметры запроса, меняющие содержимое (в ETag).
+    """
+    known = [time for time in (version.updated_at if version else None, *times) if time is not None]
+    last_modified = max(known) if known else None
+    digest = hashlib.sha256(repr((
+        version.number if version else None,
+        [time.isoformat() if time else None for time in times],
+        request.url.path,
+        variant,
+    )).encode()).hexdigest()[:32]
+    headers = {
+        "ETag": f'W/"{digest}"',
+        "Cache-Control": f"public, max-age={settings.STATS_HTTP_MAX_AGE_SECONDS}",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    response.headers.update(headers)
+    if not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    return None
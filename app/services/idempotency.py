@@ -0,0 +1,87 @@
+import hashlib
+from collections import OrderedDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Dict, Any, Tuple
+
+from app.config import settings
+from app.services.ingest import insert_earnings, get_existing_earning
+from app.services.ingest_buffer import ingest_buffer
+from app.services.metrics import track_cache
+from app.services.rollups import commit_rollups
+
+
+def make_unique_key(*parts) -> str:
+    """SHA-256 от частей ключа: ровно 64 hex-символа, как колонка unique_key"""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class RecentKeys:
+    """
+    LRU недавно записанных unique_key -> строка (id, unique_key, created_at).
+
+    Повторы после таймаутов отвечаются отсюда без обращения к Postgres.
+    В кэш попадают только ключи закоммиченных записей.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._items.get(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return row
+
+    def put(self, key: str, row: Any):
+        self._items[key] = row
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+recent_keys = RecentKeys(settings.IDEMPOTENCY_CACHE_SIZE)
+
+
+async def submit_earning(db: AsyncSession, row: Dict[str, Any]) -> Tuple[Optional[Any], str]:
+    """
+    Идемпотентная запись одного события заработка.
+
+    Возвращает (строка id/unique_key/created_at, статус), где статус:
+    created - запись создана, replayed - событие с этим unique_key уже было,
+    queued - строка принята буфером без ожидания записи (INGEST_BUFFER_ACK=enqueue).
+    """
+    key = row["unique_key"]
+    stored = recent_keys.get(key)
+    if stored is not None:
+        return stored, "replayed"
+
+    if ingest_buffer.running:
+        future = ingest_buffer.submit(row)
+        if settings.INGEST_BUFFER_ACK == "enqueue":
+            return None, "queued"
+        stored = await future
+    else:
+        inserted = await insert_earnings(db, [row])
+        await commit_rollups(db)
+        stored = inserted.get(key)
+
+    status = "created"
+    if stored is None:
+        # ON CONFLICT DO NOTHING: запись уже есть, достаем ее по индексу unique_key
+        stored = await get_existing_earning(db, key)
+        if stored is None:
+            raise LookupError(f"unique_key {key} conflicted but the record was not found")
+        status = "replayed"
+    recent_keys.put(key, stored)
+    return stored, status
+
+track_cache("idempotency_keys", recent_keys)
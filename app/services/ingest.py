@@ -0,0 +1,91 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Dict, Any, Optional
+
+from app.models.earnings import ProxyEarning, ProxyEarningKey
+from app.services.metrics import earnings_ingested, earnings_duplicates
+from app.services.rollups import apply_to_rollups
+
+# Строк на один шаг (регистрация ключей + запись); executemany SQLAlchemy сам
+# делит на multi-row INSERT в пределах лимита параметров asyncpg (32767)
+INSERT_CHUNK_SIZE = 1000
+
+# Выражения не зависят от данных: строки передаются параметрами (executemany),
+# поэтому SQL компилируется один раз и берется из кэша SQLAlchemy
+_keys_table = ProxyEarningKey.__table__
+_earnings_table = ProxyEarning.__table__
+REGISTER_KEYS = (
+    pg_insert(_keys_table)
+    .on_conflict_do_nothing(index_elements=[_keys_table.c.unique_key])
+    .returning(_keys_table.c.unique_key)
+)
+INSERT_EARNINGS = insert(_earnings_table).returning(
+    _earnings_table.c.id, _earnings_table.c.unique_key, _earnings_table.c.created_at
+)
+
+
+async def insert_earnings(db: AsyncSession, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Пакетная вставка записей заработка.
+
+    Сначала ключи регистрируются в proxy_earning_keys через
+    INSERT ... ON CONFLICT (unique_key) DO NOTHING RETURNING, затем в proxy_earnings
+    пишутся только строки с новыми ключами (Core insert без ORM-объектов). Возвращает
+    {unique_key: строка (id, unique_key, created_at)} для реально вставленных записей;
+    дубликаты в результат не попадают. В той же транзакции обновляются агрегаты
+    статистики. Коммит остается за вызывающим кодом (rollups.commit_rollups).
+    """
+    inserted = {}
+    new_rows = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        new_keys = set((await db.execute(
+            REGISTER_KEYS,
+            [{"unique_key": row["unique_key"], "event_timestamp": row["event_timestamp"]} for row in chunk],
+        )).scalars())
+
+        # Повтор ключа внутри пакета: запись получает только первая строка
+        chunk_rows = []
+        for row in chunk:
+            if row["unique_key"] in new_keys:
+                new_keys.discard(row["unique_key"])
+                chunk_rows.append(row)
+        if not chunk_rows:
+            continue
+
+        result = await db.execute(INSERT_EARNINGS, chunk_rows)
+        for row in result:
+            inserted[row.unique_key] = row
+        new_rows.extend(chunk_rows)
+
+    await apply_to_rollups(db, new_rows)
+    earnings_ingested.inc(value=len(new_rows))
+    earnings_duplicates.inc(value=len(rows) - len(new_rows))
+    return inserted
+
+
+def _by_unique_key(query, unique_key: str):
+    # event_timestamp из реестра ключей позволяет отсечь лишние секции
+    return (
+        query.join(
+            ProxyEarningKey,
+            (ProxyEarningKey.unique_key == ProxyEarning.unique_key)
+            & (ProxyEarningKey.event_timestamp == ProxyEarning.event_timestamp),
+        )
+        .where(ProxyEarningKey.unique_key == unique_key)
+    )
+
+
+async def get_existing_earning(db: AsyncSession, unique_key: str) -> Optional[Any]:
+    """Строка (id, unique_key, created_at) уже записанного события или None"""
+    result = await db.execute(_by_unique_key(
+        select(ProxyEarning.id, ProxyEarning.unique_key, ProxyEarning.created_at), unique_key
+    ))
+    return result.first()
+
+
+async def get_earning_record(db: AsyncSession, unique_key: str) -> Optional[ProxyEarning]:
+    """Записанная запись целиком (с вычисляемыми asn/session_id) или None"""
+    result = await db.execute(_by_unique_key(select(ProxyEarning), unique_key))
+    return result.scalar_one_or_none()
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from typing import Optional, List, Dict, Any, Tuple
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.services.ingest import insert_earnings
+from app.services.metrics import registry
+from app.services.rollups import commit_rollups
+
+logger = logging.getLogger(__name__)
+
+# Маркер остановки фоновой задачи
+_STOP = object()
+
+
+class IngestQueueFull(Exception):
+    """Очередь записи переполнена - клиенту нужно повторить запрос позже"""
+
+
+class IngestBuffer:
+    """
+    Буфер отложенной записи (write-behind) для одиночных событий заработка.
+
+    Обработчики кладут строки proxy_earnings в очередь, фоновая задача
+    собирает их в пакеты и пишет одной транзакцией каждые max_rows строк
+    или flush_interval_ms миллисекунд. Для каждой строки возвращается future,
+    который завершается строкой RETURNING (id, unique_key, created_at)
+    или None, если запись с таким unique_key уже существует.
+    """
+
+    def __init__(self, max_rows: int, flush_interval_ms: int, max_depth: int):
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_depth = max_depth
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Запуск фоновой задачи записи (вызывается при старте приложения)"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._spawn()
+        logger.info(f"Буфер записи запущен: {self.max_rows} строк / {self.flush_interval * 1000:.0f} мс, "
+                    f"глубина очереди {self.max_depth}")
+
+    def _spawn(self):
+        self._task = asyncio.create_task(self._run(), name="ingest-buffer")
+        self._task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task):
+        # Упавшая задача перезапускается: строки в очереди ждут записи, а
+        # обработчики продолжают класть новые
+        if task is not self._task or task.cancelled() or task.exception() is None:
+            return
+        logger.error("Фоновая задача буфера записи упала, перезапускаем", exc_info=task.exception())
+        self._spawn()
+
+    async def stop(self):
+        """Прекращает прием строк и дожидается записи всего, что уже в очереди"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+        logger.info("Буфер записи остановлен, очередь сброшена в БД")
+
+    def submit(self, row: Dict[str, Any]) -> asyncio.Future:
+        """Ставит строку в очередь; при переполнении бросает IngestQueueFull"""
+        if not self.running:
+            raise IngestQueueFull("Ingest buffer is not running")
+        future = asyncio.get_running_loop().create_future()
+        # В режиме ack=enqueue результат никто не ждет - гасим "exception was never retrieved"
+        future.add_done_callback(_consume_exception)
+        try:
+            self._queue.put_nowait((row, future))
+        except asyncio.QueueFull:
+            raise IngestQueueFull(f"Ingest queue is full ({self.max_depth} rows)")
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Пакет не должен оставить обработчики ждать вечно
+                logger.error(f"Сбой записи пакета из {len(batch)} строк: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        # Повтор ключа внутри пакета: запись получает только первая строка
+        unique, duplicates = {}, []
+        for row, future in batch:
+            if row["unique_key"] in unique:
+                duplicates.append(future)
+            else:
+                unique[row["unique_key"]] = (row, future)
+
+        try:
+            async with AsyncSessionLocal() as session:
+                inserted = await insert_earnings(session, [row for row, _ in unique.values()])
+                await commit_rollups(session)
+        except Exception as e:
+            logger.error(f"Ошибка групповой записи {len(unique)} строк, пробуем по одной: {e}")
+            await self._flush_one_by_one(list(unique.values()))
+        else:
+            for key, (_, future) in unique.items():
+                _resolve(future, inserted.get(key))
+        for future in duplicates:
+            _resolve(future, None)
+
+    async def _flush_one_by_one(self, items: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Запасной путь: изолирует строку, из-за которой упала групповая запись"""
+        for row, future in items:
+            try:
+                async with AsyncSessionLocal() as session:
+                    inserted = await insert_earnings(session, [row])
+                    await commit_rollups(session)
+            except Exception as e:
+                logger.error(f"Ошибка записи строки {row['unique_key']}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                _resolve(future, inserted.get(row["unique_key"]))
+
+
+def _consume_exception(future: asyncio.Future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _resolve(future: asyncio.Future, result):
+    # Клиент мог отключиться и отменить ожидание
+    if not future.done():
+        future.set_result(result)
+
+
+ingest_buffer = IngestBuffer(
+    max_rows=settings.INGEST_BUFFER_MAX_ROWS,
+    flush_interval_ms=settings.INGEST_BUFFER_FLUSH_MS,
+    max_depth=settings.INGEST_BUFFER_MAX_DEPTH,
+)
+
+registry.callback(
+    "ingest_buffer_queue_depth", "Rows waiting in the write-behind buffer", (),
+    lambda: [((), ingest_buffer.depth)],
+)
@@ -0,0 +1,211 @@
+"""
+Метрики в формате Prometheus без внешних зависимостей.
+
+Все обновления выполняются в потоке event loop процесса, поэтому счетчики -
+обычные словари без блокировок; каждый воркер отдает свои значения, суммирует
+их Prometheus. Гистограммы хранят счетчики корзин, а не отдельные замеры.
+"""
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Корзины латентности HTTP и SQL, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики корзин (последняя - +Inf), сумма]
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class CallbackMetric(Metric):
+    """Значения считываются в момент запроса /metrics: callback возвращает [(labels, value)]"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Labels, Optional[float]]]], kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        for labels, value in self.callback():
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[Labels, Optional[float]]]], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, labelnames, callback, kind))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time by operation and table", ("pool", "operation", "table")
+)
+earnings_ingested = registry.counter("earnings_ingested_rows_total", "Rows inserted into proxy_earnings")
+earnings_duplicates = registry.counter("earnings_duplicate_rows_total", "Submitted rows skipped as duplicates")
+
+# Кэши с атрибутами hits/misses (и coalesced, если кэш объединяет загрузки): имя -> объект
+_caches: Dict[str, object] = {}
+
+
+def track_cache(name: str, cache):
+    _caches[name] = cache
+
+
+registry.callback(
+    "cache_requests_total", "Cache lookups by result", ("cache", "result"),
+    lambda: [((name, result), getattr(cache, result)) for name, cache in _caches.items()
+             for result in ("hits", "misses", "coalesced") if hasattr(cache, result)],
+    kind="counter",
+)
+
+
+# Метка запроса: операция и первая таблица. Одинаковые тексты SQL повторяются,
+# поэтому разбор кэшируется
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?([a-zA-Z_][\w.]*)", re.IGNORECASE)
+_statement_labels: Dict[str, Tuple[str, str]] = {}
+
+
+def statement_labels(statement: str) -> Tuple[str, str]:
+    labels = _statement_labels.get(statement)
+    if labels is None:
+        words = statement.lstrip(" \n(").split(None, 1)
+        operation = words[0].upper() if words else ""
+        match = _STATEMENT_TABLE.search(statement)
+        labels = (operation, match.group(1) if match else "")
+        if len(_statement_labels) > 5000:
+            _statement_labels.clear()
+        _statement_labels[statement] = labels
+    return labels
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность запросов по шаблону маршрута (/earnings/{earning_id}),
+    а не по фактическому пути, чтобы число рядов метрики не росло.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+from sqlalchemy import Select, tuple_
+from typing import Optional, Tuple
+
+from app.models.earnings import ProxyEarning
+
+
+def encode_cursor(event_timestamp: datetime, earning_id: int) -> str:
+    """Непрозрачный курсор на позицию (event_timestamp, id)"""
+    raw = f"{event_timestamp.isoformat()}|{earning_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбор курсора; ValueError для поврежденного значения"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, earning_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(earning_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def newest_first(stmt: Select, cursor: Optional[str] = None) -> Select:
+    """
+    Сортировка от новых к старым по (event_timestamp, id) и продолжение после курсора.
+
+    Кроме сравнения кортежей добавляется event_timestamp <= курсора: по нему
+    Postgres отсекает секции, которые уже пройдены.
+    """
+    if cursor is not None:
+        timestamp, earning_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            ProxyEarning.event_timestamp <= timestamp,
+            tuple_(ProxyEarning.event_timestamp, ProxyEarning.id) < tuple_(timestamp, earning_id),
+        )
+    return stmt.order_by(ProxyEarning.event_timestamp.desc(), ProxyEarning.id.desc())
@@ -0,0 +1,263 @@
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.services.coordination import try_advisory_xact_lock
+from app.services.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Секции называются <таблица>_pYYYY_MM (месяц) или <таблица>_pYYYY_MM_DD (день);
+# границы секции восстанавливаются из имени
+_PARTITION_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})(?:_(\d{2}))?$")
+
+# Ключей реестра на одну транзакцию удаления при очистке по сроку хранения
+KEY_PRUNE_BATCH = 10_000
+# Сколько секция для импорта ждет блокировку proxy_earnings: дольше в очереди за ней
+# встали бы все запросы к таблице
+PARTITION_LOCK_TIMEOUT_MS = 5000
+
+
+def period_start(ts: datetime, interval: str) -> datetime:
+    """Начало периода (месяц или день, UTC), в который попадает ts"""
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1) if interval == "month" else ts
+
+
+def next_period(start: datetime, interval: str) -> datetime:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: datetime, interval: str) -> str:
+    return f"{table}_p{start:%Y_%m}" if interval == "month" else f"{table}_p{start:%Y_%m_%d}"
+
+
+def partition_range(table: str, name: str) -> Optional[Tuple[datetime, datetime]]:
+    """Границы [начало, конец) секции по ее имени; None для DEFAULT и сторонних секций"""
+    match = _PARTITION_SUFFIX.search(name)
+    if not name.startswith(f"{table}_p") or not match:
+        return None
+    year, month, day = match.groups()
+    interval = "day" if day else "month"
+    start = datetime(int(year), int(month), int(day or 1), tzinfo=timezone.utc)
+    return start, next_period(start, interval)
+
+
+async def list_partitions(db: AsyncSession, table: str) -> Dict[str, Optional[Tuple[datetime, datetime]]]:
+    """Секции таблицы: имя -> границы"""
+    result = await db.execute(
+        text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:table AS regclass)
+        """),
+        {"table": table},
+    )
+    return {name: partition_range(table, name) for name in result.scalars()}
+
+
+async def ensure_partitions(db: AsyncSession, table: str, interval: str, ahead: int,
+                            now: Optional[datetime] = None) -> List[str]:
+    """
+    Создает секции на текущий и ahead следующих периодов.
+
+    Период, уже покрытый секцией другой нарезки (например, месячной при переходе
+    на суточные), пропускается. Возвращает имена созданных секций.
+    """
+    existing = [bounds for bounds in (await list_partitions(db, table)).values() if bounds]
+    created = []
+    start = period_start(now or datetime.now(timezone.utc), interval)
+    for _ in range(ahead + 1):
+        end = next_period(start, interval)
+        if not any(start < other_end and other_start < end for other_start, other_end in existing):
+            name = partition_name(table, start, interval)
+            await db.execute(text(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            existing.append((start, end))
+            created.append(name)
+        start = end
+    return created
+
+
+async def _ensure_each(db: AsyncSession, table: str, interval: str, starts: List[datetime]) -> List[str]:
+    """
+    Секции под периоды starts, каждая в своей точке сохранения: период, секцию
+    которого создать не удалось (не дождались блокировки, в DEFAULT уже есть строки
+    за период), пропускается с предупреждением, остальные создаются.
+    """
+    created = []
+    for start in sorted(starts):
+        try:
+            async with db.begin_nested():
+                created += await ensure_partitions(db, table, interval, 0, now=start)
+        except DBAPIError as e:
+            logger.warning(f"Не удалось создать секцию {table} для {start:%Y-%m-%d}: {e.orig}")
+    return created
+
+
+def _upcoming(interval: str, ahead: int) -> List[datetime]:
+    """Текущий и ahead следующих периодов"""
+    starts = [period_start(datetime.now(timezone.utc), interval)]
+    for _ in range(ahead):
+        starts.append(next_period(starts[-1], interval))
+    return starts
+
+
+async def _lock_for_ddl(db: AsyncSession, wait: bool = False) -> bool:
+    """
+    Advisory-блокировка обслуживания секций и lock_timeout до конца транзакции.
+
+    DDL секций берет ACCESS EXCLUSIVE на родительскую таблицу; в очереди за ней
+    (например, за долгой выгрузкой) встали бы все запросы к таблице, поэтому
+    ожидание ограничено PARTITION_LOCK_TIMEOUT_MS.
+    """
+    if wait:
+        await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": "partition-maintenance"})
+    elif not await try_advisory_xact_lock(db, "partition-maintenance"):
+        return False
+    await db.execute(text(f"SET LOCAL lock_timeout = {PARTITION_LOCK_TIMEOUT_MS}"))
+    return True
+
+
+async def ensure_period_partitions(starts: List[datetime]) -> List[str]:
+    """
+    Секции proxy_earnings под периоды, начинающиеся в starts (импорт истории).
+
+    Отдельная короткая транзакция: CREATE TABLE ... PARTITION OF берет ACCESS
+    EXCLUSIVE на proxy_earnings до коммита, поэтому секции создаются до переноса
+    данных, а не внутри долгой транзакции импорта. С плановым обслуживанием
+    не пересекается; период без секции остается в DEFAULT.
+    """
+    async with AsyncSessionLocal() as session:
+        await _lock_for_ddl(session, wait=True)
+        created = await _ensure_each(session, "proxy_earnings", settings.EARNINGS_PARTITION_INTERVAL, starts)
+        await session.commit()
+    return created
+
+
+async def expire_partitions(db: AsyncSession, table: str, retention_days: int, action: str,
+                            now: Optional[datetime] = None) -> List[str]:
+    """
+    Отсоединяет (detach) или удаляет (drop) секции, целиком старше retention_days.
+
+    Отсоединенная секция остается обычной таблицей для архивации. Каждая секция -
+    в своей точке сохранения: ошибка по одной (например, не дождались блокировки)
+    не отменяет остальные. Возвращает имена обработанных секций.
+    """
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=retention_days)
+    expired = []
+    for name, bounds in sorted((await list_partitions(db, table)).items()):
+        if bounds is None or bounds[1] > cutoff:
+            continue
+        try:
+            async with db.begin_nested():
+                if action == "drop":
+                    await db.execute(text(f'DROP TABLE "{name}"'))
+                else:
+                    await db.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"'))
+        except DBAPIError as e:
+            logger.warning(f"Не удалось снять секцию {name} ({action}): {e.orig}")
+            continue
+        expired.append(name)
+    return expired
+
+
+async def maintain_partitions():
+    """
+    Плановое обслуживание секций: создание вперед и удаление по сроку хранения.
+
+    proxy_earnings режется по EARNINGS_PARTITION_INTERVAL; история курсов невелика
+    (несколько десятков точек в сутки), для нее всегда помесячные секции без удаления.
+    Создание и удаление - в отдельных коротких транзакциях, каждый период в своей
+    точке сохранения: неудача с одним периодом не мешает остальным и сроку хранения.
+    """
+    async with AsyncSessionLocal() as session:
+        # Воркеры запускают обслуживание одновременно при старте - выполняет один
+        if not await _lock_for_ddl(session):
+            return
+        interval = settings.EARNINGS_PARTITION_INTERVAL
+        created = await _ensure_each(
+            session, "proxy_earnings", interval, _upcoming(interval, settings.EARNINGS_PARTITIONS_AHEAD)
+        )
+        created += await _ensure_each(
+            session, "currency_rate_history", "month", _upcoming("month", settings.EARNINGS_PARTITIONS_AHEAD)
+        )
+        await session.commit()
+    if created:
+        logger.info(f"Созданы секции: {', '.join(created)}")
+    if settings.EARNINGS_RETENTION_DAYS <= 0:
+        return
+
+    async with AsyncSessionLocal() as session:
+        if not await _lock_for_ddl(session):
+            return
+        expired = await expire_partitions(
+            session, "proxy_earnings", settings.EARNINGS_RETENTION_DAYS, settings.EARNINGS_RETENTION_ACTION
+        )
+        horizon = await retention_horizon(session)
+        await session.commit()
+    if expired:
+        logger.info(f"Секции proxy_earnings с истекшим сроком хранения ({settings.EARNINGS_RETENTION_ACTION}): "
+                    f"{', '.join(expired)}")
+    if horizon is not None:
+        # Ключи событий из снятых секций больше не нужны для дедупликации
+        pruned = await prune_earning_keys(horizon)
+        if pruned:
+            logger.info(f"Удалено ключей снятых секций из proxy_earning_keys: {pruned}")
+
+
+async def retention_horizon(db: AsyncSession) -> Optional[datetime]:
+    """Начало самой старой секции proxy_earnings по диапазону (None - секций нет)"""
+    starts = [bounds[0] for bounds in (await list_partitions(db, "proxy_earnings")).values() if bounds]
+    return min(starts, default=None)
+
+
+async def prune_earning_keys(horizon: datetime, batch: int = KEY_PRUNE_BATCH) -> int:
+    """
+    Удаляет из proxy_earning_keys ключи событий, которых больше нет в proxy_earnings.
+
+    Реестр намеренно не секционирован: уникальный индекс секционированной таблицы
+    обязан включать ключ секционирования, и unique_key перестал бы быть уникальным
+    глобально. Поэтому ключи снятых секций удаляются порциями по batch строк, каждая
+    в своей короткой транзакции: без долгих блокировок и без одного огромного DELETE.
+
+    Кандидаты - ключи старше horizon (ниже него секций по диапазону уже нет); ключ
+    остается, если его запись еще лежит в proxy_earnings (секция DEFAULT). Очистка
+    идет при каждом обслуживании, поэтому прерванная на середине доделывается позже.
+    """
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                text("""
+                    DELETE FROM proxy_earning_keys WHERE unique_key IN (
+                        SELECT k.unique_key FROM proxy_earning_keys k
+                        WHERE k.event_timestamp < :horizon
+                          AND NOT EXISTS (
+                              SELECT 1 FROM proxy_earnings e
+                              WHERE e.unique_key = k.unique_key AND e.event_timestamp = k.event_timestamp
+                          )
+                        LIMIT :batch
+                    )
+                """),
+                {"horizon": horizon, "batch": batch},
+            )
+            await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch:
+            return total
+
+
+partition_maintainer = PeriodicTask(
+    "partition-maintenance", settings.PARTITION_MAINTENANCE_MINUTES * 60, maintain_partitions
+)
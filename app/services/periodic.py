@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Callable, Awaitable, List, Optional
+
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Фоновая задача, выполняемая сразу при старте и затем каждые interval секунд.
+
+    jitter - доля интервала, на которую случайно сдвигается каждый запуск,
+    чтобы несколько процессов не ходили в БД или внешний API одновременно.
+    Ошибка одного запуска логируется и не останавливает задачу.
+    """
+
+    # Все созданные задачи - для метрик
+    tasks: List["PeriodicTask"] = []
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[None]], jitter: float = 0.0):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self.last_success: Optional[float] = None  # time.monotonic() последнего успешного запуска
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        PeriodicTask.tasks.append(self)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def next_delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.func()
+                self.last_success = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Ошибка фоновой задачи {self.name}: {e}")
+            await asyncio.sleep(self.next_delay())
+
+
+registry.callback(
+    "background_task_last_success_age_seconds", "Seconds since the last successful run of a background task",
+    ("task",), lambda: [
+        ((task.name,), time.monotonic() - task.last_success) for task in PeriodicTask.tasks
+        if task.running and task.last_success is not None
+    ],
+)
+registry.callback(
+    "background_task_failures_total", "Failed runs of a background task", ("task",),
+    lambda: [((task.name,), task.failures) for task in PeriodicTask.tasks], kind="counter",
+)
@@ -0,0 +1,151 @@
+"""
+Профилирование SQL: время каждого запроса, журнал медленных запросов,
+заголовок Server-Timing и выборочный EXPLAIN ANALYZE.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from typing import Any, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.metrics import db_query_duration, statement_labels
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.slow_query")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str, limit: int = 2000) -> str:
+    """SQL без литералов и лишних пробелов: одинаковые запросы дают одинаковую строку"""
+    return _SPACES.sub(" ", _LITERALS.sub("?", statement)).strip()[:limit]
+
+
+class RequestProfile:
+    """SQL-запросы текущего HTTP-запроса"""
+
+    __slots__ = ("scope", "explain", "db_count", "db_time", "slowest")
+
+    def __init__(self, scope, explain: bool):
+        self.scope = scope
+        self.explain = explain
+        self.db_count = 0
+        self.db_time = 0.0
+        # (время, движок, SQL, параметры) самого долгого SELECT для EXPLAIN ANALYZE
+        self.slowest: Optional[Tuple[float, Any, str, Any]] = None
+
+    @property
+    def route(self) -> str:
+        # Шаблон маршрута известен после роутинга; до него - фактический путь
+        route = self.scope.get("route")
+        return getattr(route, "path", self.scope["path"])
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def instrument_engine(engine, pool_name: str):
+    """Замер времени каждого SQL-запроса через события движка"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation, table = statement_labels(statement)
+        db_query_duration.observe(elapsed, pool_name, operation, table)
+
+        profile = current_profile.get()
+        if profile is not None:
+            profile.db_count += 1
+            profile.db_time += elapsed
+            if (profile.explain and operation == "SELECT" and not executemany
+                    and (profile.slowest is None or elapsed > profile.slowest[0])):
+                profile.slowest = (elapsed, engine, statement, parameters)
+
+        if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            slow_query_logger.warning(
+                f"{elapsed * 1000:.1f} ms [{pool_name}] {profile.route if profile else 'background'}: "
+                f"{normalize_sql(statement)}"
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+async def explain_analyze(route: str, engine, statement: str, parameters):
+    """Повторяет SELECT под EXPLAIN ANALYZE и пишет план в лог"""
+    try:
+        async with engine.connect() as conn:
+            result = await conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+            plan = result.scalar()
+            await conn.rollback()
+    except Exception as e:
+        logger.warning(f"EXPLAIN ANALYZE для {route} не выполнен: {e}")
+        return
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    logger.info(f"EXPLAIN ANALYZE {route}: {normalize_sql(statement)}\n{json.dumps(plan, default=str)}")
+
+
+# Ссылки на фоновые EXPLAIN, чтобы задачи не собрал GC до завершения
+_explain_tasks: Set[asyncio.Task] = set()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: собирает SQL-запросы запроса и добавляет Server-Timing
+    (число и время запросов к БД, общее время до отправки заголовков).
+
+    Запросы к маршрутам с префиксом EXPLAIN_ROUTE_PREFIX с вероятностью
+    EXPLAIN_SAMPLE_RATE получают EXPLAIN ANALYZE самого долгого SELECT - уже
+    после ответа клиенту, в отдельном соединении.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        explain = (
+            settings.EXPLAIN_SAMPLE_RATE > 0
+            and scope["path"].startswith(settings.EXPLAIN_ROUTE_PREFIX)
+            and random.random() < settings.EXPLAIN_SAMPLE_RATE
+        )
+        profile = RequestProfile(scope, explain)
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.SERVER_TIMING_ENABLED:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={profile.db_time * 1000:.1f};desc="{profile.db_count} queries", '
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            if profile.slowest is not None:
+                task = asyncio.create_task(explain_analyze(profile.route, *profile.slowest[1:]))
+                _explain_tasks.add(task)
+                task.add_done_callback(_explain_tasks.discard)
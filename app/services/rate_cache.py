@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from fastapi import Request, Response
+from sqlalchemy import select
+from typing import Dict, Optional
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.currency import CurrencyRate
+from app.schemas.currency import CurrencyRateResponse
+from app.services.coordination import invalidation_listener
+from app.services.http_cache import not_modified
+from app.services.metrics import registry, track_cache
+from app.services.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateSnapshot:
+    """Неизменяемый снимок таблицы currency_rates"""
+    rates: Dict[str, CurrencyRateResponse]  # symbol -> курс, в порядке id
+    etag: str
+    last_updated: Optional[datetime]  # самое старое обновление курса
+    last_modified: Optional[datetime]  # самое свежее обновление курса (последняя успешная загрузка)
+    loaded_at: float  # time.monotonic() момента загрузки
+
+    @classmethod
+    def build(cls, records) -> "RateSnapshot":
+        rates = {record.symbol: CurrencyRateResponse.model_validate(record) for record in records}
+        updates = [rate.last_updated.astimezone(timezone.utc) for rate in rates.values()]
+        digest = hashlib.sha256(
+            "\n".join(f"{rate.symbol}:{rate.price}:{rate.last_updated.isoformat()}" for rate in rates.values()).encode()
+        ).hexdigest()[:32]
+        return cls(
+            rates=rates,
+            etag=f'"{digest}"',
+            last_updated=min(updates, default=None),
+            last_modified=max(updates, default=None),
+            loaded_at=time.monotonic(),
+        )
+
+    @property
+    def prices(self) -> Dict[str, float]:
+        return {symbol: float(rate.price) for symbol, rate in self.rates.items()}
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class RateCache:
+    """
+    Курсы валют в памяти процесса.
+
+    Чтение отдает текущий снимок без обращения к БД. Снимок перечитывается
+    фоновой задачей каждые refresh_seconds и сразу после /currency/fetch, новый
+    снимок подменяет старый целиком. Если снимок устарел (фоновая задача не
+    запущена или БД недоступна), его перечитывает первый запрос, остальные ждут
+    его результата. При ошибке БД снимок отдается, пока ему меньше max_stale_seconds.
+    """
+
+    def __init__(self, refresh_seconds: float, max_stale_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._snapshot: Optional[RateSnapshot] = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def snapshot(self) -> Optional[RateSnapshot]:
+        return self._snapshot
+
+    async def reload(self) -> RateSnapshot:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(CurrencyRate).order_by(CurrencyRate.id))
+            snapshot = RateSnapshot.build(result.scalars().all())
+        self._snapshot = snapshot
+        return snapshot
+
+    async def get(self) -> RateSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age < self.refresh_seconds:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог обновить другой запрос
+            if self._snapshot is not snapshot and self._snapshot.age < self.refresh_seconds:
+                return self._snapshot
+            try:
+                return await self.reload()
+            except Exception as e:
+                if snapshot is None or snapshot.age >= self.max_stale_seconds:
+                    raise
+                logger.warning(f"Не удалось обновить снимок курсов, отдаем прежний: {e}")
+                return snapshot
+
+
+def revalidate(request: Request, response: Response, snapshot: RateSnapshot) -> Optional[Response]:
+    """
+    Проставляет ETag/Cache-Control/Last-Modified и проверяет условный запрос.
+
+    Возвращает ответ 304, если у клиента актуальная версия, иначе None.
+    """
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": f"public, max-age={int(rate_cache.refresh_seconds)}",
+    }
+    if snapshot.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(snapshot.last_modified, usegmt=True)
+    response.headers.update(headers)
+    if not_modified(request, snapshot.etag, snapshot.last_modified):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+rate_cache = RateCache(
+    settings.CURRENCY_CACHE_REFRESH_SECONDS, settings.CURRENCY_UPDATE_THRESHOLD_MINUTES * 60
+)
+
+# Перечитываем чаще срока жизни снимка, чтобы запросы не попадали на перезагрузку
+rate_cache_refresher = PeriodicTask(
+    "currency-rate-cache", settings.CURRENCY_CACHE_REFRESH_SECONDS / 2, rate_cache.reload, jitter=0.1
+)
+track_cache("currency_rates", rate_cache)
+# Курсы загрузил другой процесс - перечитываем снимок, не дожидаясь refresh_seconds
+invalidation_listener.subscribe("rates", rate_cache.reload)
+registry.callback(
+    "currency_rate_snapshot_age_seconds", "Seconds since the in-memory rate snapshot was loaded", (),
+    lambda: [((), rate_cache.snapshot.age if rate_cache.snapshot else None)],
+)
+registry.callback(
+    "currency_rates_age_seconds", "Age of the oldest currency rate in the snapshot", (),
+    lambda: [((), (datetime.now(timezone.utc) - rate_cache.snapshot.last_updated).total_seconds()
+              if rate_cache.snapshot and rate_cache.snapshot.last_updated else None)],
+)
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import random
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import func, insert, select
+from typing import Dict, Optional, Sequence
+
+import httpx
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.currency import CurrencyRate, CurrencyRateHistory
+from app.services.coordination import notify, try_advisory_xact_lock
+from app.services.periodic import PeriodicTask
+from app.services.rate_cache import rate_cache
+
+logger = logging.getLogger(__name__)
+
+FROM_SYMBOL = "BTC"
+TO_SYMBOLS = (
+    "BCH", "DOGE", "LTC", "USDT", "FEY", "DGB", "DASH", "TRX", "ZEC", "ETH", "BNB",
+    "SOL", "XRP", "MATIC", "ADA", "TON", "XLM", "XMR", "USDC", "TARA", "TRUMP", "PEPE",
+)
+
+
+class RateProviderError(Exception):
+    """Ошибка источника курсов; retryable - имеет ли смысл повторить запрос"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class RateProvider(ABC):
+    """Источник курсов: сколько единиц каждой валюты стоит одна единица базовой"""
+
+    name: str
+
+    @abstractmethod
+    async def fetch(self, base: str, symbols: Sequence[str]) -> Dict[str, Decimal]:
+        ...
+
+    async def aclose(self):
+        pass
+
+
+class CryptoCompareProvider(RateProvider):
+    """
+    Курсы CryptoCompare (pricemulti).
+
+    Один httpx.AsyncClient на процесс: соединения с API переиспользуются.
+    base_url настраивается, поэтому вместо CryptoCompare можно поднять локальную заглушку.
+    """
+
+    name = "cryptocompare"
+
+    def __init__(self, base_url: str, api_key: str, timeout: float):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def fetch(self, base: str, symbols: Sequence[str]) -> Dict[str, Decimal]:
+        params = {"fsyms": base, "tsyms": ",".join(symbols), "api_key": self.api_key}
+        try:
+            response = await self.client.get(self.base_url, params=params)
+        except httpx.TransportError as e:
+            raise RateProviderError(f"{type(e).__name__}: {e}", retryable=True)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RateProviderError(f"HTTP {response.status_code}", retryable=True)
+        if response.status_code != 200:
+            raise RateProviderError(f"HTTP {response.status_code}")
+
+        # Decimal сразу из JSON: цена хранится как Numeric(20, 8)
+        data = json.loads(response.text, parse_float=Decimal)
+        if base not in data:
+            # Ошибки CryptoCompare приходят с HTTP 200: {"Response": "Error", "Message": ...}
+            raise RateProviderError(f"Неверный ответ от API: {data.get('Message', data)}")
+        return {symbol: Decimal(price) for symbol, price in data[base].items()}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def fetch_with_retry(provider: RateProvider, base: str, symbols: Sequence[str],
+                           retries: int, backoff: float) -> Dict[str, Decimal]:
+    """Запрос курсов с повторами: пауза backoff * 2^попытка с разбросом +-50%"""
+    for attempt in range(retries + 1):
+        try:
+            return await provider.fetch(base, symbols)
+        except RateProviderError as e:
+            if not e.retryable or attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"{provider.name}: {e}, повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+
+async def store_rates(db, rates: Dict[str, Decimal]) -> int:
+    """
+    Сохраняет загруженные курсы; коммит за вызывающим.
+
+    Текущие курсы обновляются одним INSERT ... ON CONFLICT (symbol) DO UPDATE,
+    в историю дописывается точка на каждый символ с общим временем загрузки.
+    После коммита остальные процессы перечитывают снимок курсов.
+    """
+    fetched_at = datetime.now(timezone.utc)
+    values = [
+        {"symbol": symbol, "price": price, "last_updated": fetched_at}
+        for symbol, price in rates.items() if price and price > 0
+    ]
+    if not values:
+        return 0
+    stmt = pg_insert(CurrencyRate).values(values)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[CurrencyRate.symbol],
+        set_={"price": stmt.excluded.price, "last_updated": stmt.excluded.last_updated},
+    ))
+    await db.execute(insert(CurrencyRateHistory).values(
+        [{"symbol": value["symbol"], "price": value["price"], "fetched_at": fetched_at} for value in values]
+    ))
+    await notify(db, "rates")
+    return len(values)
+
+
+async def refresh_rates(provider: Optional[RateProvider] = None) -> int:
+    """Загрузка курсов у провайдера, сохранение в БД и обновление снимка в памяти"""
+    provider = provider or rate_provider
+    rates = await fetch_with_retry(
+        provider, FROM_SYMBOL, TO_SYMBOLS, settings.CURRENCY_FETCH_RETRIES, settings.CURRENCY_FETCH_BACKOFF_SECONDS
+    )
+    async with AsyncSessionLocal() as session:
+        count = await store_rates(session, rates)
+        await session.commit()
+    await rate_cache.reload()
+    logger.info(f"Успешно обновлено/вставлено {count} курсов в БД ({provider.name})")
+    return count
+
+
+def _is_fresh(fetched_at: Optional[datetime]) -> bool:
+    threshold = timedelta(minutes=settings.CURRENCY_UPDATE_THRESHOLD_MINUTES)
+    return fetched_at is not None and datetime.now(timezone.utc) - fetched_at < threshold
+
+
+async def refresh_rates_if_stale():
+    """
+    Плановое обновление: курсы загружаются, только если старше CURRENCY_UPDATE_THRESHOLD_MINUTES.
+
+    Свежесть считается по последней успешной загрузке (самое новое last_updated):
+    символ, который провайдер перестал отдавать, не делает курсы устаревшими навсегда.
+    Запрос к провайдеру (с повторами и паузами) идет без соединения с БД;
+    блокировка берется только на запись. При нескольких воркерах записывает
+    первый, остальные видят свежие курсы и перечитают снимок по уведомлению.
+    """
+    snapshot = await rate_cache.get()
+    if _is_fresh(snapshot.last_modified):
+        return
+    rates = await fetch_with_retry(
+        rate_provider, FROM_SYMBOL, TO_SYMBOLS, settings.CURRENCY_FETCH_RETRIES, settings.CURRENCY_FETCH_BACKOFF_SECONDS
+    )
+    async with AsyncSessionLocal() as session:
+        if not await try_advisory_xact_lock(session, "currency-rate-fetch"):
+            return
+        # Курсы мог записать другой воркер, пока мы ждали провайдера
+        if _is_fresh(await session.scalar(select(func.max(CurrencyRate.last_updated)))):
+            return
+        count = await store_rates(session, rates)
+        await session.commit()
+    await rate_cache.reload()
+    logger.info(f"Успешно обновлено/вставлено {count} курсов в БД ({rate_provider.name})")
+
+
+rate_provider: RateProvider = CryptoCompareProvider(
+    settings.CRYPTOCOMPARE_URL, settings.CRYPTOCOMPARE_API_KEY, settings.CURRENCY_FETCH_TIMEOUT_SECONDS
+)
+
+# Проверка свежести дешевая (снимок в памяти), поэтому проверяем не реже раза в час,
+# чтобы после перезапуска не ждать полный срок CURRENCY_UPDATE_THRESHOLD_MINUTES
+rate_fetcher = PeriodicTask(
+    "currency-rate-fetch", min(settings.CURRENCY_UPDATE_THRESHOLD_MINUTES, 60) * 60, refresh_rates_if_stale, jitter=0.1
+)
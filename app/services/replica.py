@@ -0,0 +1,63 @@
+import logging
+import time
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine, replica_engine, replica_health
+from app.services.metrics import registry
+from app.services.periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+async def check_replica_lag():
+    """
+    Измеряет отставание реплики и обновляет replica_health.
+
+    Если реплика воспроизвела WAL до текущей позиции основной БД, отставание 0
+    (даже когда записей давно не было), иначе - время с последней воспроизведенной
+    транзакции. Сервер не в режиме восстановления (отдельная БД вместо реплики,
+    например в тестах) считается не отстающим.
+    """
+    try:
+        async with engine.connect() as conn:
+            primary_lsn = (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+        async with replica_engine.connect() as conn:
+            in_recovery, caught_up, replay_age = (await conn.execute(
+                text("""
+                    SELECT pg_is_in_recovery(),
+                           pg_last_wal_replay_lsn() >= CAST(CAST(:lsn AS text) AS pg_lsn),
+                           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                """),
+                {"lsn": primary_lsn},
+            )).one()
+    except Exception as e:
+        if replica_health.error is None:
+            logger.warning(f"Реплика недоступна, чтение переключено на основную БД: {e}")
+        replica_health.error = str(e)
+        replica_health.checked_at = time.monotonic()
+        return
+
+    if not in_recovery or caught_up:
+        lag = 0.0
+    else:
+        lag = float(replay_age) if replay_age is not None else float("inf")
+
+    was_usable = replica_health.usable
+    replica_health.lag = lag
+    replica_health.error = None
+    replica_health.checked_at = time.monotonic()
+    if was_usable != replica_health.usable:
+        logger.warning(f"Чтение с реплики {'включено' if replica_health.usable else 'выключено'}, отставание {lag:.1f} с")
+
+
+replica_monitor = PeriodicTask("replica-lag", settings.REPLICA_LAG_CHECK_SECONDS, check_replica_lag)
+
+registry.callback(
+    "db_replica_lag_seconds", "Replication lag of the read replica", (),
+    lambda: [((), replica_health.lag if replica_health.error is None else None)],
+)
+registry.callback(
+    "db_replica_in_use", "1 if reads are routed to the replica", (),
+    lambda: [((), 1 if replica_health.usable else 0)] if replica_engine is not None else [],
+)
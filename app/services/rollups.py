@@ -0,0 +1,256 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Dict, Any, Optional
+import logging
+import re
+
+from app.models.rollups import (
+    EarningsRollupHourly, EarningsRollupDaily, EarningsRollupAsnHourly, EarningsRollupAsnDaily, RollupVersion
+)
+from app.services.coordination import notify
+
+logger = logging.getLogger(__name__)
+
+
+def _utc(ts: datetime) -> datetime:
+    # asyncpg пишет naive datetime в timestamptz как UTC - считаем так же
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+# Агрегаты по ASN ведутся только для записей с asn (генерируемая колонка proxy_earnings)
+_ASN_PATTERN = re.compile(r"[0-9]{1,18}")
+
+# Таблицы агрегатов: модель, колонка периода, измерения
+_ROLLUPS = (
+    (EarningsRollupHourly, "bucket", ("bot_name", "proxy_key", "reward_currency")),
+    (EarningsRollupDaily, "day", ("bot_name", "proxy_key", "reward_currency")),
+    (EarningsRollupAsnHourly, "bucket", ("asn", "reward_currency")),
+    (EarningsRollupAsnDaily, "day", ("asn", "reward_currency")),
+)
+
+
+def _upsert(model):
+    table = model.__table__
+    stmt = pg_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=table.primary_key.columns,
+        set_={
+            "event_count": table.c.event_count + stmt.excluded.event_count,
+            "success_count": table.c.success_count + stmt.excluded.success_count,
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+            "updated_at": func.now(),
+        },
+    )
+
+
+# Строки передаются параметрами (executemany): SQL компилируется один раз
+_UPSERTS = [_upsert(model) for model, _, _ in _ROLLUPS]
+
+
+# Новая строка журнала версий; номер - из последовательности, без блокировок
+_version_table = RollupVersion.__table__
+_BUMP_VERSION = insert(_version_table).values(updated_at=func.clock_timestamp()).returning(_version_table.c.version)
+
+# Сколько последних версий хранится в журнале; чистит каждая VERSION_HISTORY-я запись
+VERSION_HISTORY = 1000
+
+# Ключ session.info: транзакция изменила агрегаты, после коммита нужна новая версия
+_ROLLUPS_CHANGED = "rollups_changed"
+
+
+async def bump_rollup_version(db: AsyncSession):
+    """
+    Добавляет новую версию агрегатов отдельной короткой транзакцией.
+
+    Вызывается после коммита изменений (commit_rollups). Номер берется из
+    последовательности: транзакции записи не ждут друг друга, а номер выдается уже
+    после коммита данных, поэтому читатель, увидевший версию n, видит изменения
+    всех версий до n включительно.
+    """
+    version = (await db.execute(_BUMP_VERSION)).scalar()
+    if version % VERSION_HISTORY == 0:
+        await db.execute(delete(RollupVersion).where(RollupVersion.version <= version - VERSION_HISTORY))
+    await db.commit()
+
+
+async def commit_rollups(db: AsyncSession):
+    """
+    Коммит транзакции, которая могла изменить агрегаты; если изменила - затем новая версия.
+
+    Ошибка увеличения версии только логируется: изменения уже закоммичены, кэши
+    статистики увидят их со следующей версией или по истечении TTL.
+    """
+    changed = db.info.pop(_ROLLUPS_CHANGED, False)
+    await db.commit()
+    if not changed:
+        return
+    try:
+        await bump_rollup_version(db)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Ошибка обновления версии агрегатов: {e}")
+
+
+def _asn(extra_data: Any) -> Optional[int]:
+    """asn из extra_data по тому же правилу, что у колонки proxy_earnings.asn"""
+    value = extra_data.get("asn") if isinstance(extra_data, dict) else None
+    if isinstance(value, bool) or value is None:
+        return None
+    value = str(value)
+    return int(value) if _ASN_PATTERN.fullmatch(value) else None
+
+
+async def apply_to_rollups(db: AsyncSession, rows: List[Dict[str, Any]]):
+    """
+    Инкрементально добавляет только что вставленные строки proxy_earnings в агрегаты.
+
+    Вызывается в той же транзакции, что и вставка, последним шагом перед коммитом:
+    строки агрегируются в Python, затем по одному INSERT ... ON CONFLICT DO UPDATE
+    на таблицу. Ключи сортируются, чтобы конкурентные транзакции блокировали строки
+    агрегатов в одном порядке. Коммитить через commit_rollups - он увеличит версию.
+    """
+    if not rows:
+        return
+    accs = [defaultdict(lambda: [0, 0, Decimal(0)]) for _ in _ROLLUPS]
+    for row in rows:
+        ts = _utc(row["event_timestamp"])
+        periods = {"bucket": ts.replace(minute=0, second=0, microsecond=0), "day": ts.date()}
+        values = {**row, "asn": _asn(row.get("extra_data"))}
+        success = 1 if row.get("success", True) else 0
+        amount = Decimal(row["reward_amount"])
+        for (model, period, dims), acc in zip(_ROLLUPS, accs):
+            if values.get("asn") is None and "asn" in dims:
+                continue
+            totals = acc[(periods[period],) + tuple(values[dim] for dim in dims)]
+            totals[0] += 1
+            totals[1] += success
+            totals[2] += amount
+
+    for (model, period, dims), acc, stmt in zip(_ROLLUPS, accs, _UPSERTS):
+        if not acc:
+            continue
+        values = [
+            {period: key[0], **dict(zip(dims, key[1:])),
+             "event_count": count, "success_count": success_count, "total_amount": amount}
+            for key, (count, success_count, amount) in sorted(acc.items())
+        ]
+        await db.execute(stmt, values)
+    db.info[_ROLLUPS_CHANGED] = True
+
+
+_PERIOD_EXPRESSIONS = {
+    "bucket": "date_trunc('hour', event_timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'",
+    "day": "(event_timestamp AT TIME ZONE 'UTC')::date",
+}
+
+
+def _rollup_select(period: str, dims: tuple, source: str, *conditions: str) -> str:
+    if "asn" in dims:
+        conditions += ("asn IS NOT NULL",)
+    where = f"\n        WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        SELECT {_PERIOD_EXPRESSIONS[period]},
+               {", ".join(dims)},
+               count(*), count(*) FILTER (WHERE success), sum(reward_amount), now()
+        FROM {source}{where}
+        GROUP BY {", ".join(str(i) for i in range(1, len(dims) + 2))}"""
+
+
+def _rollup_columns(period: str, dims: tuple) -> str:
+    return f"({period}, {', '.join(dims)}, event_count, success_count, total_amount, updated_at)"
+
+
+# Полный пересчет агрегатов из proxy_earnings за интервал [since, until)
+_REBUILD_SQL = tuple(
+    f"INSERT INTO {model.__tablename__} {_rollup_columns(period, dims)}"
+    + _rollup_select(period, dims, "proxy_earnings", "event_timestamp >= :since AND event_timestamp < :until")
+    for model, period, dims in _ROLLUPS
+)
+
+
+# Добавление строк из временной таблицы (массовый импорт) в агрегаты; порядок
+# ключей фиксирован, как в apply_to_rollups
+_MERGE_SQL = tuple(
+    f"INSERT INTO {model.__tablename__} AS r {_rollup_columns(period, dims)}"
+    + _rollup_select(period, dims, "{source}")
+    + f"""
+        ORDER BY {", ".join(str(i) for i in range(1, len(dims) + 2))}
+        ON CONFLICT ({period}, {", ".join(dims)}) DO UPDATE SET
+            event_count = r.event_count + excluded.event_count,
+            success_count = r.success_count + excluded.success_count,
+            total_amount = r.total_amount + excluded.total_amount,
+            updated_at = now()
+    """
+    for model, period, dims in _ROLLUPS
+)
+
+
+async def merge_into_rollups(db: AsyncSession, source: str):
+    """
+    Добавляет в агрегаты строки таблицы source (те же колонки, что у proxy_earnings).
+
+    Вариант apply_to_rollups для массовой загрузки: агрегирует Postgres, строки
+    в процесс не читаются. Коммит остается за вызывающим кодом (commit_rollups).
+    """
+    for sql in _MERGE_SQL:
+        await db.execute(text(sql.format(source=source)))
+    db.info[_ROLLUPS_CHANGED] = True
+
+
+async def rebuild_rollups(db: AsyncSession, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Пересчитывает агрегаты из proxy_earnings (восстановление и массовая загрузка мимо API).
+
+    Границы округляются до суток UTC, чтобы не получить частично пересчитанные корзины.
+    Таблицы агрегатов блокируются на время пересчета: параллельная запись дождется
+    коммита и добавит свои строки поверх. Коммит остается за вызывающим кодом (commit_rollups).
+    """
+    since = _utc(since or datetime(1970, 1, 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    until = _utc(until or datetime(9999, 1, 1))
+    if until.time() != datetime.min.time():
+        until = until.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    tables = [model.__tablename__ for model, _, _ in _ROLLUPS]
+    await db.execute(text(f"LOCK TABLE {', '.join(tables)} IN EXCLUSIVE MODE"))
+    for model, period, _ in _ROLLUPS:
+        if period == "bucket":
+            await db.execute(
+                text(f"DELETE FROM {model.__tablename__} WHERE bucket >= :since AND bucket < :until"),
+                {"since": since, "until": until},
+            )
+        else:
+            await db.execute(
+                text(f"DELETE FROM {model.__tablename__} WHERE day >= :since_day AND day < :until_day"),
+                {"since_day": since.date(), "until_day": until.date()},
+            )
+    for sql in _REBUILD_SQL:
+        await db.execute(text(sql), {"since": since, "until": until})
+    db.info[_ROLLUPS_CHANGED] = True
+    await notify(db, "stats")
+    logger.info(f"Агрегаты заработка пересчитаны за период {since.isoformat()} - {until.isoformat()}")
+
+
+async def _rebuild_cli(since: Optional[datetime], until: Optional[datetime]):
+    from app.database import AsyncSessionLocal, engine
+
+    async with AsyncSessionLocal() as session:
+        await rebuild_rollups(session, since, until)
+        await commit_rollups(session)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    # python -m app.services.rollups --since 2025-08-01 --until 2025-09-01
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Пересчет агрегатов статистики из proxy_earnings")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="Начало периода (ISO 8601)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Конец периода (ISO 8601)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_rebuild_cli(args.since, args.until))
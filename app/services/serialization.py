@@ -0,0 +1,49 @@
+"""
+Сериализация JSON-ответов.
+
+С orjson (если установлен) ответ собирается в байты на C; без него - через
+стандартный json с тем же форматом. Формат совпадает с Pydantic: Decimal -
+строкой без потери точности ("0.00011793", "1E-8"), datetime в UTC - с "Z".
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import JSONResponse
+
+# orjson - опциональная зависимость
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        # datetime orjson пишет сам; в default попадает только Decimal
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dumps_rows(keys: Sequence[str], rows: Iterable[Sequence[Any]]) -> bytes:
+    """Строки результата запроса - в массив JSON-объектов, минуя модели Pydantic"""
+    return dumps([dict(zip(keys, row)) for row in rows])
+
+
+class FastJSONResponse(JSONResponse):
+    """Ответ по умолчанию: то же содержимое, что у JSONResponse, но через dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
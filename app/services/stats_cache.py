@@ -0,0 +1,94 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+from app.services.coordination import invalidation_listener
+from app.services.metrics import track_cache
+
+
+class TTLCache:
+    """
+    Результаты запросов статистики в памяти процесса.
+
+    Значение живет ttl секунд с момента записи; при переполнении вытесняются
+    давно не читавшиеся записи (LRU). ttl = 0 отключает хранение, но не
+    объединение одновременных загрузок в get_or_load.
+
+    Эндпоинты включают в ключ версию агрегатов (http_cache.rollup_version,
+    растет с каждым коммитом в агрегаты): после коммита новых записей ключ
+    меняется во всех процессах, даже пропустивших NOTIFY, и старые
+    значения просто вытесняются. clear() - для импорта и пересчета агрегатов.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Task] = {}
+        # Растет при clear(): загрузка, начатая до сброса, не попадает в кэш
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        # Запросы, дождавшиеся чужой загрузки того же ключа
+        self.coalesced = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.ttl <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    async def get_or_load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Значение из кэша или результат load().
+
+        Одновременные запросы с одним ключом ждут одну загрузку (single-flight).
+        load выполняется отдельной задачей со своей сессией БД: отмена запроса,
+        который ее начал, не прерывает загрузку для остальных. Исключение load
+        получают все ожидающие, в кэш оно не попадает.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        task = self._loading.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._load(key, load, self._generation))
+            self._loading[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        try:
+            value = await load()
+        finally:
+            self._loading.pop(key, None)
+        if generation == self._generation:
+            self.put(key, value)
+        return value
+
+
+stats_cache = TTLCache(settings.STATS_CACHE_TTL_SECONDS, settings.STATS_CACHE_MAX_ENTRIES)
+track_cache("stats", stats_cache)
+# Агрегаты пересчитаны или дополнены импортом в другом процессе
+invalidation_listener.subscribe("stats", stats_cache.clear)
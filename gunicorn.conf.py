@@ -0,0 +1,37 @@
+"""
+Production-запуск: gunicorn управляет N процессами с воркерами uvicorn.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+uvicorn[standard] ставит uvloop и httptools, воркер выбирает их сам (loop/http
+= auto). Каждый процесс держит свой пул соединений с БД: всего до
+WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) соединений. Кэши в памяти
+процессов согласуются через LISTEN/NOTIFY (app.services.coordination).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8008")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Keep-alive дольше простоя балансировщика (обычно 60 с), иначе он получает
+# закрытое соединение на повторном запросе
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "75"))
+# Воркер без ответа мастеру дольше timeout перезапускается
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", "60"))
+# Время на остановку: lifespan дописывает очередь ingest-буфера
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+backlog = int(os.getenv("BACKLOG", "2048"))
+
+# Плановый перезапуск воркеров (0 - выключен); jitter, чтобы не все сразу
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+# Адреса прокси, которым доверяем X-Forwarded-For / X-Forwarded-Proto
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+loglevel = os.getenv("LOG_LEVEL", "info")
+# Access log на каждый запрос заметно стоит на ingest - по умолчанию выключен
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() in ("1", "true", "yes") else None
+errorlog = "-"
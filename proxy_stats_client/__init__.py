@@ -0,0 +1,22 @@
+"""
+Асинхронный клиент Proxy Stats API для ботов.
+
+ProxyStatsClient - запросы к /earnings и /currency по постоянным соединениям
+с повторами; EarningsBatcher - локальный буфер, который отправляет события
+пакетами и при недоступности API складывает их на диск.
+
+    from proxy_stats_client import ProxyStatsClient, EarningsBatcher, Earning
+
+    async with ProxyStatsClient("http://localhost:8008") as client:
+        async with EarningsBatcher(client, spool_dir="spool") as batcher:
+            batcher.add(Earning("1.2.3.4:8080", "bot-1", "0.00012", event_id="42"))
+"""
+from proxy_stats_client.earning import Earning, make_unique_key
+from proxy_stats_client.client import ProxyStatsClient, RetryPolicy, ApiError
+from proxy_stats_client.spool import Spool
+from proxy_stats_client.batcher import EarningsBatcher, BufferFull
+
+__all__ = [
+    "Earning", "make_unique_key", "ProxyStatsClient", "RetryPolicy", "ApiError", "Spool", "EarningsBatcher",
+    "BufferFull",
+]
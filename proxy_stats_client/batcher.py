@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional, Union
+
+import httpx
+
+from proxy_stats_client.client import ApiError, ProxyStatsClient
+from proxy_stats_client.earning import Earning, payload
+from proxy_stats_client.spool import Spool
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """Буфер переполнен, а дискового буфера нет"""
+
+
+class EarningsBatcher:
+    """
+    Локальный буфер событий: add() не ждет сети, фоновая задача отправляет
+    накопленное пакетами POST /earnings/batch - по max_batch событий или раз в
+    flush_interval секунд. Вместо запроса на каждое событие - один запрос на
+    пакет по постоянному соединению клиента.
+
+    Если пакет не ушел и после повторов клиента, он пишется в spool_dir (Spool)
+    и досылается, когда API снова отвечает; пока API недоступен, новые пакеты
+    сразу идут на диск. Без spool_dir недоставленные события остаются в памяти
+    до max_buffer, дальше add() бросает BufferFull.
+
+        async with ProxyStatsClient(url) as client, EarningsBatcher(client, spool_dir="spool") as batcher:
+            batcher.add(Earning("1.2.3.4:8080", "bot-1", "0.00012"))
+    """
+
+    def __init__(self, client: ProxyStatsClient, *, max_batch: int = 500, flush_interval: float = 1.0,
+                 max_buffer: int = 50_000, spool_dir: Optional[Union[str, Path]] = None,
+                 spool_retry_interval: float = 30.0):
+        self.client = client
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spool = Spool(spool_dir) if spool_dir is not None else None
+        self.spool_retry_interval = spool_retry_interval
+        self._buffer: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._closing = False
+        # До этого момента (time.monotonic) API считается недоступным
+        self._down_until = 0.0
+        self.sent = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.rejected = 0
+        self.spooled = 0
+
+    async def __aenter__(self) -> "EarningsBatcher":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        """События в памяти, еще не отправленные"""
+        return len(self._buffer)
+
+    def add(self, earning: Union[Earning, dict]):
+        """Поставить событие в очередь отправки (без ожидания)"""
+        self._buffer.append(payload(earning))
+        if len(self._buffer) >= self.max_batch:
+            self._wakeup.set()
+        if len(self._buffer) > self.max_buffer:
+            if self.spool is None:
+                self._buffer.pop()
+                raise BufferFull(f"{self.max_buffer} events are waiting to be sent")
+            # Память ограничена: самый старый пакет уходит на диск
+            self._spill(self._take())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="earnings-batcher")
+
+    async def close(self):
+        """
+        Остановить фоновую отправку и отправить (или записать на диск) остаток.
+
+        Без дискового буфера и без связи с API бросает ConnectionError: события
+        остаются в памяти (pending).
+        """
+        if self._task is not None:
+            # Задача дописывает текущий пакет и выходит: отмена посреди запроса
+            # потеряла бы уже взятый из буфера пакет
+            task, self._task = self._task, None
+            self._closing = True
+            self._wakeup.set()
+            await task
+        # Последняя попытка - независимо от недавней недоступности API
+        self._down_until = 0.0
+        await self.flush()
+
+    async def flush(self):
+        """Отправить все, что накоплено в памяти"""
+        async with self._lock:
+            while self._buffer:
+                batch = self._take()
+                if not await self._deliver(batch):
+                    if self.spool is None:
+                        # Вернуть в начало очереди: отправим в следующий раз
+                        self._buffer[:0] = batch
+                        raise ConnectionError(f"API is unavailable, {len(self._buffer)} events kept in memory")
+                    self._spill(batch)
+
+    def _take(self) -> List[dict]:
+        batch, self._buffer = self._buffer[:self.max_batch], self._buffer[self.max_batch:]
+        return batch
+
+    def _spill(self, batch: List[dict]):
+        self.spool.put(batch)
+        self.spooled += len(batch)
+
+    async def _deliver(self, batch: List[dict]) -> bool:
+        """Отправка пакета; False - API недоступен (пакет не принят)"""
+        if self._down_until > time.monotonic():
+            return False
+        try:
+            result = await self.client.create_earnings(batch)
+        except (httpx.TransportError, ApiError) as e:
+            if isinstance(e, ApiError) and e.status_code < 500 and e.status_code != 429:
+                # Пакет отвергнут целиком (413, 400): повтор не поможет
+                logger.error(f"Пакет из {len(batch)} событий отклонен: {e}")
+                self.rejected += len(batch)
+                return True
+            logger.warning(f"API недоступен ({e}), пакеты копятся до повтора через {self.spool_retry_interval:.0f} с")
+            self._down_until = time.monotonic() + self.spool_retry_interval
+            return False
+        self._down_until = 0.0
+        self.sent += result["accepted"]
+        self.duplicates += result["duplicates"]
+        self.invalid += result["invalid"]
+        for item in result["results"]:
+            if item["status"] == "invalid":
+                logger.warning(f"Событие #{item['index']} пакета ({item.get('unique_key')}) отклонено: {item.get('error')}")
+        return True
+
+    async def _drain_spool(self):
+        """Дослать пакеты с диска (от старых к новым), пока API отвечает"""
+        for path in self.spool.pending():
+            try:
+                batch = self.spool.read(path)
+            except FileNotFoundError:
+                # Пакет уже отправил другой процесс
+                continue
+            except ValueError as e:
+                # Битый файл (JSON, кодировка) не должен останавливать очередь за ним
+                try:
+                    bad = self.spool.quarantine(path)
+                except FileNotFoundError:
+                    continue
+                logger.error(f"Пакет {path.name} не читается, отложен в {bad.name}: {e}")
+                continue
+            if not await self._deliver(batch):
+                return
+            self.spool.remove(path)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                return
+            available = self._down_until <= time.monotonic()
+            try:
+                # Без дискового буфера события ждут в памяти, пока API недоступен
+                if self._buffer and (available or self.spool is not None):
+                    await self.flush()
+                if self.spool is not None and available:
+                    async with self._lock:
+                        await self._drain_spool()
+            except Exception as e:
+                logger.warning(f"Ошибка отправки событий: {e}")
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+
+from proxy_stats_client.earning import Earning, dumps, payload
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class ApiError(Exception):
+    """Ответ API с ошибкой, которую повтор не исправит (или повторы исчерпаны)"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"HTTP {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Экспоненциальная задержка с джиттером: base * 2^n, не больше max_delay"""
+    attempts: int = 5
+    base_delay: float = 0.2
+    max_delay: float = 10.0
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.base_delay * 2 ** attempt, self.max_delay))
+
+
+class ProxyStatsClient:
+    """
+    Асинхронный клиент Proxy Stats API.
+
+    Держит пул постоянных HTTP-соединений (keep-alive) и повторяет запросы при
+    сетевых ошибках и ответах 429/5xx с экспоненциальной задержкой. Повторы
+    безопасны: запись идентифицируется своим unique_key, повтор уже записанной
+    дает duplicate/replayed, а не вторую запись.
+
+    Для проверки без сети передается transport=httpx.ASGITransport(app=app)
+    (lifespan приложения запускается отдельно, как в scripts/benchmark.py).
+
+        async with ProxyStatsClient("http://localhost:8008") as client:
+            ack = await client.create_earning(Earning("1.2.3.4:8080", "bot-1", "0.00012"))
+    """
+
+    def __init__(self, base_url: str, *, timeout: float = 10.0, max_connections: int = 10,
+                 retry: RetryPolicy = RetryPolicy(), transport: Optional[httpx.AsyncBaseTransport] = None,
+                 headers: Optional[Dict[str, str]] = None):
+        self.retry = retry
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60),
+            transport=transport,
+            headers=headers,
+        )
+        # Последний ответ условных GET: путь -> (ETag, тело)
+        self._validated: Dict[str, Tuple[str, Any]] = {}
+
+    async def __aenter__(self) -> "ProxyStatsClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Запрос с повторами; ApiError для ответов 4xx и для 5xx после всех попыток"""
+        for attempt in range(self.retry.attempts):
+            last = attempt == self.retry.attempts - 1
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TransportError as e:
+                if last:
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning(f"{method} {path}: {e!r}, повтор через {delay:.2f} с")
+            else:
+                if response.status_code < 400 or response.status_code == 304:
+                    return response
+                if response.status_code not in RETRY_STATUSES or last:
+                    raise ApiError(response.status_code, _detail(response))
+                delay = self.retry.delay(attempt, response.headers.get("retry-after"))
+                logger.warning(f"{method} {path}: HTTP {response.status_code}, повтор через {delay:.2f} с")
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def _get_json(self, path: str, params: Optional[dict] = None) -> Any:
+        response = await self.request("GET", path, params=params)
+        return response.json()
+
+    async def _get_validated(self, path: str) -> Any:
+        """GET с If-None-Match: на 304 возвращается тело прошлого ответа"""
+        cached = self._validated.get(path)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        response = await self.request("GET", path, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        body = response.json()
+        if "etag" in response.headers:
+            self._validated[path] = (response.headers["etag"], body)
+        return body
+
+    # --- Запись ---
+
+    async def create_earning(self, earning: Union[Earning, dict]) -> dict:
+        """Одна запись через POST /earnings/ingest: {status: created|replayed|queued, unique_key, ...}"""
+        response = await self.request("POST", "/earnings/ingest", content=dumps(payload(earning)),
+                                      headers={"Content-Type": "application/json"})
+        return response.json()
+
+    async def create_earnings(self, earnings: Sequence[Union[Earning, dict]]) -> dict:
+        """
+        Пакет записей одним запросом POST /earnings/batch (до EARNINGS_BATCH_MAX_ITEMS на сервере).
+
+        Ответ - счетчики accepted/duplicates/invalid и статус каждой записи.
+        """
+        body = b"\n".join(dumps(payload(earning)) for earning in earnings)
+        response = await self.request("POST", "/earnings/batch", content=body,
+                                      headers={"Content-Type": "application/x-ndjson"})
+        return response.json()
+
+    # --- Чтение ---
+
+    async def get_earning(self, earning_id: int) -> dict:
+        return await self._get_json(f"/earnings/{earning_id}")
+
+    async def get_earnings(self, *, bot_name: Optional[str] = None, proxy_key: Optional[str] = None,
+                           limit: int = 100, cursor: Optional[str] = None,
+                           **filters) -> Tuple[List[dict], Optional[str]]:
+        """
+        Страница записей (от новых к старым) и курсор следующей страницы (None - последняя).
+
+        filters - since, until (datetime), asn, session_id, asn_org, как у GET /earnings/.
+        """
+        if bot_name is not None:
+            path = f"/earnings/bot/{bot_name}"
+        elif proxy_key is not None:
+            path = f"/earnings/proxy/{proxy_key}"
+        else:
+            path = "/earnings/"
+        params = {"limit": limit}
+        for name, value in filters.items():
+            if value is not None:
+                params[name] = value.isoformat() if isinstance(value, datetime) else value
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = await self.request("GET", path, params=params)
+        return response.json(), response.headers.get("x-next-cursor")
+
+    async def iter_earnings(self, **kwargs) -> AsyncIterator[dict]:
+        """Все записи по страницам, с теми же параметрами, что get_earnings"""
+        cursor = kwargs.pop("cursor", None)
+        while True:
+            page, cursor = await self.get_earnings(cursor=cursor, **kwargs)
+            for earning in page:
+                yield earning
+            if cursor is None:
+                return
+
+    async def get_rates(self) -> dict:
+        """Курсы валют {rates: {symbol: price}, last_updated}; повтор без изменений - 304"""
+        return await self._get_validated("/currency/rates")
+
+    async def get_rate(self, symbol: str) -> dict:
+        return await self._get_validated(f"/currency/{symbol.upper()}")
+
+
+def _detail(response: httpx.Response) -> Any:
+    try:
+        return response.json().get("detail", response.text)
+    except (ValueError, AttributeError):
+        return response.text
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Optional, Union
+
+
+def make_unique_key(*parts) -> str:
+    """SHA-256 от частей ключа - так же, как на сервере (app.services.idempotency)"""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+
+@dataclass
+class Earning:
+    """
+    Событие заработка для POST /earnings/ingest и /earnings/batch.
+
+    unique_key фиксируется при создании: повторная отправка того же объекта
+    (после таймаута, из дискового буфера) не создает дубликат. С event_id ключ
+    совпадает с тем, что /bot/submit строит из bot_name и event_id.
+    Значения по умолчанию - как у /bot/submit.
+    """
+    proxy_address: str  # IP:PORT
+    bot_name: str
+    reward_amount: Union[Decimal, str]
+    reward_currency: str = "BTC"
+    faucet_name: str = "manual_submit"
+    faucet_url: Optional[str] = None
+    server_id: str = "default"
+    bot_id: Optional[str] = None
+    success: bool = True
+    error_message: Optional[str] = None
+    event_timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    extra_data: Optional[Dict[str, Any]] = None
+    event_id: Optional[str] = None
+    unique_key: Optional[str] = None
+
+    def __post_init__(self):
+        if self.unique_key is None:
+            if self.event_id is not None:
+                self.unique_key = make_unique_key(self.bot_name, self.event_id)
+            else:
+                self.unique_key = uuid.uuid4().hex
+
+    def to_dict(self) -> dict:
+        """Тело записи (EarningCreate): сумма строкой, без потери точности"""
+        proxy_ip, _, proxy_port = self.proxy_address.rpartition(":")
+        return {
+            "proxy_ip": proxy_ip,
+            "proxy_port": int(proxy_port),
+            "proxy_key": self.proxy_address,
+            "server_id": self.server_id,
+            "bot_id": self.bot_id or self.bot_name,
+            "bot_name": self.bot_name,
+            "faucet_name": self.faucet_name,
+            "faucet_url": self.faucet_url,
+            "reward_amount": str(self.reward_amount),
+            "reward_currency": self.reward_currency,
+            "unique_key": self.unique_key,
+            "success": self.success,
+            "error_message": self.error_message,
+            "event_timestamp": self.event_timestamp.isoformat(),
+            "extra_data": self.extra_data,
+        }
+
+
+def _json_default(value):
+    # Decimal - строкой, без потери точности
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def payload(earning: Union[Earning, dict]) -> dict:
+    """Тело записи: Earning или уже готовый словарь полей EarningCreate"""
+    return earning.to_dict() if isinstance(earning, Earning) else earning
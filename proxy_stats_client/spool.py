@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from itertools import count
+from pathlib import Path
+from typing import List, Union
+
+from proxy_stats_client.earning import dumps
+
+SUFFIX = ".ndjson"
+# Файлы, которые не удалось прочитать: лежат рядом для разбора, в отправку не попадают
+BAD_SUFFIX = ".bad"
+
+_sequence = count()
+
+
+class Spool:
+    """
+    Очередь пакетов на диске, пока API недоступен: один файл NDJSON на пакет.
+
+    Файл пишется во временный и переименовывается - после сбоя процесса в
+    каталоге только целые пакеты. Имена упорядочены по времени записи, отправка
+    идет от старых к новым. Несколько процессов могут делить каталог: пакет,
+    отправленный дважды, сервер отвечает дубликатами по unique_key.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def put(self, batch: List[dict]):
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(_sequence)}"
+        temporary = self.directory / f"{name}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            for item in batch:
+                f.write(dumps(item).decode() + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.directory / f"{name}{SUFFIX}")
+
+    def pending(self) -> List[Path]:
+        """Файлы пакетов от старых к новым"""
+        return sorted(self.directory.glob(f"*{SUFFIX}"))
+
+    def read(self, path: Path) -> List[dict]:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def quarantine(self, path: Path) -> Path:
+        """Убрать нечитаемый пакет из очереди: переименовать в *.bad"""
+        bad = path.with_suffix(BAD_SUFFIX)
+        os.replace(path, bad)
+        return bad
+
+    def remove(self, path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            # Пакет уже отправил другой процесс
+            pass
+
+    def __len__(self) -> int:
+        return len(self.pending())
@@ -0,0 +1,291 @@
+"""
+Нагрузочный бенчмарк эндпоинтов записи и чтения.
+
+Гоняет сценарии (/bot/submit, POST /earnings/, списки, /stats/*) с заданной
+конкурентностью и печатает JSON с пропускной способностью и p50/p95/p99.
+Без --url приложение запускается в этом же процессе (httpx.ASGITransport) на
+базе из настроек - сеть и uvicorn в замер не входят; с --url нагружается
+уже запущенный сервер (docker-compose).
+
+В режиме без --url дополнительно считается процессорное время Python на
+запрос (cpu_ms_per_request: приложение, драйвер БД и httpx-клиент; работа
+Postgres не входит) - при одинаковой базе это сравнимая цена запроса, например
+earnings_create (POST /earnings/) против earnings_ingest (POST /earnings/ingest).
+
+Данные синтетические и воспроизводимые (--seed); уникальные ключи новых
+записей свои в каждом прогоне, чтобы ingest не превращался в поток дубликатов.
+Списки и статистика читают то, что засеяно через --seed-rows (POST /earnings/batch).
+Страница в 10 000 строк (earnings_by_bot_10k) набирается, если на бота засеяно
+не меньше: например --seed-rows 100000 --bots 10. Сериализацию таких страниц
+без базы сравнивает scripts.benchmark_json.
+
+    python -m scripts.benchmark --seed-rows 50000 --output bench/before.json
+    python -m scripts.benchmark --baseline bench/before.json --output bench/after.json
+
+С --baseline прогон сравнивается с сохраненным: падение пропускной способности
+или рост p95 больше --tolerance считается регрессией (код выхода 1).
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+# Запрос сценария: (метод, путь, параметры запроса, JSON-тело)
+RequestSpec = tuple
+
+
+class SyntheticData:
+    """Генератор записей заработка: боты, прокси и суммы из фиксированного зерна"""
+
+    def __init__(self, seed: int, bots: int, proxies: int, days: int):
+        self.rng = random.Random(seed)
+        self.bots = [f"bench-bot-{i}" for i in range(bots)]
+        self.proxies = [f"10.{i // 256}.{i % 256}.1:8080" for i in range(proxies)]
+        self.days = days
+
+    def bot(self) -> str:
+        return self.rng.choice(self.bots)
+
+    def proxy(self) -> str:
+        return self.rng.choice(self.proxies)
+
+    def amount(self) -> str:
+        return f"{self.rng.uniform(0.00000001, 0.001):.8f}"
+
+    def earning(self, event_timestamp: Optional[datetime] = None) -> dict:
+        proxy = self.proxy()
+        bot = self.bot()
+        if event_timestamp is None:
+            event_timestamp = datetime.now(timezone.utc)
+        return {
+            "proxy_ip": proxy.split(":")[0],
+            "proxy_port": 8080,
+            "proxy_key": proxy,
+            "server_id": f"srv-{self.rng.randrange(8)}",
+            "bot_id": bot,
+            "bot_name": bot,
+            "faucet_name": f"faucet-{self.rng.randrange(7)}",
+            "reward_amount": self.amount(),
+            "reward_currency": "BTC",
+            "unique_key": uuid.uuid4().hex,
+            "success": self.rng.random() > 0.1,
+            "event_timestamp": event_timestamp.isoformat(),
+        }
+
+    def past_earning(self, now: datetime) -> dict:
+        return self.earning(now - timedelta(seconds=self.rng.uniform(0, self.days * 86400)))
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[SyntheticData], RequestSpec]
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("bot_submit", lambda d: ("GET", "/bot/submit", {
+        "proxy_address": d.proxy(), "bot_name": d.bot(), "earnings": d.amount(), "event_id": uuid.uuid4().hex,
+    }, None)),
+    Scenario("earnings_create", lambda d: ("POST", "/earnings/", None, d.earning())),
+    Scenario("earnings_ingest", lambda d: ("POST", "/earnings/ingest", None, d.earning())),
+    Scenario("earnings_list", lambda d: ("GET", "/earnings/", {"limit": 100}, None)),
+    Scenario("earnings_by_bot", lambda d: ("GET", f"/earnings/bot/{d.bot()}", {"limit": 100}, None)),
+    Scenario("earnings_by_proxy", lambda d: ("GET", f"/earnings/proxy/{d.proxy()}", {"limit": 100}, None)),
+    Scenario("earnings_by_bot_10k", lambda d: ("GET", f"/earnings/bot/{d.bot()}", {"limit": 10000}, None)),
+    Scenario("stats_summary", lambda d: ("GET", "/stats/summary", None, None)),
+    Scenario("stats_daily", lambda d: ("GET", "/stats/daily", {"days": 30}, None)),
+    Scenario("stats_proxies", lambda d: ("GET", "/stats/proxies", {"window": "7d", "limit": 50}, None)),
+    Scenario("stats_asn", lambda d: ("GET", "/stats/asn", {"window": "30d", "sort": "success_rate"}, None)),
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу (values отсортирован)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, data: SyntheticData,
+                       requests: int, concurrency: int, warmup: int, measure_cpu: bool = False) -> dict:
+    # Запросы готовятся заранее, чтобы генерация данных не попала в замер
+    specs = [scenario.build(data) for _ in range(warmup + requests)]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    position = 0
+
+    async def worker(stop: int):
+        nonlocal position, errors
+        while position < stop:
+            index = position
+            position += 1
+            method, path, params, body = specs[index]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                status = str(response.status_code)
+                failed = response.status_code >= 400
+            except httpx.HTTPError as e:
+                status, failed = type(e).__name__, True
+            elapsed = time.perf_counter() - start
+            if index >= warmup:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                errors += failed
+
+    await asyncio.gather(*(worker(warmup) for _ in range(concurrency)))
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(worker(len(specs)) for _ in range(concurrency)))
+    duration, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 3)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else 0.0,
+        },
+    }
+    if measure_cpu and latencies:
+        result["cpu_ms_per_request"] = ms(cpu / len(latencies))
+    return result
+
+
+async def seed(client: httpx.AsyncClient, data: SyntheticData, rows: int, batch: int = 1000):
+    now = datetime.now(timezone.utc)
+    for start in range(0, rows, batch):
+        items = [data.past_earning(now) for _ in range(min(batch, rows - start))]
+        response = await client.post("/earnings/batch", json=items, timeout=120)
+        response.raise_for_status()
+    print(f"seeded {rows} rows", file=sys.stderr)
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Регрессии относительно baseline: пропускная способность и p95 по каждому сценарию"""
+    problems = []
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        if current["errors"] > before["errors"]:
+            problems.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} rps")
+        if current["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {before['latency_ms']['p95']} -> {current['latency_ms']['p95']} ms")
+        if "cpu_ms_per_request" in current and "cpu_ms_per_request" in before \
+                and current["cpu_ms_per_request"] > before["cpu_ms_per_request"] * (1 + tolerance):
+            problems.append(f"{name}: CPU {before['cpu_ms_per_request']} -> {current['cpu_ms_per_request']} ms/request")
+    return problems
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        app_context = None
+    else:
+        from app.main import app, lifespan
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark",
+                                   timeout=args.timeout)
+        app_context = lifespan(app)
+        await app_context.__aenter__()
+
+    data = SyntheticData(args.seed, args.bots, args.proxies, args.days)
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed": args.seed,
+        },
+        "scenarios": {},
+    }
+    try:
+        async with client:
+            if args.seed_rows:
+                await seed(client, data, args.seed_rows)
+            for scenario in selected:
+                result = await run_scenario(client, scenario, data, args.requests, args.concurrency, args.warmup,
+                                            measure_cpu=app_context is not None)
+                report["scenarios"][scenario.name] = result
+                cpu = f"  cpu={result['cpu_ms_per_request']} ms/req" if "cpu_ms_per_request" in result else ""
+                print(f"{scenario.name:18} {result['throughput_rps']:>8} rps  "
+                      f"p50={result['latency_ms']['p50']} p95={result['latency_ms']['p95']} "
+                      f"p99={result['latency_ms']['p99']} ms  errors={result['errors']}{cpu}", file=sys.stderr)
+    finally:
+        if app_context is not None:
+            await app_context.__aexit__(None, None, None)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк эндпоинтов")
+    parser.add_argument("--url", help="Адрес запущенного сервера; без него приложение запускается в процессе")
+    parser.add_argument("--scenarios", nargs="*", choices=[s.name for s in SCENARIOS],
+                        help="Какие сценарии запускать (по умолчанию все)")
+    parser.add_argument("--requests", type=int, default=1000, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=50, help="Запросов прогрева на сценарий (не учитываются)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument("--seed-rows", type=int, default=0, help="Сколько записей засеять перед прогоном")
+    parser.add_argument("--days", type=int, default=30, help="За сколько дней распределить засеянные записи")
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--proxies", type=int, default=2000)
+    parser.add_argument("--output", help="Куда сохранить отчет JSON")
+    parser.add_argument("--baseline", help="Отчет предыдущего прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Допустимое ухудшение пропускной способности и p95 (доля)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    ok = True
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = problems
+        for problem in problems:
+            print(f"REGRESSION  {problem}", file=sys.stderr)
+        ok = not problems
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
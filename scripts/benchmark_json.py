@@ -0,0 +1,112 @@
+"""
+Бенчмарк сериализации страницы списка записей (по умолчанию 10 000 строк).
+
+Без базы и сети: строки синтетические (как из SyntheticData в scripts.benchmark),
+сравниваются способы превратить их в тело ответа.
+
+    orm_pydantic_json    - как было: ORM-объекты -> response_model List[EarningResponse]
+                           (валидация + сериализация FastAPI) -> JSONResponse (json.dumps)
+    orm_pydantic_fast    - то же, но ответ через FastJSONResponse (orjson, если есть)
+    rows_dumps           - строки запроса сразу в байты (dumps_rows, текущие списки)
+
+Для каждого способа печатается медиана времени на страницу, строк в секунду и
+размер тела; заодно проверяется, что после разбора JSON тела совпадают.
+
+    python -m scripts.benchmark_json --rows 10000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.earnings import ProxyEarning
+from app.schemas.earnings import EarningResponse
+from app.services.serialization import FastJSONResponse, dumps_rows, orjson
+from scripts.benchmark import SyntheticData
+
+
+def synthetic_rows(rows: int, seed: int) -> List[tuple]:
+    """Строки в порядке колонок proxy_earnings, с типами, которые отдает asyncpg"""
+    data = SyntheticData(seed, bots=50, proxies=2000, days=30)
+    now = datetime.now(timezone.utc)
+    result = []
+    for index in range(rows):
+        earning = data.past_earning(now)
+        event_timestamp = datetime.fromisoformat(earning["event_timestamp"])
+        result.append((
+            index + 1, earning["proxy_ip"], earning["proxy_port"], earning["proxy_key"], earning["server_id"],
+            earning["bot_id"], earning["bot_name"], earning["faucet_name"], None,
+            Decimal(earning["reward_amount"]), earning["reward_currency"], earning["unique_key"],
+            earning["success"], None if earning["success"] else "timeout", event_timestamp, now,
+            {"asn": 64500 + index % 100, "session_id": f"s-{index % 500}"}, 64500 + index % 100, f"s-{index % 500}",
+        ))
+    return result
+
+
+async def serialize(method: str, keys: List[str], rows: List[tuple]) -> bytes:
+    if method == "rows_dumps":
+        return dumps_rows(keys, rows)
+    # Объекты собираются и в старом пути - из результата ORM-запроса
+    objects = [ProxyEarning(**dict(zip(keys, row))) for row in rows]
+    field = create_response_field(name="response", type_=List[EarningResponse], mode="serialization")
+    content = await serialize_response(field=field, response_content=objects)
+    response_class = JSONResponse if method == "orm_pydantic_json" else FastJSONResponse
+    return response_class(content).body
+
+
+async def run(args) -> dict:
+    keys = [column.name for column in ProxyEarning.__table__.columns]
+    rows = synthetic_rows(args.rows, args.seed)
+    report = {"meta": {"rows": args.rows, "repeat": args.repeat, "orjson": orjson is not None}, "methods": {}}
+    bodies = {}
+    for method in ("orm_pydantic_json", "orm_pydantic_fast", "rows_dumps"):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            body = await serialize(method, keys, rows)
+            timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        bodies[method] = body
+        report["methods"][method] = {
+            "median_ms": round(median * 1000, 2),
+            "rows_per_s": round(args.rows / median),
+            "body_bytes": len(body),
+        }
+        print(f"{method:18} {median * 1000:>9.2f} ms  {args.rows / median:>10.0f} rows/s  {len(body)} bytes",
+              file=sys.stderr)
+    expected = json.loads(bodies["orm_pydantic_json"])
+    report["identical"] = all(json.loads(body) == expected for body in bodies.values())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сериализации списков записей")
+    parser.add_argument("--rows", type=int, default=10_000, help="Строк на странице")
+    parser.add_argument("--repeat", type=int, default=10, help="Повторов на способ")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument("--output", help="Куда сохранить отчет JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if not report["identical"]:
+        print("Тела ответов различаются", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Проверка планов запросов эндпоинтов proxy_earnings.
+
+Засевает синтетические данные, строит те же запросы, что и эндпоинты
+(app.api.earnings, app.main), и по EXPLAIN (FORMAT JSON) проверяет, что
+proxy_earnings читается через индекс, а оценка стоимости укладывается в бюджет.
+Выгрузка через COPY с фильтрами по extra_data выполняется на тех же данных.
+Все выполняется в одной транзакции, которая в конце откатывается, но агрегаты
+на время проверки блокируются - запускать на dev/staging базе.
+
+    python -m scripts.check_query_plans --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
+
+from sqlalchemy import Select, func, select, text, literal_column
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.api.earnings import attribute_filters, earnings_query, time_filters
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.main import stats_daily_query, stats_summary_query
+from app.models.earnings import ProxyEarning
+from app.services.export import copy_query, _compile as compile_for_copy
+from app.services.pagination import encode_cursor
+from app.services.partitions import ensure_partitions
+from app.services.rollups import rebuild_rollups
+
+SEED_SQL = """
+    INSERT INTO proxy_earnings (
+        proxy_ip, proxy_port, proxy_key, server_id, bot_id, bot_name, faucet_name,
+        reward_amount, reward_currency, unique_key, success, event_timestamp, extra_data
+    )
+    SELECT
+        '10.' || (g % :proxies) / 256 || '.' || (g % :proxies) % 256 || '.1',
+        8080,
+        '10.' || (g % :proxies) / 256 || '.' || (g % :proxies) % 256 || '.1:8080',
+        'srv-' || g % :servers,
+        'bot-' || g % :bots,
+        'bot-' || g % :bots,
+        'faucet-' || g % 7,
+        round((random() * 0.001)::numeric, 8),
+        'BTC',
+        md5('plan-check-' || g),
+        g % 10 <> 0,
+        CAST(:until AS timestamptz) - (CAST(:span AS interval) * g / :rows),
+        jsonb_build_object(
+            'asn', 64500 + (g % :proxies) % :asns, 'session_id', 'session-' || g / 100,
+            'asn_org', 'AS' || 64500 + (g % :proxies) % :asns
+        )
+    FROM generate_series(1, :rows) AS g
+"""
+
+
+@dataclass
+class PlanCase:
+    """Запрос эндпоинта и допустимая оценка стоимости (total cost)"""
+    name: str
+    build: Callable[[], Select]
+    max_cost: float
+    # Агрегаты маленькие и читаются целиком - для них проверяется только стоимость
+    require_index: bool = True
+
+
+def _plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def _compile(stmt: Select) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def build_cases(now: datetime, args) -> List[PlanCase]:
+    bot = ProxyEarning.bot_name == "bot-1"
+    proxy = ProxyEarning.proxy_key == "10.0.1.1:8080"
+    asn = ProxyEarning.asn == 64501
+    session = ProxyEarning.session_id == "session-42"
+    week = time_filters(now - timedelta(days=7), now)
+    # Курсор из середины диапазона: так выглядит глубокая страница
+    cursor = encode_cursor(now - timedelta(days=args.days / 2), 2 ** 31 - 1)
+    page, big_page = 100 + 1, 1000 + 1
+    return [
+        PlanCase("GET /earnings/", lambda: earnings_query([]).limit(page), 500),
+        PlanCase("GET /earnings/ cursor", lambda: earnings_query([], cursor).limit(page), 500),
+        PlanCase("GET /earnings/ since/until", lambda: earnings_query(week).limit(page), 500),
+        PlanCase("GET /earnings/{id}", lambda: select(ProxyEarning).where(ProxyEarning.id == 12345), 500),
+        PlanCase("GET /earnings/proxy/{key}", lambda: earnings_query([proxy]).limit(big_page), 5000),
+        PlanCase("GET /earnings/proxy/{key} cursor", lambda: earnings_query([proxy], cursor).limit(big_page), 5000),
+        PlanCase("GET /earnings/proxy/{key} since/until", lambda: earnings_query([proxy, *week]).limit(big_page), 5000),
+        PlanCase("GET /earnings/bot/{name}", lambda: earnings_query([bot]).limit(big_page), 5000),
+        PlanCase("GET /earnings/bot/{name} cursor", lambda: earnings_query([bot], cursor).limit(big_page), 5000),
+        PlanCase("GET /earnings/bot/{name} since/until", lambda: earnings_query([bot, *week]).limit(big_page), 5000),
+        PlanCase("GET /earnings/?asn", lambda: earnings_query([asn]).limit(page), 500),
+        PlanCase("GET /earnings/?asn cursor", lambda: earnings_query([asn], cursor).limit(page), 500),
+        PlanCase("GET /earnings/?session_id", lambda: earnings_query([session]).limit(page), 500),
+        # literal_binds не рендерит JSONB-значения: литерал записан в SQL
+        PlanCase("GET /earnings/?asn_org", lambda: earnings_query([ProxyEarning.extra_data.contains(
+            literal_column("""'{"asn_org": "AS64501"}'::jsonb""", JSONB))]).limit(page), args.rows / 10),
+        PlanCase("GET /earnings/bot/{name}?format=ndjson", lambda: earnings_query([bot], columns=True),
+                 args.rows / args.bots * 2),
+        PlanCase("GET /stats/summary", stats_summary_query, args.rows / 10, require_index=False),
+        PlanCase("GET /stats/daily", lambda: stats_daily_query(now - timedelta(days=6), now), args.rows / 10,
+                 require_index=False),
+    ]
+
+
+async def seed(session, now: datetime, args):
+    since = now - timedelta(days=args.days)
+    interval = settings.EARNINGS_PARTITION_INTERVAL
+    ahead = args.days + 1 if interval == "day" else args.days // 28 + 1
+    await ensure_partitions(session, "proxy_earnings", interval, ahead, now=since)
+    await session.execute(text(SEED_SQL), {
+        "rows": args.rows, "bots": args.bots, "proxies": args.proxies, "servers": args.servers, "asns": args.asns,
+        "until": now, "span": timedelta(days=args.days),
+    })
+    await rebuild_rollups(session, since, now)
+    await session.execute(text("ANALYZE proxy_earnings"))
+    await session.execute(text("ANALYZE earnings_rollup_daily"))
+
+
+async def check_copy_export(session) -> List[str]:
+    """
+    GET /earnings/export (csv, ndjson) с фильтрами asn, session_id и asn_org.
+
+    asn_org - JSONB-параметр: COPY получает его значения в обход execute, и они
+    должны пройти bind processors (иначе кодек asyncpg падает на словаре).
+    """
+    conn = await session.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+    filters = attribute_filters(64501, None, None) + attribute_filters(None, None, "AS64501")
+    expected = (await session.execute(select(func.count()).select_from(ProxyEarning).where(*filters))).scalar()
+    errors = []
+    for fmt in ("csv", "ndjson"):
+        sql, params = compile_for_copy(copy_query(filters, fmt), conn.dialect)
+        output = bytearray()
+
+        async def collect(data):
+            output.extend(data)
+
+        try:
+            await raw.copy_from_query(sql, *params, output=collect, format="csv", header=fmt == "csv")
+        except Exception as e:
+            errors.append(f"export {fmt}: {type(e).__name__}: {e}")
+            continue
+        rows = output.count(b"\n") - (fmt == "csv")
+        if rows != expected:
+            errors.append(f"export {fmt}: {rows} rows, expected {expected}")
+    return errors
+
+
+async def check(args) -> bool:
+    now = datetime.now(timezone.utc)
+    ok = True
+    async with AsyncSessionLocal() as session:
+        try:
+            await seed(session, now, args)
+            # Пустые секции (будущие периоды, DEFAULT) планировщик честно читает seq scan-ом
+            empty = set((await session.execute(text(
+                "SELECT relname FROM pg_class WHERE relname LIKE 'proxy_earnings%' AND relpages = 0"
+            ))).scalars())
+            for case in build_cases(now, args):
+                result = await session.execute(text("EXPLAIN (FORMAT JSON) " + _compile(case.build())))
+                plan = result.scalar()
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+                errors = []
+                seq_scans = sorted({
+                    node["Relation Name"] for node in _plan_nodes(plan)
+                    if node["Node Type"] == "Seq Scan"
+                    and node.get("Relation Name", "").startswith("proxy_earnings")
+                    and node["Relation Name"] not in empty
+                })
+                if case.require_index and seq_scans:
+                    errors.append(f"seq scan: {', '.join(seq_scans)}")
+                if plan["Total Cost"] > case.max_cost:
+                    errors.append(f"cost {plan['Total Cost']:.0f} > {case.max_cost:.0f}")
+
+                status = "FAIL" if errors else "ok"
+                print(f"{status:4}  {case.name:42} cost={plan['Total Cost']:>10.1f}  {'; '.join(errors)}")
+                if errors:
+                    ok = False
+                    if args.verbose:
+                        print(json.dumps(plan, indent=2))
+
+            errors = await check_copy_export(session)
+            print(f"{'FAIL' if errors else 'ok':4}  {'GET /earnings/export?asn&asn_org (COPY)':42}  {'; '.join(errors)}")
+            ok = ok and not errors
+        finally:
+            await session.rollback()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка планов запросов эндпоинтов proxy_earnings")
+    parser.add_argument("--rows", type=int, default=200_000, help="Сколько синтетических записей засеять")
+    parser.add_argument("--days", type=int, default=60, help="За сколько дней распределить записи")
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--proxies", type=int, default=2000)
+    parser.add_argument("--servers", type=int, default=8)
+    parser.add_argument("--asns", type=int, default=300)
+    parser.add_argument("--verbose", action="store_true", help="Печатать план упавших проверок")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
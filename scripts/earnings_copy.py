@@ -0,0 +1,106 @@
+"""
+Массовый импорт и выгрузка записей заработка напрямую в базу (без HTTP).
+
+Использует те же функции, что и эндпоинты /earnings/import и /earnings/export:
+COPY FROM/TO STDIN, потоково, память не зависит от объема файла.
+
+    python -m scripts.earnings_copy export -o earnings.parquet --bot-name bot-1 --since 2025-08-01
+    python -m scripts.earnings_copy import old_collector.csv
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.api.earnings import attribute_filters, time_filters
+from app.models.earnings import ProxyEarning
+from app.services.earnings_import import EarningsImportError, import_earnings
+from app.services.export import copy_earnings, stream_parquet, pyarrow
+from app.services.rollups import commit_rollups
+
+FORMATS = ("csv", "ndjson", "parquet")
+READ_CHUNK_BYTES = 1024 * 1024
+EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+
+
+def _format(path: str, fmt: str) -> str:
+    """Явно заданный формат или формат по расширению файла (по умолчанию CSV)"""
+    return fmt or EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+
+async def _read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_BYTES):
+            yield chunk
+
+
+async def run_export(args):
+    from app.database import engine
+
+    fmt = _format(args.output or "", args.format)
+    if fmt == "parquet" and pyarrow is None:
+        sys.exit("Parquet export requires pyarrow")
+    filters = [*time_filters(args.since, args.until), *attribute_filters(args.asn, args.session_id, args.asn_org)]
+    for column, value in ((ProxyEarning.bot_name, args.bot_name), (ProxyEarning.proxy_key, args.proxy_key),
+                          (ProxyEarning.server_id, args.server_id)):
+        if value is not None:
+            filters.append(column == value)
+
+    stream = stream_parquet(filters) if fmt == "parquet" else copy_earnings(filters, fmt)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        await engine.dispose()
+
+
+async def run_import(args):
+    from app.database import AsyncSessionLocal, engine
+
+    fmt = _format(args.file, args.format)
+    try:
+        async with AsyncSessionLocal() as session:
+            result = await import_earnings(session, _read_file(args.file), fmt)
+            await commit_rollups(session)
+    except EarningsImportError as e:
+        sys.exit(f"Import failed: {e}")
+    finally:
+        await engine.dispose()
+    logging.info(f"Импорт {args.file}: {result}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт и выгрузка записей заработка")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Выгрузить записи в файл или stdout")
+    export.add_argument("-o", "--output", help="Файл (формат по расширению); без него - stdout")
+    export.add_argument("--format", choices=FORMATS)
+    export.add_argument("--bot-name")
+    export.add_argument("--proxy-key")
+    export.add_argument("--server-id")
+    export.add_argument("--asn", type=int)
+    export.add_argument("--session-id")
+    export.add_argument("--asn-org")
+    export.add_argument("--since", type=datetime.fromisoformat, help="Начало периода (ISO 8601)")
+    export.add_argument("--until", type=datetime.fromisoformat, help="Конец периода (ISO 8601, не включая)")
+
+    load = commands.add_parser("import", help="Загрузить записи из файла")
+    load.add_argument("file")
+    load.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению файла")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    for name in ("sqlalchemy", "app.database"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    asyncio.run(run_export(args) if args.command == "export" else run_import(args))
+
+
+if __name__ == "__main__":
+    main()
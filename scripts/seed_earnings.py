@@ -0,0 +1,256 @@
+"""
+Генератор синтетических данных proxy_earnings и массовая загрузка через COPY.
+
+Строки генерируются потоково, пачками по --chunk-size, и грузятся COPY
+(copy_records_to_table asyncpg) в --workers процессах параллельно: каждый
+процесс генерирует свою долю со своим зерном и пишет через свое соединение,
+каждая пачка - отдельная транзакция (proxy_earning_keys + proxy_earnings).
+
+Распределение приближено к боевому: боты, прокси, серверы и краны по закону
+Ципфа (немногие горячие, длинный хвост), время событий с суточным циклом,
+валюты по весам, доля неуспешных событий --failure-rate; прокси закреплены
+за ASN (extra_data: asn, asn_org, session_id). После загрузки
+агрегаты статистики пересчитываются за период, таблицы анализируются.
+
+    python -m scripts.seed_earnings --rows 20000000 --days 90 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import accumulate
+from typing import Dict, Iterator, List, Sequence
+
+from sqlalchemy import text
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+EARNING_COLUMNS = (
+    "proxy_ip", "proxy_port", "proxy_key", "server_id", "bot_id", "bot_name", "faucet_name", "faucet_url",
+    "reward_amount", "reward_currency", "unique_key", "success", "error_message", "event_timestamp",
+    "created_at", "extra_data",
+)
+KEY_COLUMNS = ("unique_key", "event_timestamp")
+
+ERROR_MESSAGES = ("captcha failed", "timeout", "proxy banned", "faucet cooldown", "HTTP 503")
+
+
+@dataclass
+class Distribution:
+    """Параметры распределения синтетических данных"""
+    bots: int = 500
+    proxies: int = 50_000
+    servers: int = 16
+    faucets: int = 40
+    asns: int = 300
+    zipf: float = 1.1
+    days: int = 90
+    # Доля событий в пик суток относительно спада: 1 - равномерно
+    diurnal_peak: float = 3.0
+    peak_hour: int = 14
+    failure_rate: float = 0.1
+    currencies: Dict[str, float] = field(default_factory=lambda: {"BTC": 1.0})
+
+
+def zipf_cum_weights(n: int, s: float) -> List[float]:
+    """Накопленные веса закона Ципфа для рангов 1..n (для random.choices)"""
+    return list(accumulate(1.0 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def diurnal_cum_weights(peak: float, peak_hour: int) -> List[float]:
+    """Накопленные веса часов суток: косинус с максимумом в peak_hour"""
+    amplitude = (peak - 1) / (peak + 1)
+    return list(accumulate(1 + amplitude * math.cos(2 * math.pi * (hour - peak_hour) / 24) for hour in range(24)))
+
+
+class EarningGenerator:
+    """Потоковый генератор строк proxy_earnings в порядке EARNING_COLUMNS"""
+
+    def __init__(self, dist: Distribution, seed: int, until: datetime, tag: str):
+        self.dist = dist
+        self.rng = random.Random(seed)
+        self.until = until
+        self.tag = tag
+        # Ранги перемешаны, чтобы горячие сущности не совпадали по номеру у разных измерений
+        shuffle = random.Random(0)
+        self.bots = [f"bot-{i}" for i in range(dist.bots)]
+        self.proxies = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(dist.proxies)]
+        self.servers = [f"srv-{i}" for i in range(dist.servers)]
+        self.faucets = [f"faucet-{i}" for i in range(dist.faucets)]
+        for values in (self.bots, self.proxies, self.servers, self.faucets):
+            shuffle.shuffle(values)
+        # Прокси закреплены за ASN; крупные провайдеры держат большую часть прокси
+        asns = shuffle.choices(range(64500, 64500 + dist.asns), cum_weights=zipf_cum_weights(dist.asns, dist.zipf),
+                               k=dist.proxies)
+        self.proxy_asn = dict(zip(self.proxies, asns))
+        self.bot_weights = zipf_cum_weights(dist.bots, dist.zipf)
+        self.proxy_weights = zipf_cum_weights(dist.proxies, dist.zipf)
+        self.server_weights = zipf_cum_weights(dist.servers, dist.zipf)
+        self.faucet_weights = zipf_cum_weights(dist.faucets, dist.zipf)
+        self.hour_weights = diurnal_cum_weights(dist.diurnal_peak, dist.peak_hour)
+        self.currencies = list(dist.currencies)
+        self.currency_weights = list(accumulate(dist.currencies.values()))
+        self.first_day = (until - timedelta(days=dist.days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def chunk(self, size: int, offset: int) -> List[tuple]:
+        rng = self.rng
+        bots = rng.choices(self.bots, cum_weights=self.bot_weights, k=size)
+        proxies = rng.choices(self.proxies, cum_weights=self.proxy_weights, k=size)
+        servers = rng.choices(self.servers, cum_weights=self.server_weights, k=size)
+        faucets = rng.choices(self.faucets, cum_weights=self.faucet_weights, k=size)
+        hours = rng.choices(range(24), cum_weights=self.hour_weights, k=size)
+        currencies = rng.choices(self.currencies, cum_weights=self.currency_weights, k=size)
+        rows = []
+        for i in range(size):
+            ts = self.first_day + timedelta(days=rng.randrange(self.dist.days + 1), hours=hours[i],
+                                            seconds=rng.random() * 3600)
+            if ts >= self.until:
+                ts = self.until - timedelta(seconds=rng.random() * 86400)
+            success = rng.random() >= self.dist.failure_rate
+            bot, ip = bots[i], proxies[i]
+            asn = self.proxy_asn[ip]
+            # Сессия бота - сутки работы через один прокси
+            extra_data = json.dumps({"session_id": f"{bot}-{ts:%Y%m%d}-{ip}", "asn": asn, "asn_org": f"AS{asn} Networks"})
+            rows.append((
+                ip, 8080, f"{ip}:8080", servers[i], bot, bot, faucets[i], None,
+                Decimal(f"{rng.lognormvariate(-9, 1.5):.8f}") + Decimal("0.00000001"),
+                currencies[i], f"seed-{self.tag}-{offset + i}", success,
+                None if success else rng.choice(ERROR_MESSAGES),
+                ts, ts + timedelta(milliseconds=rng.random() * 500), extra_data,
+            ))
+        return rows
+
+    def chunks(self, total: int, size: int, offset: int = 0) -> Iterator[List[tuple]]:
+        for start in range(0, total, size):
+            yield self.chunk(min(size, total - start), offset + start)
+
+
+async def _copy_worker(worker: int, rows: int, args, dist: Distribution, until: datetime) -> int:
+    from app.database import engine
+
+    generator = EarningGenerator(dist, args.seed + worker, until, f"{args.tag}-{worker}")
+    loaded = 0
+    try:
+        async with engine.connect() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection
+            for records in generator.chunks(rows, args.chunk_size):
+                async with raw.transaction():
+                    await raw.copy_records_to_table(
+                        "proxy_earning_keys", columns=KEY_COLUMNS,
+                        records=[(row[10], row[13]) for row in records],
+                    )
+                    await raw.copy_records_to_table("proxy_earnings", columns=EARNING_COLUMNS, records=records)
+                loaded += len(records)
+    finally:
+        await engine.dispose()
+    return loaded
+
+
+def _run_worker(worker: int, rows: int, args, dist: Distribution, until: datetime) -> int:
+    return asyncio.run(_copy_worker(worker, rows, args, dist, until))
+
+
+async def prepare(dist: Distribution, until: datetime):
+    from app.database import AsyncSessionLocal, engine
+    from app.services.partitions import ensure_partitions
+
+    interval = settings.EARNINGS_PARTITION_INTERVAL
+    since = until - timedelta(days=dist.days + 1)
+    ahead = dist.days + 2 if interval == "day" else dist.days // 28 + 2
+    async with AsyncSessionLocal() as session:
+        created = await ensure_partitions(session, "proxy_earnings", interval, ahead, now=since)
+        await session.commit()
+    await engine.dispose()
+    if created:
+        logger.info(f"Созданы секции: {', '.join(created)}")
+
+
+async def finish(dist: Distribution, until: datetime):
+    from app.database import AsyncSessionLocal, engine
+    from app.services.rollups import commit_rollups, rebuild_rollups
+
+    async with AsyncSessionLocal() as session:
+        await rebuild_rollups(session, until - timedelta(days=dist.days + 1), until)
+        for table in ("proxy_earnings", "proxy_earning_keys", "earnings_rollup_hourly", "earnings_rollup_daily"):
+            await session.execute(text(f"ANALYZE {table}"))
+        await commit_rollups(session)
+    await engine.dispose()
+
+
+def _split(total: int, parts: int) -> Sequence[int]:
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def _parse_weights(value: str) -> Dict[str, float]:
+    weights = {}
+    for item in value.split(","):
+        symbol, _, weight = item.partition(":")
+        weights[symbol.strip().upper()] = float(weight or 1)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка синтетических данных proxy_earnings")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=4, help="Параллельных процессов загрузки")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Строк в одной транзакции COPY")
+    parser.add_argument("--days", type=int, default=90, help="За сколько дней до текущего момента распределить события")
+    parser.add_argument("--bots", type=int, default=500)
+    parser.add_argument("--proxies", type=int, default=50_000)
+    parser.add_argument("--servers", type=int, default=16)
+    parser.add_argument("--faucets", type=int, default=40)
+    parser.add_argument("--asns", type=int, default=300, help="Сколько ASN, за которыми закреплены прокси")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Показатель закона Ципфа (0 - равномерно)")
+    parser.add_argument("--diurnal-peak", type=float, default=3.0, help="Во сколько раз пик суток выше спада")
+    parser.add_argument("--peak-hour", type=int, default=14, help="Час пика по UTC")
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    parser.add_argument("--currencies", type=_parse_weights, default="BTC:70,LTC:10,DOGE:10,ETH:5,TRX:5",
+                        help="Валюты с весами: BTC:70,LTC:10")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора")
+    parser.add_argument("--tag", default=uuid.uuid4().hex[:8],
+                        help="Метка прогона в unique_key (повторная загрузка с той же меткой упадет на дубликатах)")
+    parser.add_argument("--skip-rollups", action="store_true", help="Не пересчитывать агрегаты после загрузки")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+
+    dist = Distribution(
+        bots=args.bots, proxies=args.proxies, servers=args.servers, faucets=args.faucets, asns=args.asns, zipf=args.zipf,
+        days=args.days, diurnal_peak=args.diurnal_peak, peak_hour=args.peak_hour,
+        failure_rate=args.failure_rate, currencies=args.currencies,
+    )
+    until = datetime.now(timezone.utc)
+    asyncio.run(prepare(dist, until))
+
+    started = time.perf_counter()
+    loaded = 0
+    # spawn: у каждого процесса свой движок и свой event loop
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(_run_worker, worker, rows, args, dist, until)
+            for worker, rows in enumerate(_split(args.rows, args.workers)) if rows
+        ]
+        for future in as_completed(futures):
+            loaded += future.result()
+            elapsed = time.perf_counter() - started
+            logger.info(f"Загружено {loaded} из {args.rows} строк, {loaded / elapsed:,.0f} строк/с")
+
+    if not args.skip_rollups:
+        asyncio.run(finish(dist, until))
+        logger.info("Агрегаты пересчитаны")
+    logger.info(f"Готово за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()